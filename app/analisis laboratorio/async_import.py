@@ -0,0 +1,205 @@
+"""
+Async import mode for LabDataImporter
+A CSV reader task fills a bounded queue of batches (backpressure) that writer
+tasks drain over one pooled httpx.AsyncClient. The reader's file reads,
+decompression and synchronous biomarker lookups run in a worker thread so
+they never stall the event loop. Each writer commits a batch's
+lab_results before sending its lab_parsed_values, so parsed values never
+reference uncommitted results. 429/5xx responses are retried with jittered
+exponential backoff; client-generated ids plus ignore-duplicates make those
+retries safe to repeat.
+"""
+
+import asyncio
+import random
+from typing import Dict, List, Optional
+
+from csv_stream import iter_batches, iter_csv_rows
+from import_journal import file_hash
+
+import httpx
+
+from import_lab_to_supabase import LabDataImporter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncLabImporter:
+    """Pipelined async writer reusing a LabDataImporter's row builders and stats"""
+
+    def __init__(self, importer: LabDataImporter, url: str, key: str, max_in_flight: int = 8,
+                 queue_size: int = 4, max_retries: int = 5, backoff_base: float = 0.2, backoff_cap: float = 10.0):
+        self.importer = importer
+        self.url = url.rstrip('/')
+        self.key = key
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.importer.stats.setdefault('retries', 0)
+
+    def backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def insert(self, client: httpx.AsyncClient, table: str, rows: List[Dict]):
+        """Insert rows with retries; raises after the last failed attempt"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post(f'/rest/v1/{table}', params={'on_conflict': 'id'}, json=rows)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return
+                retry_after = response.headers.get('Retry-After')
+
+            self.importer.stats['retries'] += 1
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+    def resolve_biomarkers(self, batch: List[Dict[str, str]]) -> List[Optional[str]]:
+        """Blocking: create the batch's new biomarkers and look up every row's biomarker id"""
+        importer = self.importer
+        with importer.metrics.stage('ensure_biomarkers'):
+            importer.ensure_biomarkers(batch)
+        with importer.metrics.stage('resolve_biomarkers'):
+            return [importer.get_or_create_biomarker(row['Biomarker'], row['Category'], row['Units'],
+                                                     row['Ref_Min'], row['Ref_Max'])
+                    for row in batch]
+
+    async def write_batch(self, client: httpx.AsyncClient, patient_id: str, batch: List[Dict[str, str]],
+                          batch_start: int, positions: List[int], lab_result_ids: Optional[List[str]],
+                          biomarker_ids: List[Optional[str]]):
+        importer = self.importer
+        journal = importer.journal
+        with importer.metrics.stage('build_rows'):
+            lab_results_batch = [importer.build_lab_result(patient_id, row) for row in batch]
+        parsed_value_ids = importer.parsed_value_ids(batch, batch_start, lab_result_ids)
+
+        if lab_result_ids:
+            # Stored before the interruption (journal): only the parsed values are missing
+            for lab_result, lab_result_id in zip(lab_results_batch, lab_result_ids):
+                lab_result['id'] = lab_result_id
+        else:
+            try:
+                with importer.metrics.stage('insert_lab_results'):
+                    await self.insert(client, 'lab_results', lab_results_batch)
+            except Exception as e:
+                importer.stats['errors'].append(f"Error creating lab results batch ({len(batch)} rows): {str(e)}")
+                return
+            importer.stats['lab_results_created'] += len(lab_results_batch)
+            importer.record_committed(patient_id, batch)
+            if journal is not None:
+                journal.record_lab_results(batch_start, positions, [r['id'] for r in lab_results_batch],
+                                           parsed_value_ids)
+
+        # Only reached once the results above are committed
+        with importer.metrics.stage('build_rows'):
+            parsed_values_batch = [
+                dict(importer.build_lab_parsed_value(lab_result['id'], biomarker_id, row), id=parsed_value_id)
+                for lab_result, biomarker_id, row, parsed_value_id
+                in zip(lab_results_batch, biomarker_ids, batch, parsed_value_ids)
+                if biomarker_id
+            ]
+        if parsed_values_batch:
+            try:
+                with importer.metrics.stage('insert_parsed_values'):
+                    await self.insert(client, 'lab_parsed_values', parsed_values_batch)
+            except Exception as e:
+                importer.stats['errors'].append(
+                    f"Error creating parsed values batch ({len(parsed_values_batch)} rows): {str(e)}")
+                return
+            importer.stats['lab_parsed_values_created'] += len(parsed_values_batch)
+
+        if journal is not None:
+            journal.record_complete(batch_start)
+
+    def next_batch(self, pending):
+        """Blocking: read the next pending batch from the CSV and resolve its biomarkers, None at the end"""
+        item = next(pending, None)
+        if item is None:
+            return None
+        batch_start, positions, batch, lab_result_ids = item
+        return batch, batch_start, positions, lab_result_ids, self.resolve_biomarkers(batch)
+
+    async def read_batches(self, csv_file: str, patient_id: str, batch_size: int, queue: asyncio.Queue):
+        """Producer: streams the CSV and blocks on the bounded queue when writers fall behind"""
+        importer = self.importer
+        batches = importer.metrics.timed(iter_batches(iter_csv_rows(csv_file), batch_size), 'read_csv')
+        pending = importer.pending_batches(patient_id, batches)
+        try:
+            while True:
+                # File reads, decompression and the sync client's biomarker requests all block: run them off the loop
+                item = await asyncio.to_thread(self.next_batch, pending)
+                if item is None:
+                    break
+                await queue.put(item)
+        finally:
+            # Writers stop even when reading fails, so the error reaches the caller instead of hanging the gather
+            for _ in range(self.max_in_flight):
+                await queue.put(None)
+
+    async def writer(self, client: httpx.AsyncClient, patient_id: str, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await self.write_batch(client, patient_id, *item)
+
+    async def import_csv_data(self, csv_file: str, patient_id: Optional[str] = None, batch_size: int = 500,
+                              resume: bool = False) -> bool:
+        importer = self.importer
+        if not patient_id:
+            patient_id = importer.get_patient_id()
+            if not patient_id:
+                return False
+
+        print(f"Importing data for patient ID: {patient_id} (async, {self.max_in_flight} in flight)")
+
+        if importer.journal is not None:
+            with importer.metrics.stage('journal'):
+                source_hash = await asyncio.to_thread(file_hash, csv_file)
+                batch_size = importer.journal.begin(source_hash, patient_id, batch_size, resume)
+
+        # Stored fingerprints (and, per batch, new biomarkers) are resolved with the synchronous client
+        with importer.metrics.stage('sync_fingerprints'):
+            importer.sync_fingerprints(patient_id)
+
+        headers = {
+            'apikey': self.key,
+            'Authorization': f'Bearer {self.key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'return=minimal,resolution=ignore-duplicates'
+        }
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async with httpx.AsyncClient(base_url=self.url, headers=headers, limits=limits, timeout=60.0,
+                                     event_hooks=importer.metrics.event_hooks_async()) as client:
+            await asyncio.gather(
+                self.read_batches(csv_file, patient_id, batch_size, queue),
+                *(self.writer(client, patient_id, queue) for _ in range(self.max_in_flight))
+            )
+
+        if importer.fingerprint_index is not None:
+            importer.fingerprint_index.save()
+        importer.name_index.save()
+        return True
+
+
+def run_async_import(importer: LabDataImporter, csv_file: str, url: str, key: str,
+                     patient_id: Optional[str] = None, batch_size: int = 500, resume: bool = False,
+                     **options) -> bool:
+    """Run an async import to completion from synchronous code"""
+    async_importer = AsyncLabImporter(importer, url, key, **options)
+    return asyncio.run(async_importer.import_csv_data(csv_file, patient_id, batch_size, resume))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Batch Lab Results Processor
+Parses many Ornament report text exports across a process pool and merges them
+into the same CSV and summary outputs as process_full_pdf.py
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from lab_store import LabResultStore
+from process_full_pdf import FullLabDataProcessor
+
+
+def collect_report_files(inputs: List[str]) -> List[str]:
+    """Expand directories and glob patterns into a sorted, de-duplicated file list"""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, '*.txt')))
+        else:
+            files.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(files)
+
+
+def parse_report_file(path: str) -> Tuple[str, LabResultStore]:
+    """Worker: parse one report file and return its records in line order"""
+    processor = FullLabDataProcessor()
+    with open(path, 'r', encoding='utf-8') as report:
+        processor.results.extend(processor.iter_records(report))
+    # The columnar store pickles far smaller than a list of dicts
+    return path, processor.results
+
+
+def process_reports(files: List[str], workers: int = None) -> Tuple[FullLabDataProcessor, Dict[str, int]]:
+    """Parse files in parallel and merge results ordered by file, then line"""
+    merged = FullLabDataProcessor()
+    per_file = {}
+
+    # Small files are dispatched in chunks so IPC overhead does not dominate
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(files) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, which keeps the merge deterministic
+        for path, records in pool.map(parse_report_file, files, chunksize=chunksize):
+            per_file[path] = len(records)
+            merged.results.extend(records)
+
+    return merged, per_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse a directory or glob of lab report text files in parallel')
+    parser.add_argument('inputs', nargs='+', help='Report directories (*.txt) or glob patterns')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('-o', '--output-dir', default='.', help='Directory for the CSV and summary outputs')
+    parser.add_argument('--dataset', choices=['parquet', 'arrow'],
+                        help='Also write lab_results_dataset/ in this columnar format (needs pyarrow)')
+    args = parser.parse_args()
+
+    files = collect_report_files(args.inputs)
+    if not files:
+        print("No report files found")
+        sys.exit(1)
+
+    print(f"Parsing {len(files)} report files...")
+    start = time.perf_counter()
+    processor, per_file = process_reports(files, args.workers)
+    elapsed = time.perf_counter() - start
+
+    for path, count in per_file.items():
+        print(f"  {path}: {count} records")
+    print(f"Parsed {len(processor.results)} records in {elapsed:.2f}s")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    processor.save_complete_csv(os.path.join(args.output_dir, 'lab_results_full.csv'))
+    processor.save_abnormal_csv(os.path.join(args.output_dir, 'lab_results_abnormal_full.csv'))
+    processor.save_summary_json(processor.generate_summary(),
+                                os.path.join(args.output_dir, 'lab_results_summary_full.json'))
+    if args.dataset:
+        processor.save_dataset(os.path.join(args.output_dir, 'lab_results_dataset'), args.dataset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Import throughput benchmark suite against an in-memory Supabase backend
+For each size (1k to 1M rows by default) imports lab_results_full.csv,
+repeated to that size, with every import strategy: the synchronous batched
+importer on the in-process fake client and over HTTP to the mock PostgREST,
+and the async importer at several in-flight limits, with injected
+per-request latency and optional 503 failures. Reports rows/sec and round
+trips per strategy, with one insert per table or one import_lab_batch call
+per batch. With --database-url it also loads a real Postgres (migrations
+applied) with the statements PostgREST would run per batch, with the
+import_lab_batch function and with the COPY backend.
+"""
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from supabase import create_client
+
+from async_import import run_async_import
+from csv_stream import iter_batches, iter_csv_rows
+from fake_supabase import InMemorySupabase
+from import_lab_to_supabase import LabDataImporter
+from mock_postgrest import MockPostgREST
+from postgres_copy_import import PostgresCopyImporter
+
+SOURCE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab_results_full.csv')
+MOCK_KEY = 'mock-service-role-key'
+
+
+def write_synthetic_csv(rows: int) -> str:
+    """Repeat the real extract until it has the requested number of rows"""
+    with open(SOURCE_CSV, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        source = list(reader)
+
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for index in range(rows):
+            writer.writerow(source[index % len(source)])
+    return path
+
+
+def report(name: str, rows: int, elapsed: float, round_trips: Any, **details) -> Dict[str, Any]:
+    result = dict(strategy=name, rows=rows, seconds=round(elapsed, 3), rows_per_s=round(rows / elapsed),
+                  round_trips=round_trips, **details)
+    print(f"{name:18} {result['rows_per_s']:10,} rows/s  {round_trips:>6} round trips  "
+          + '  '.join(f"{value} {key.replace('_', ' ')}" for key, value in details.items()))
+    return result
+
+
+def run(name: str, csv_file: str, rows: int, latency: float, failure_rate: float, batch_size: int,
+        max_in_flight: int = None, in_memory: bool = False, use_rpc: bool = False) -> Dict[str, Any]:
+    # compact: only ids are kept for lab_results / lab_parsed_values, so 1M-row runs fit in memory
+    mock = MockPostgREST(latency=latency, failure_rate=failure_rate, compact=True)
+    patient_id = mock.add_patient()
+    url = None if in_memory else mock.start()
+    try:
+        client = InMemorySupabase(mock) if in_memory else create_client(url, MOCK_KEY)
+        importer = LabDataImporter(client, url, MOCK_KEY, fingerprint_file=None, journal_file=None, use_rpc=use_rpc)
+        start = time.perf_counter()
+        if max_in_flight:
+            run_async_import(importer, csv_file, url, MOCK_KEY, patient_id, batch_size, max_in_flight=max_in_flight,
+                             backoff_base=0.01)
+        else:
+            importer.import_csv_data(csv_file, patient_id, batch_size)
+        elapsed = time.perf_counter() - start
+    finally:
+        mock.stop()
+
+    return report(name, rows, elapsed, mock.round_trips(), retries=importer.stats.get('retries', 0),
+                  results=len(mock.tables['lab_results']), parsed_values=len(mock.tables['lab_parsed_values']),
+                  errors=len(importer.stats['errors']))
+
+
+def create_benchmark_patient(dsn: str) -> str:
+    import psycopg
+
+    with psycopg.connect(dsn) as conn:
+        return str(conn.execute("insert into public.patients (full_name) values ('Import benchmark') "
+                                "returning id").fetchone()[0])
+
+
+def delete_benchmark_patient(dsn: str, patient_id: str):
+    import psycopg
+
+    with psycopg.connect(dsn) as conn:
+        conn.execute("delete from public.patients where id = %s", (patient_id,))
+
+
+def json_insert(conn, table: str, rows: list, suffix: str = ''):
+    """Insert a JSON array the way PostgREST does: only the keys present, column defaults for the rest"""
+    columns = ', '.join(rows[0])
+    conn.execute(f"insert into public.{table} ({columns}) select {columns} "
+                 f"from json_populate_recordset(null::public.{table}, %s) {suffix}", (json.dumps(rows),))
+
+
+def run_postgres_rest(csv_file: str, rows: int, dsn: str, batch_size: int) -> Dict[str, Any]:
+    """What PostgREST executes for the batched importer: a JSON recordset insert per request, each committed"""
+    import psycopg
+
+    importer = PostgresCopyImporter(dsn, fingerprint_file=None)  # only its row builders are used
+    patient_id = create_benchmark_patient(dsn)
+    start = time.perf_counter()
+    statements = 0
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        biomarkers = {}
+        for row in iter_csv_rows(csv_file):
+            if row['Biomarker'] not in biomarkers:
+                biomarkers[row['Biomarker']] = importer.build_biomarker(row['Biomarker'], row['Category'], row['Units'],
+                                                                        row['Ref_Min'], row['Ref_Max'])
+        json_insert(conn, 'biomarkers', list(biomarkers.values()), 'on conflict (name) do nothing')
+        biomarker_ids = dict(conn.execute("select name, id::text from public.biomarkers").fetchall())
+        statements += 2
+
+        for _, batch in iter_batches(iter_csv_rows(csv_file), batch_size):
+            lab_results = [importer.build_lab_result(patient_id, row) for row in batch]
+            parsed_values = [importer.build_lab_parsed_value(lab_result['id'], biomarker_ids[row['Biomarker']], row)
+                             for lab_result, row in zip(lab_results, batch)]
+            json_insert(conn, 'lab_results', lab_results)
+            json_insert(conn, 'lab_parsed_values', parsed_values)
+            statements += 2
+    elapsed = time.perf_counter() - start
+    delete_benchmark_patient(dsn, patient_id)
+    return report('postgres rest sql', rows, elapsed, statements)
+
+
+def run_postgres_rpc(csv_file: str, rows: int, dsn: str, batch_size: int) -> Dict[str, Any]:
+    """What PostgREST executes for the --rpc importer: one import_lab_batch call per request"""
+    import psycopg
+
+    importer = PostgresCopyImporter(dsn, fingerprint_file=None)  # only its row builders are used
+    patient_id = create_benchmark_patient(dsn)
+    start = time.perf_counter()
+    calls = 0
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        for _, batch in iter_batches(iter_csv_rows(csv_file), batch_size):
+            rpc_rows = [importer.build_rpc_row(patient_id, row) for row in batch]
+            conn.execute("select public.import_lab_batch(%s, %s::jsonb)", (patient_id, json.dumps(rpc_rows)))
+            calls += 1
+    elapsed = time.perf_counter() - start
+    delete_benchmark_patient(dsn, patient_id)
+    return report('postgres rpc', rows, elapsed, calls)
+
+
+def run_postgres_copy(csv_file: str, rows: int, dsn: str) -> Dict[str, Any]:
+    importer = PostgresCopyImporter(dsn, fingerprint_file=None)
+    patient_id = create_benchmark_patient(dsn)
+    start = time.perf_counter()
+    importer.import_csv_data(csv_file, patient_id)
+    elapsed = time.perf_counter() - start
+    delete_benchmark_patient(dsn, patient_id)
+    # create staging, COPY, three INSERT ... SELECT and the commit
+    return report('postgres copy', rows, elapsed, 6, results=importer.stats['lab_results_created'],
+                  parsed_values=importer.stats['lab_parsed_values_created'], errors=len(importer.stats['errors']))
+
+
+def run_suite(rows: int, args) -> List[Dict[str, Any]]:
+    csv_file = write_synthetic_csv(rows)
+    print(f"\n=== Import benchmark: {rows:,} rows, {args.latency * 1000:.0f} ms latency, "
+          f"{args.failure_rate:.0%} failures, batches of {args.batch_size} ===")
+    results = []
+    try:
+        if not args.failure_rate:
+            # The synchronous path does not retry, so it is only compared without failures
+            results.append(run('sync in-memory', csv_file, rows, args.latency, 0.0, args.batch_size, in_memory=True))
+            results.append(run('sync http', csv_file, rows, args.latency, 0.0, args.batch_size))
+            results.append(run('rpc in-memory', csv_file, rows, args.latency, 0.0, args.batch_size, in_memory=True,
+                               use_rpc=True))
+            results.append(run('rpc http', csv_file, rows, args.latency, 0.0, args.batch_size, use_rpc=True))
+        for in_flight in args.in_flight:
+            results.append(run(f'async x{in_flight}', csv_file, rows, args.latency, args.failure_rate,
+                               args.batch_size, in_flight))
+        if args.database_url:
+            results.append(run_postgres_rest(csv_file, rows, args.database_url, args.batch_size))
+            results.append(run_postgres_rpc(csv_file, rows, args.database_url, args.batch_size))
+            results.append(run_postgres_copy(csv_file, rows, args.database_url))
+    finally:
+        os.remove(csv_file)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark lab import strategies against an in-memory backend')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000],
+                        help='Synthetic CSV sizes in rows')
+    parser.add_argument('--latency', type=float, default=0.02, help='Injected seconds per request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 4, 16], help='Async concurrency levels')
+    parser.add_argument('--database-url', help='Also benchmark direct loads into this Postgres (migrations applied)')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.sizes:
+        results.extend(run_suite(rows, args))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'latency_s': args.latency, 'failure_rate': args.failure_rate, 'batch_size': args.batch_size,
+                       'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for result containers
+Parses FULL_LAB_DATA repeated until the requested row count and compares the
+traced allocation of a list of dicts with the columnar LabResultStore
+"""
+
+import gc
+import sys
+import tracemalloc
+from itertools import islice, cycle
+
+from process_full_pdf import FULL_LAB_DATA, FullLabDataProcessor
+
+
+def traced_size(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    container = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return size
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    processor = FullLabDataProcessor()
+    report_lines = FULL_LAB_DATA.strip().split('\n')
+
+    def records():
+        return islice(processor.iter_records(cycle(report_lines)), rows)
+
+    def build_store():
+        store = FullLabDataProcessor().results
+        store.extend(records())
+        return store
+
+    list_bytes = traced_size(lambda: list(records()))
+    store_bytes = traced_size(build_store)
+
+    print(f"=== Result container memory: {rows:,} rows ===")
+    print(f"list of dicts   {list_bytes / 2**20:10.1f} MiB")
+    print(f"LabResultStore  {store_bytes / 2**20:10.1f} MiB")
+    print(f"reduction       {list_bytes / store_bytes:10.1f}x")
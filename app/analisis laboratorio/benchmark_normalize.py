@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for lab_normalize
+Compares the memoized date parser with datetime.strptime and the shared
+numeric parser with the old replace/float code, over the dates and values
+found in FULL_LAB_DATA
+"""
+
+import sys
+import timeit
+from datetime import datetime
+
+from lab_normalize import parse_date, parse_number
+from process_full_pdf import FULL_LAB_DATA, FullLabDataProcessor
+
+
+def legacy_number(value: str):
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def report(name: str, before, after, items, number: int):
+    before_s = min(timeit.repeat(lambda: [before(item) for item in items], number=number, repeat=5))
+    after_s = min(timeit.repeat(lambda: [after(item) for item in items], number=number, repeat=5))
+    calls = len(items) * number
+    print(f"{name:8} before {before_s / calls * 1e9:8.0f} ns/call   after {after_s / calls * 1e9:8.0f} ns/call"
+          f"   ({before_s / after_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    processor = FullLabDataProcessor()
+    processor.process_data(FULL_LAB_DATA)
+
+    dates = list(processor.results.column('Date'))
+    values = list(processor.results.column('Result'))
+    print(f"=== Normalization micro-benchmarks: {len(dates)} values x{number} "
+          f"({len(set(dates))} distinct dates) ===")
+
+    report('dates', lambda value: datetime.strptime(value, '%d.%m.%Y'), parse_date, dates, number)
+    report('numbers', legacy_number, parse_number, values, number)
+
+    # Cold cache: every call parses, no memo hits
+    parse_date.cache_clear()
+    report('dates*', lambda value: datetime.strptime(value, '%d.%m.%Y'), parse_date.__wrapped__, dates, number)
+    print("(* without the memo cache)")
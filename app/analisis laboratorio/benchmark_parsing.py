@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Parsing throughput benchmark on FULL_LAB_DATA
+Compares the original per-line loops (kept here as reference) with the shared
+compiled engine in lab_parser.py and checks both produce the same records
+"""
+
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from extract_lab_data import LabDataExtractor
+from process_full_pdf import FULL_LAB_DATA, FullLabDataProcessor
+
+
+def legacy_extractor_rows(extractor: LabDataExtractor, lines: List[str]) -> List[Dict]:
+    """Original LabDataExtractor loop: category scan plus inline re.match on every line"""
+    rows = []
+    current_category = None
+    for line in lines:
+        line = line.strip()
+        for cat_spanish, cat_english in extractor.categories.items():
+            if cat_spanish in line:
+                current_category = cat_english
+                break
+        pattern = r'^(.+?)\s+(\d{2}\.\d{2}\.\d{4})\s+([^\s]+)\s+(.+?)\s+([^\s]+)$'
+        match = re.match(pattern, line)
+        if match and current_category:
+            result, is_abnormal = extractor.parse_result_value(match.group(3).strip())
+            ref_min, ref_max = extractor.parse_reference_range(match.group(4).strip())
+            rows.append({
+                'Category': current_category,
+                'Biomarker': match.group(1).strip(),
+                'Date': match.group(2).strip(),
+                'Result': result,
+                'Ref_Min': ref_min if ref_min is not None else '',
+                'Ref_Max': ref_max if ref_max is not None else '',
+                'Units': match.group(5).strip(),
+                'Status': 'Abnormal' if is_abnormal else 'Normal',
+                'Original_Result': match.group(3).strip()
+            })
+    return rows
+
+
+def legacy_processor_rows(processor: FullLabDataProcessor, lines: List[str]) -> List[Dict]:
+    """Original FullLabDataProcessor loop: exact header scan plus re.match on every token"""
+    rows = []
+    current_category = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        for cat_spanish, cat_english in processor.categories.items():
+            if line == cat_spanish:
+                current_category = cat_english
+                break
+        if not current_category:
+            continue
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        date_idx = -1
+        for idx, part in enumerate(parts):
+            if re.match(r'\d{2}\.\d{2}\.\d{4}', part):
+                date_idx = idx
+                break
+        if date_idx <= 0 or date_idx + 1 >= len(parts):
+            continue
+        result_raw = parts[date_idx + 1]
+        result, is_abnormal = processor.parse_result_value(result_raw)
+        if result_raw in ['Undetected', 'Negative', 'Positive', 'Detected', 'Positive*', 'Detected*']:
+            ref_range = parts[date_idx + 2] if date_idx + 2 < len(parts) else ''
+            units = parts[-1] if parts[-1] not in ['—', result_raw, ref_range] else ''
+        else:
+            units = parts[-1] if parts[-1] != '—' else ''
+            ref_range = ' '.join(parts[date_idx + 2:-1]) if date_idx + 2 < len(parts) - 1 else '—'
+        ref_min, ref_max = processor.parse_reference_range(ref_range)
+        rows.append({
+            'Category': current_category,
+            'Biomarker': ' '.join(parts[:date_idx]),
+            'Date': parts[date_idx],
+            'Result': result,
+            'Ref_Min': ref_min,
+            'Ref_Max': ref_max,
+            'Units': units if units != '—' else '',
+            'Status': 'Abnormal' if is_abnormal else 'Normal'
+        })
+    return rows
+
+
+def engine_processor_rows(processor: FullLabDataProcessor, lines: List[str]) -> List[Dict]:
+    rows = []
+    for category, match in processor.parser.iter_rows(lines):
+        record = processor.build_record(category, match)
+        if record:
+            rows.append(record)
+    return rows
+
+
+def lines_per_second(parse: Callable[[List[str]], List[Dict]], lines: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(lines)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    lines = FULL_LAB_DATA.strip().split('\n') * copies
+
+    extractor = LabDataExtractor()
+    processor = FullLabDataProcessor()
+
+    cases = [
+        ('LabDataExtractor',
+         lambda ls: legacy_extractor_rows(extractor, ls),
+         lambda ls: list(extractor.iter_lab_records(ls))),
+        ('FullLabDataProcessor',
+         lambda ls: legacy_processor_rows(processor, ls),
+         lambda ls: engine_processor_rows(processor, ls)),
+    ]
+
+    print(f"=== Parsing benchmark: {len(lines)} lines (FULL_LAB_DATA x{copies}) ===")
+    for name, before, after in cases:
+        if before(lines) != after(lines):
+            print(f"{name}: engine output differs from the original parser!")
+            sys.exit(1)
+
+        before_lps = lines_per_second(before, lines, repeat=5)
+        after_lps = lines_per_second(after, lines, repeat=5)
+        print(f"{name:22} before {before_lps:12,.0f} lines/s   after {after_lps:12,.0f} lines/s"
+              f"   ({after_lps / before_lps:.2f}x)")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Bulk Lab Importer
+Imports many patients' CSV exports from a manifest of (patient, csv_file) rows,
+where patient is an external_id or an email. Patients are resolved with one
+query, then imported by parallel workers that share a single biomarker cache,
+fingerprint index and journal file. Writes a combined bulk_import_summary.json.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from supabase import create_client
+
+from import_lab_to_supabase import LabDataImporter
+from import_metrics import ImportMetrics
+
+
+def read_manifest(path: str) -> List[Tuple[str, str]]:
+    """Read (patient, csv_file) pairs; relative CSV paths are taken from the manifest's directory"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [(row['patient'].strip(), os.path.join(base, row['csv_file'].strip()))
+                for row in csv.DictReader(f) if row.get('patient') and row.get('csv_file')]
+
+
+def quote(value: str) -> str:
+    """Quote a value for a PostgREST in.(...) list"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def resolve_patients(importer: LabDataImporter, keys: List[str]) -> Dict[str, str]:
+    """Map each external_id or email to a patient id with a single request"""
+    external_ids = sorted({key for key in keys if '@' not in key})
+    emails = sorted({key for key in keys if '@' in key})
+    filters = []
+    if external_ids:
+        filters.append(f"external_id.in.({','.join(map(quote, external_ids))})")
+    if emails:
+        filters.append(f"email.in.({','.join(map(quote, emails))})")
+
+    result = importer.supabase.table('patients').select('id,external_id,email').or_(','.join(filters)).execute()
+    patients = {}
+    for patient in result.data:
+        for key in (patient.get('external_id'), patient.get('email')):
+            if key:
+                patients[key] = patient['id']
+    return patients
+
+
+class BulkLabImporter:
+    """Runs one LabDataImporter per patient on a thread pool with shared caches"""
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None, workers: int = 4,
+                 fingerprint_file: Optional[str] = 'lab_fingerprints.json',
+                 journal_file: Optional[str] = 'import_journal.jsonl'):
+        # The coordinator owns the shared state; every worker gets its own client so requests are metered per patient
+        self.coordinator = LabDataImporter(url=url, key=key, fingerprint_file=fingerprint_file, journal_file=None)
+        self.url = self.coordinator.url
+        self.key = self.coordinator.key
+        self.workers = workers
+        self.journal_file = journal_file
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.metrics = ImportMetrics()
+
+    def worker_importer(self) -> LabDataImporter:
+        importer = LabDataImporter(create_client(self.url, self.key), self.url, self.key, fingerprint_file=None,
+                                   journal_file=self.journal_file, name_cache_file=None)
+        importer.share_biomarker_cache(self.coordinator)
+        importer.fingerprint_index = self.coordinator.fingerprint_index
+        return importer
+
+    def import_patient(self, patient_id: str, csv_files: List[str], batch_size: int,
+                       resume: bool) -> Tuple[bool, LabDataImporter]:
+        """Worker: import one patient's files in order (never two imports of a patient at once)"""
+        importer = self.worker_importer()
+        start = time.perf_counter()
+        success = True
+        for csv_file in csv_files:
+            try:
+                success = importer.import_csv_data(csv_file, patient_id, batch_size, resume) and success
+            except Exception as e:
+                importer.stats['errors'].append(f"Import of {csv_file} aborted: {str(e)}")
+                success = False
+        importer.stats['elapsed_s'] = round(time.perf_counter() - start, 3)
+        return success, importer
+
+    def run(self, manifest: List[Tuple[str, str]], batch_size: int = 500, resume: bool = False) -> Dict[str, Any]:
+        coordinator = self.coordinator
+        patients = resolve_patients(coordinator, [patient_key for patient_key, _ in manifest])
+
+        jobs: Dict[str, List[str]] = {}
+        self.patient_keys: Dict[str, List[str]] = {}
+        for patient_key, csv_file in manifest:
+            if patient_key in patients:
+                jobs.setdefault(patients[patient_key], []).append(csv_file)
+                keys = self.patient_keys.setdefault(patients[patient_key], [])
+                if patient_key not in keys:
+                    keys.append(patient_key)
+            else:
+                self.results[patient_key] = {'success': False, 'csv_files': [csv_file],
+                                             'errors': ['Patient not found']}
+
+        # Load the catalog once; workers then only upsert biomarkers none of them has seen
+        coordinator.load_biomarker_catalog()
+
+        print(f"Importing {sum(map(len, jobs.values()))} CSV files for {len(jobs)} patients "
+              f"with {self.workers} workers ({len(self.results)} patients not found)...")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {patient_id: pool.submit(self.import_patient, patient_id, csv_files, batch_size, resume)
+                       for patient_id, csv_files in jobs.items()}
+            outcomes = {patient_id: future.result() for patient_id, future in futures.items()}
+
+        return self.summarize(jobs, outcomes)
+
+    def summarize(self, jobs: Dict[str, List[str]],
+                  outcomes: Dict[str, Tuple[bool, LabDataImporter]]) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {'patients': len(jobs), 'patients_failed': 0,
+                                  'patients_not_found': len(self.results), 'errors': 0}
+        self.metrics = ImportMetrics()
+        for patient_id, (success, importer) in outcomes.items():
+            stats = importer.stats
+            self.results[patient_id] = dict(stats, success=success, patient=self.patient_keys[patient_id],
+                                            csv_files=jobs[patient_id])
+            totals['patients_failed'] += not success
+            for name, value in stats.items():
+                if isinstance(value, (int, float)) and name != 'elapsed_s':
+                    totals[name] = totals.get(name, 0) + value
+            totals['errors'] += len(stats['errors'])
+            self.metrics.merge(importer.metrics)
+        return {'totals': totals, 'metrics': self.metrics.as_dict(), 'patients': self.results}
+
+    def print_summary(self, summary: Dict[str, Any], filename: str = 'bulk_import_summary.json'):
+        print("\n" + "="*50)
+        print("BULK IMPORT SUMMARY")
+        print("="*50)
+        for name, result in summary['patients'].items():
+            status = 'ok' if result.get('success') else 'FAILED'
+            label = ', '.join(result.get('patient', [name]))
+            print(f"  {label:38} {status:6} {result.get('lab_results_created', 0):7} results  "
+                  f"{len(result.get('errors', []))} errors")
+        for name, value in summary['totals'].items():
+            print(f"{name}: {value}")
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"\nDetailed summary saved to {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import lab CSVs for many patients in parallel')
+    parser.add_argument('manifest', help='CSV with columns patient (external_id or email) and csv_file')
+    parser.add_argument('-j', '--workers', type=int, default=4, help='Patients imported concurrently')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--resume', action='store_true', help='Continue interrupted imports from the journal')
+    parser.add_argument('--fingerprints', default='lab_fingerprints.json')
+    parser.add_argument('--journal', default='import_journal.jsonl')
+    parser.add_argument('--metrics-textfile', help='Also write combined metrics as a Prometheus textfile')
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.manifest)
+    if not manifest:
+        print("Manifest has no (patient, csv_file) rows")
+        sys.exit(1)
+
+    try:
+        bulk = BulkLabImporter(workers=args.workers, fingerprint_file=args.fingerprints, journal_file=args.journal)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    summary = bulk.run(manifest, args.batch_size, args.resume)
+    bulk.print_summary(summary)
+    if args.metrics_textfile:
+        bulk.metrics.write_prometheus(args.metrics_textfile, summary['totals'])
+    if any(not result.get('success') for result in summary['patients'].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Streaming CSV input for the importers
+Rows are read lazily and grouped into batches on the fly, so the first insert
+is sent as soon as one batch is read and memory stays flat however large the
+export is. '.gz' and '.zst' inputs are decompressed transparently (zstd needs
+the optional 'zstandard' package).
+"""
+
+import csv
+import gzip
+import io
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple
+
+
+def open_text(path: str) -> TextIO:
+    """Open a plain, gzip or zstd compressed text file for reading"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(f"Reading {path} requires the 'zstandard' package (pip install zstandard)")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def iter_csv_rows(path: str) -> Iterator[Dict[str, str]]:
+    """Yield the lab rows of a CSV export, skipping rows without a biomarker"""
+    with open_text(path) as f:
+        for row in csv.DictReader(f):
+            if row.get('Biomarker'):
+                yield row
+
+
+def iter_batches(rows: Iterable[Dict[str, str]], batch_size: int) -> Iterator[Tuple[int, List[Dict[str, str]]]]:
+    """Group rows into (index of first row, rows) batches"""
+    batch = []
+    batch_start = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch_start, batch
+            batch_start += batch_size
+            batch = []
+    if batch:
+        yield batch_start, batch
@@ -4,15 +4,24 @@ Lab Results Extractor for Ornament Health PDF
 Extracts laboratory test results and creates structured CSV files
 """
 
-import re
+import io
+import sys
 import csv
-from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 import json
 
+from lab_normalize import parse_number
+from lab_parser import LabLineParser, STRICT_ROW_GRAMMAR
+from lab_store import LabResultStore
+from lab_aggregate import aggregate
+from lab_timeseries import BiomarkerTimeSeriesIndex
+from lab_trends import LabTrends
+
+CSV_FIELDNAMES = ['Category', 'Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max', 'Units', 'Status']
+
 class LabDataExtractor:
     def __init__(self):
-        self.results = []
+        self.results = LabResultStore(CSV_FIELDNAMES + ['Original_Result'])
         self.categories = {
             'Signos Vitales': 'Vital Signs',
             'Análisis bioquímicos (sangre)': 'Blood Chemistry',
@@ -24,6 +33,7 @@ class LabDataExtractor:
             'Estudios hormonales': 'Hormonal Studies',
             'Examen clínico general': 'Complete Blood Count'
         }
+        self.parser = LabLineParser(self.categories, STRICT_ROW_GRAMMAR)
 
     def parse_reference_range(self, ref_range: str) -> Tuple[Optional[float], Optional[float]]:
         """Parse reference range string into min and max values"""
@@ -38,19 +48,14 @@ class LabDataExtractor:
         else:
             return None, None
 
-        try:
-            # Clean up the values
-            min_val = parts[0].strip().replace(',', '')
-            max_val = parts[1].strip().replace(',', '') if len(parts) > 1 else None
-
-            # Handle special cases like "15M − 120M"
-            min_val = re.sub(r'[MK]', '', min_val)
-            if max_val:
-                max_val = re.sub(r'[MK]', '', max_val)
+        # Values may carry K/M suffixes ("3.4K − 9.6K"), which are scaled
+        min_val = parse_number(parts[0])
+        max_raw = parts[1].strip() if len(parts) > 1 else ''
+        max_val = parse_number(max_raw) if max_raw else None
 
-            return float(min_val), float(max_val) if max_val else None
-        except:
+        if min_val is None or (max_raw and max_val is None):
             return None, None
+        return min_val, max_val
 
     def parse_result_value(self, result: str) -> Tuple[str, bool]:
         """Parse result value and determine if it's abnormal"""
@@ -63,141 +68,111 @@ class LabDataExtractor:
 
         return clean_result.strip(), is_abnormal
 
+    def iter_lab_records(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """Yield laboratory records one at a time from a file object or any iterable of lines"""
+        for category, match in self.parser.iter_rows(lines):
+            result_raw = match.group('result')
+
+            # Parse result and check if abnormal
+            result, is_abnormal = self.parse_result_value(result_raw)
+
+            # Parse reference range
+            ref_min, ref_max = self.parse_reference_range(match.group('range'))
+
+            yield {
+                'Category': category,
+                'Biomarker': match.group('biomarker'),
+                'Date': match.group('date'),
+                'Result': result,
+                'Ref_Min': ref_min if ref_min is not None else '',
+                'Ref_Max': ref_max if ref_max is not None else '',
+                'Units': match.group('units'),
+                'Status': 'Abnormal' if is_abnormal else 'Normal',
+                'Original_Result': result_raw
+            }
+
     def extract_lab_data(self, text_content: str):
         """Extract laboratory data from the PDF text content"""
-        lines = text_content.split('\n')
-        current_category = None
-
-        for i, line in enumerate(lines):
-            line = line.strip()
-
-            # Check if this is a category header
-            for cat_spanish, cat_english in self.categories.items():
-                if cat_spanish in line:
-                    current_category = cat_english
-                    break
-
-            # Try to parse data lines (format: biomarker date result range units)
-            # Using regex to match the pattern
-            pattern = r'^(.+?)\s+(\d{2}\.\d{2}\.\d{4})\s+([^\s]+)\s+(.+?)\s+([^\s]+)$'
-            match = re.match(pattern, line)
-
-            if match and current_category:
-                biomarker = match.group(1).strip()
-                date = match.group(2).strip()
-                result_raw = match.group(3).strip()
-                ref_range = match.group(4).strip()
-                units = match.group(5).strip()
-
-                # Parse result and check if abnormal
-                result, is_abnormal = self.parse_result_value(result_raw)
-
-                # Parse reference range
-                ref_min, ref_max = self.parse_reference_range(ref_range)
-
-                # Create record
-                record = {
-                    'Category': current_category,
-                    'Biomarker': biomarker,
-                    'Date': date,
-                    'Result': result,
-                    'Ref_Min': ref_min if ref_min is not None else '',
-                    'Ref_Max': ref_max if ref_max is not None else '',
-                    'Units': units,
-                    'Status': 'Abnormal' if is_abnormal else 'Normal',
-                    'Original_Result': result_raw
-                }
+        self.results.extend(self.iter_lab_records(io.StringIO(text_content)))
 
-                self.results.append(record)
-
-    def save_to_csv(self, filename: str, records: List[Dict] = None):
-        """Save records to CSV file"""
+    def save_to_csv(self, filename: str, records: Iterable[Dict] = None) -> int:
+        """Save records to CSV file, consuming them lazily; returns the number written"""
         if records is None:
             records = self.results
 
-        if not records:
+        records = iter(records)
+        first = next(records, None)
+        if first is None:
             print(f"No records to save to {filename}")
-            return
-
-        fieldnames = ['Category', 'Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max', 'Units', 'Status']
+            return 0
 
         with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            # Original_Result is dropped from the CSV output
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES, extrasaction='ignore')
             writer.writeheader()
+            writer.writerow(first)
+            count = 1
             for record in records:
-                # Remove Original_Result field for CSV output
-                csv_record = {k: v for k, v in record.items() if k != 'Original_Result'}
-                writer.writerow(csv_record)
-
-    def create_summary_statistics(self):
-        """Generate summary statistics for the lab results"""
-        summary = {
-            'total_tests': len(self.results),
-            'abnormal_tests': sum(1 for r in self.results if r['Status'] == 'Abnormal'),
-            'normal_tests': sum(1 for r in self.results if r['Status'] == 'Normal'),
-            'categories': {},
-            'date_range': {'earliest': None, 'latest': None}
-        }
+                writer.writerow(record)
+                count += 1
 
-        # Process dates
-        dates = []
-        for record in self.results:
-            try:
-                date_obj = datetime.strptime(record['Date'], '%d.%m.%Y')
-                dates.append(date_obj)
-            except:
-                pass
-
-        if dates:
-            summary['date_range']['earliest'] = min(dates).strftime('%Y-%m-%d')
-            summary['date_range']['latest'] = max(dates).strftime('%Y-%m-%d')
-
-        # Category statistics
-        for record in self.results:
-            cat = record['Category']
-            if cat not in summary['categories']:
-                summary['categories'][cat] = {
-                    'total': 0,
-                    'abnormal': 0,
-                    'biomarkers': set()
+        return count
+
+    def create_summary_statistics(self, records: Iterable[Dict] = None):
+        """Generate summary statistics for the lab results in a single pass over records"""
+        if records is None:
+            records = self.results
+
+        aggregates = aggregate(records, self.results.fieldnames)
+
+        return {
+            'total_tests': aggregates.total,
+            'abnormal_tests': aggregates.abnormal,
+            'normal_tests': aggregates.normal,
+            'categories': {
+                cat: {
+                    'total': stats['total'],
+                    'abnormal': stats['abnormal'],
+                    'unique_biomarkers': len(aggregates.category_biomarkers[cat])
                 }
-            summary['categories'][cat]['total'] += 1
-            if record['Status'] == 'Abnormal':
-                summary['categories'][cat]['abnormal'] += 1
-            summary['categories'][cat]['biomarkers'].add(record['Biomarker'])
+                for cat, stats in aggregates.categories.items()
+            },
+            'date_range': aggregates.date_range()
+        }
+
+    def process_stream(self, lines: Iterable[str], complete_file: str, abnormal_file: str) -> Dict:
+        """Parse lines and write both CSVs plus the summary in one pass without retaining records
+
+        Records are folded into the summary in CHUNK_ROWS chunks; memory is bounded by
+        one chunk plus SAMPLE_SIZE values per biomarker (see lab_aggregate).
+        """
+        with open(complete_file, 'w', newline='', encoding='utf-8') as complete_csv, \
+                open(abnormal_file, 'w', newline='', encoding='utf-8') as abnormal_csv:
+            complete_writer = csv.DictWriter(complete_csv, fieldnames=CSV_FIELDNAMES, extrasaction='ignore')
+            abnormal_writer = csv.DictWriter(abnormal_csv, fieldnames=CSV_FIELDNAMES, extrasaction='ignore')
+            complete_writer.writeheader()
+            abnormal_writer.writeheader()
 
-        # Convert sets to counts for JSON serialization
-        for cat in summary['categories']:
-            summary['categories'][cat]['unique_biomarkers'] = len(summary['categories'][cat]['biomarkers'])
-            del summary['categories'][cat]['biomarkers']
+            def written_records():
+                for record in self.iter_lab_records(lines):
+                    complete_writer.writerow(record)
+                    if record['Status'] == 'Abnormal':
+                        abnormal_writer.writerow(record)
+                    yield record
 
-        return summary
+            return self.create_summary_statistics(written_records())
 
     def filter_abnormal_results(self) -> List[Dict]:
         """Filter and return only abnormal results"""
-        return [r for r in self.results if r['Status'] == 'Abnormal']
+        return list(self.results.where('Status', 'Abnormal'))
 
     def create_biomarker_timeline(self) -> Dict:
         """Create timeline view of each biomarker"""
-        timeline = {}
+        return BiomarkerTimeSeriesIndex.from_records(self.results).timeline()
 
-        for record in self.results:
-            biomarker = record['Biomarker']
-            if biomarker not in timeline:
-                timeline[biomarker] = []
-
-            timeline[biomarker].append({
-                'Date': record['Date'],
-                'Result': record['Result'],
-                'Status': record['Status'],
-                'Category': record['Category']
-            })
-
-        # Sort by date for each biomarker
-        for biomarker in timeline:
-            timeline[biomarker].sort(key=lambda x: datetime.strptime(x['Date'], '%d.%m.%Y'))
-
-        return timeline
+    def create_biomarker_trends(self, window: int = 5) -> Dict:
+        """Deltas, 30-day slopes, rolling mean/median and days since abnormal per biomarker"""
+        return LabTrends(self.results, window).as_dict()
 
 
 # Sample data to process (this would come from the actual PDF parsing)
@@ -262,20 +237,28 @@ if __name__ == "__main__":
     # Initialize extractor
     extractor = LabDataExtractor()
 
-    # Process the sample data (in real use, this would be the full PDF content)
-    extractor.extract_lab_data(sample_lab_data)
+    if len(sys.argv) > 1:
+        # Stream a text export from disk: records are written as they are parsed
+        with open(sys.argv[1], 'r', encoding='utf-8') as report:
+            summary = extractor.process_stream(report, 'lab_results_complete.csv', 'lab_results_abnormal.csv')
+        print(f"Saved {summary['total_tests']} lab results to lab_results_complete.csv")
+        print(f"Saved {summary['abnormal_tests']} abnormal results to lab_results_abnormal.csv")
+    else:
+        # Process the sample data (in real use, this would be the full PDF content)
+        extractor.extract_lab_data(sample_lab_data)
+
+        # Save complete results
+        extractor.save_to_csv('lab_results_complete.csv')
+        print(f"Saved {len(extractor.results)} lab results to lab_results_complete.csv")
 
-    # Save complete results
-    extractor.save_to_csv('lab_results_complete.csv')
-    print(f"Saved {len(extractor.results)} lab results to lab_results_complete.csv")
+        # Save abnormal results
+        abnormal = extractor.filter_abnormal_results()
+        extractor.save_to_csv('lab_results_abnormal.csv', abnormal)
+        print(f"Saved {len(abnormal)} abnormal results to lab_results_abnormal.csv")
 
-    # Save abnormal results
-    abnormal = extractor.filter_abnormal_results()
-    extractor.save_to_csv('lab_results_abnormal.csv', abnormal)
-    print(f"Saved {len(abnormal)} abnormal results to lab_results_abnormal.csv")
+        summary = extractor.create_summary_statistics()
 
-    # Generate and save summary statistics
-    summary = extractor.create_summary_statistics()
+    # Save summary statistics
     with open('lab_results_summary.json', 'w', encoding='utf-8') as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
     print(f"Saved summary statistics to lab_results_summary.json")
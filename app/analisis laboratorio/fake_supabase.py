@@ -0,0 +1,130 @@
+"""
+In-memory Supabase backend for LabDataImporter
+The importer only talks to its backend through client.table(name) query
+builders (select/eq/gt/or_/order/range/limit, insert/upsert, execute) and
+client.rpc(name, params), so any object offering that subset can be
+injected as LabDataImporter(client).
+InMemorySupabase implements it on top of a MockPostgREST store without a
+server or sockets: same unique/foreign-key checks, same injectable latency
+and failures, same JSON encoding of every request and response, and the
+same httpx event hooks, so ImportMetrics reports it like a real client.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+from postgrest import APIResponse
+from postgrest.base_request_builder import SingleAPIResponse
+from postgrest.exceptions import APIError
+
+from mock_postgrest import MockPostgREST
+
+
+class InMemorySession:
+    """Holds httpx-style event hooks, so ImportMetrics.instrument works on the fake client"""
+
+    def __init__(self):
+        self.event_hooks: Dict[str, list] = {'request': [], 'response': []}
+
+
+class InMemoryQuery:
+    """The query-builder subset used by the importers, building a PostgREST query string"""
+
+    def __init__(self, client: 'InMemorySupabase', table: str):
+        self.client = client
+        self.table = table
+        self.method = 'GET'
+        self.query: List = []
+        self.prefer = ''
+        self.payload: Any = None
+
+    def select(self, columns: str = '*') -> 'InMemoryQuery':
+        self.query.append(('select', columns.replace(' ', '')))
+        return self
+
+    def eq(self, column: str, value: Any) -> 'InMemoryQuery':
+        self.query.append((column, f'eq.{value}'))
+        return self
+
+    def gt(self, column: str, value: Any) -> 'InMemoryQuery':
+        self.query.append((column, f'gt.{value}'))
+        return self
+
+    def in_(self, column: str, values) -> 'InMemoryQuery':
+        quoted = [f'"{value}"' if any(char in str(value) for char in ',:()') else str(value) for value in values]
+        self.query.append((column, f"in.({','.join(quoted)})"))
+        return self
+
+    def or_(self, filters: str) -> 'InMemoryQuery':
+        self.query.append(('or', f'({filters})'))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> 'InMemoryQuery':
+        self.query.append(('order', f"{column}.{'desc' if desc else 'asc'}"))
+        return self
+
+    def range(self, start: int, end: int) -> 'InMemoryQuery':
+        self.query += [('offset', str(start)), ('limit', str(end - start + 1))]
+        return self
+
+    def limit(self, size: int) -> 'InMemoryQuery':
+        self.query.append(('limit', str(size)))
+        return self
+
+    def insert(self, rows, returning: str = 'representation') -> 'InMemoryQuery':
+        self.method = 'POST'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.prefer = f'return={returning}'
+        return self
+
+    def upsert(self, rows, on_conflict: str = '', ignore_duplicates: bool = False,
+               returning: str = 'representation') -> 'InMemoryQuery':
+        self.insert(rows, returning)
+        resolution = 'ignore-duplicates' if ignore_duplicates else 'merge-duplicates'
+        self.prefer += f',resolution={resolution}'
+        if on_conflict:
+            self.query.append(('on_conflict', on_conflict))
+        return self
+
+    def execute(self) -> APIResponse:
+        return self.client.execute(self)
+
+
+class InMemorySupabase:
+    """Stand-in for a supabase Client backed by an in-process MockPostgREST store"""
+
+    def __init__(self, store: Optional[MockPostgREST] = None, url: str = 'http://in-memory'):
+        self.store = store or MockPostgREST()
+        self.url = url
+        self.session = InMemorySession()
+        self.postgrest = self  # Mirrors client.postgrest.session on a real client
+
+    def table(self, name: str) -> InMemoryQuery:
+        return InMemoryQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> InMemoryQuery:
+        query = InMemoryQuery(self, f'rpc/{name}')
+        query.method = 'POST'
+        query.payload = params
+        return query
+
+    def execute(self, query: InMemoryQuery) -> APIResponse:
+        body = json.dumps(query.payload).encode() if query.payload is not None else b''
+        request = httpx.Request(query.method, f'{self.url}/rest/v1/{query.table}', params=query.query, content=body,
+                                headers={'Prefer': query.prefer} if query.prefer else None)
+        for hook in self.session.event_hooks['request']:
+            hook(request)
+
+        status, data = self.store.handle(query.method, query.table, query.query, body, query.prefer)
+        response = httpx.Response(status, content=json.dumps(data).encode() if data is not None else b'',
+                                  request=request)
+        for hook in self.session.event_hooks['response']:
+            hook(response)
+
+        data = response.json() if response.content else []
+        if status >= 400:
+            raise APIError(data)
+        if not isinstance(data, list):
+            return SingleAPIResponse(data=data, count=None)  # e.g. a function returning json
+        return APIResponse(data=data, count=None)
@@ -0,0 +1,104 @@
+"""
+Write-ahead journal of committed import batches
+Each batch is appended (and fsynced) as soon as the database accepts it: the
+input file hash, the patient, the batch range and the lab_results ids it
+created together with the ids chosen for its parsed values. A resumed import
+replays the journal to skip committed batches, and finishes a batch whose
+lab_results were stored by re-sending its parsed values under the recorded
+ids, so ones the server had already committed are ignored, not duplicated.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+# Journals of parallel imports may share one file; each entry must land as one line
+APPEND_LOCK = threading.Lock()
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Identify an input by a hash of its full contents, read once sequentially
+
+    Anything less (size plus sampled blocks) would let an export edited in the
+    middle resume against the batch ranges of the old one.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImportJournal:
+    """Append-only JSON-lines log of batches committed per (input file, patient)"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.entries: List[Dict[str, Any]] = []
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # Torn last write from a crash; everything before it is intact
+        self.source: Dict[str, str] = {}
+        self.batches: Dict[int, Dict[str, Any]] = {}
+
+    def append(self, entry: Dict[str, Any]):
+        entry = dict(self.source, **entry)
+        self.entries.append(entry)
+        line = json.dumps(entry) + '\n'
+        with APPEND_LOCK, open(self.filename, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def begin(self, source_hash: str, patient_id: str, batch_size: int, resume: bool = False) -> int:
+        """Start or resume the journal for one import; returns the batch size to use
+
+        Batch ranges are only comparable with the same batch size, so a resumed
+        import keeps the size of the run it continues.
+        """
+        self.source = {'file': source_hash, 'patient_id': patient_id}
+        self.batches = {}
+        started = None
+        if resume:
+            for entry in self.entries:
+                if entry.get('file') != source_hash or entry.get('patient_id') != patient_id:
+                    continue
+                if entry['event'] == 'start':
+                    started = entry
+                    self.batches = {}
+                elif entry['event'] == 'lab_results':
+                    self.batches[entry['start']] = {'rows': entry['rows'], 'lab_result_ids': entry['lab_result_ids'],
+                                                    'parsed_value_ids': entry.get('parsed_value_ids'),
+                                                    'complete': False}
+                elif entry['event'] == 'complete':
+                    self.batches.setdefault(entry['start'], {})['complete'] = True
+
+        if started is None:
+            self.append({'event': 'start', 'batch_size': batch_size})
+            return batch_size
+        return started['batch_size']
+
+    def batch(self, start: int) -> Optional[Dict[str, Any]]:
+        """Journal state of the batch starting at this row, or None if nothing was committed"""
+        return self.batches.get(start)
+
+    def record_lab_results(self, start: int, rows: List[int], lab_result_ids: List[str],
+                           parsed_value_ids: Optional[List[str]] = None):
+        """The batch's lab_results are stored: rows are the input positions sent, in id order
+
+        parsed_value_ids (one per row) are the ids its parsed values are sent with.
+        """
+        self.batches[start] = {'rows': rows, 'lab_result_ids': lab_result_ids, 'parsed_value_ids': parsed_value_ids,
+                               'complete': False}
+        self.append({'event': 'lab_results', 'start': start, 'rows': rows, 'lab_result_ids': lab_result_ids,
+                     'parsed_value_ids': parsed_value_ids})
+
+    def record_complete(self, start: int):
+        self.batches.setdefault(start, {})['complete'] = True
+        self.append({'event': 'complete', 'start': start})
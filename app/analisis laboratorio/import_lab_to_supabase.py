@@ -5,28 +5,57 @@ Processes extracted lab data and imports it into the Supabase database structure
 """
 
 import os
-import csv
+import argparse
 import json
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import threading
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from csv_stream import iter_batches, iter_csv_rows
+from import_journal import ImportJournal, file_hash
+from import_metrics import ImportMetrics
+from lab_fingerprints import FingerprintIndex, row_fingerprint, stored_fingerprint
+from lab_names import BiomarkerNameIndex
+from lab_normalize import parse_number, to_iso_date
+from lab_ranges import RangeCatalog
+from lab_units import canonical_spelling, conversion, normalize_value
+
 # Load environment variables from parent app directory
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env.local')
 load_dotenv(env_path)
 
-class LabDataImporter:
-    def __init__(self):
-        # Initialize Supabase client
-        url = os.environ.get('NEXT_PUBLIC_SUPABASE_URL')
-        key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
-
-        if not url or not key:
-            raise ValueError("Supabase credentials not found in environment variables")
+# uuid5 namespace of the lab_results ids derived from (input file, patient, row position)
+IMPORT_ID_NAMESPACE = uuid.UUID('e6f0e93d-b81c-50ca-b00e-a5a47472aeee')
 
-        self.supabase: Client = create_client(url, key)
+class LabDataImporter:
+    def __init__(self, client: Optional[Client] = None, url: Optional[str] = None, key: Optional[str] = None,
+                 fingerprint_file: Optional[str] = 'lab_fingerprints.json',
+                 journal_file: Optional[str] = 'import_journal.jsonl', use_rpc: bool = False,
+                 name_cache_file: Optional[str] = 'biomarker_names.json'):
+        # Initialize Supabase client (a client can be injected, e.g. one pointing at a local PostgREST)
+        self.url = url or os.environ.get('NEXT_PUBLIC_SUPABASE_URL')
+        self.key = key or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+        self.supabase: Client = self.connect(client)
+        self.metrics = ImportMetrics()
+        if self.supabase is not None:
+            self.metrics.instrument(self.supabase.postgrest.session)
         self.biomarker_map = {}  # Cache biomarker name to ID mapping
+        self.biomarker_units: Dict[str, str] = {}  # Catalog name -> unit, where known
+        self.ranges = RangeCatalog()  # Catalog reference/critical ranges, for is_critical
+        # Raw report names -> catalog names, so spelling variants reuse one biomarker
+        self.name_index = BiomarkerNameIndex(name_cache_file)
+        self.catalog_loaded = False
+        self.biomarker_lock = threading.Lock()  # Guards catalog load / bulk create when the cache is shared
+        self.new_biomarkers = set()  # Created in bulk, not yet counted per row
+        # Natural-key fingerprints of rows already stored (None disables de-duplication)
+        self.fingerprint_index = FingerprintIndex(fingerprint_file) if fingerprint_file else None
+        # Write-ahead log of committed batches (None disables resuming)
+        self.journal = ImportJournal(journal_file) if journal_file else None
+        self.source_hash: Optional[str] = None  # Hash of the file being imported
+        # Send each batch to the import_lab_batch function instead of one insert per table
+        self.use_rpc = use_rpc
         self.category_mapping = {
             'Vital Signs': 'vital_signs',
             'Blood Chemistry': 'blood_chemistry',
@@ -43,33 +72,136 @@ class LabDataImporter:
             'biomarkers_existing': 0,
             'lab_results_created': 0,
             'lab_parsed_values_created': 0,
+            'rows_skipped_existing': 0,
+            'batches_resumed': 0,
             'errors': []
         }
 
+    def connect(self, client: Optional[Client]) -> Client:
+        """Return the Supabase client used for all reads and writes"""
+        if client is None:
+            if not self.url or not self.key:
+                raise ValueError("Supabase credentials not found in environment variables")
+
+            client = create_client(self.url, self.key)
+        return client
+
     def convert_date(self, date_str: str) -> str:
         """Convert date from DD.MM.YYYY to YYYY-MM-DD format"""
-        try:
-            dt = datetime.strptime(date_str, '%d.%m.%Y')
-            return dt.strftime('%Y-%m-%d')
-        except:
-            return date_str
+        return to_iso_date(date_str)
 
     def parse_numeric_value(self, value: str) -> Optional[float]:
-        """Parse numeric value from string"""
-        try:
-            # Remove any thousand separators and convert decimal point
-            cleaned = value.replace(',', '')
-            return float(cleaned)
-        except:
-            return None
+        """Parse numeric value from string (K/M suffixes, '*' markers, locale separators)"""
+        return parse_number(value)
+
+    def parse_in_canonical_unit(self, biomarker: str, unit: str, value: str) -> Tuple[Optional[float], str]:
+        """Parse a value and convert it to the biomarker's canonical unit (see lab_units)"""
+        return normalize_value(biomarker, unit, self.parse_numeric_value(value) if value else None)
+
+    def build_biomarker(self, name: str, category: str, unit: str, ref_min: str, ref_max: str) -> Dict:
+        """Build a biomarkers row for a name seen in the lab data"""
+        reference_min, canonical_unit = self.parse_in_canonical_unit(name, unit, ref_min)
+        reference_max, _ = self.parse_in_canonical_unit(name, unit, ref_max)
+        return {
+            'name': name,
+            'display_name': name,
+            'category': self.category_mapping.get(category, 'other'),
+            'unit': canonical_unit,
+            'reference_min': reference_min,
+            'reference_max': reference_max,
+            'description': f'Imported from lab data - {category}'
+        }
+
+    def load_biomarker_catalog(self, page_size: int = 1000):
+        """Load the whole biomarkers table (name -> id) into the cache with a paginated read"""
+        start = 0
+        while True:
+            result = (self.supabase.table('biomarkers')
+                      .select('id,name,display_name,unit,reference_min,reference_max,critical_min,critical_max')
+                      .order('id').range(start, start + page_size - 1).execute())
+            for biomarker in result.data:
+                self.biomarker_map[biomarker['name']] = biomarker['id']
+                self.biomarker_units[biomarker['name']] = biomarker.get('unit')
+                self.name_index.add(biomarker['name'], biomarker.get('display_name'))
+                self.ranges.add(biomarker)
+            if len(result.data) < page_size:
+                break
+            start += page_size
+        self.catalog_loaded = True
+
+    def share_biomarker_cache(self, other: 'LabDataImporter'):
+        """Use another importer's biomarker cache (parallel imports resolve each biomarker once)"""
+        self.biomarker_map = other.biomarker_map
+        self.biomarker_units = other.biomarker_units
+        self.ranges = other.ranges
+        self.name_index = other.name_index
+        self.biomarker_lock = other.biomarker_lock
+        self.catalog_loaded = other.catalog_loaded
+
+    def canonical_name(self, raw_name: str, unit: Optional[str] = None) -> str:
+        """Catalog name a report name resolves to, or the raw name for a biomarker not in the catalog
+
+        With the reported unit, a catalog biomarker kept in another unit (once the value
+        is converted, see lab_units) is not used: its values and ranges would not compare.
+        """
+        name = self.name_index.resolve(raw_name)
+        if name is None:
+            return raw_name
+        catalog_unit = self.biomarker_units.get(name)
+        if unit is not None and catalog_unit is not None and name != raw_name \
+                and conversion(raw_name, unit)[0] != canonical_spelling(catalog_unit):
+            return raw_name
+        return name
+
+    def ensure_biomarkers(self, rows: List[Dict[str, str]]):
+        """Create every biomarker missing from the catalog with a single bulk upsert"""
+        # One thread at a time, so a biomarker shared by parallel imports is created once
+        with self.biomarker_lock:
+            if not self.catalog_loaded:
+                self.load_biomarker_catalog()
+
+            missing = {}
+            for row in rows:
+                name = self.canonical_name(row['Biomarker'], row['Units'])
+                if name not in self.biomarker_map and name not in missing:
+                    missing[name] = self.build_biomarker(name, row['Category'], row['Units'],
+                                                         row['Ref_Min'], row['Ref_Max'])
+            if not missing:
+                return
+
+            try:
+                # Names created concurrently (another import, import_lab_batch) are left as they are:
+                # only the rows actually inserted come back, the others are looked up
+                result = (self.supabase.table('biomarkers')
+                          .upsert(list(missing.values()), on_conflict='name', ignore_duplicates=True).execute())
+                created = {biomarker['name'] for biomarker in result.data}
+                existing = [name for name in missing if name not in created]
+                if existing:
+                    result.data += (self.supabase.table('biomarkers').select('id,name,display_name,unit')
+                                    .in_('name', existing).execute().data)
+            except Exception as e:
+                self.stats['errors'].append(f"Error creating {len(missing)} biomarkers: {str(e)}")
+                return
+
+            for biomarker in result.data:
+                self.biomarker_map[biomarker['name']] = biomarker['id']
+                self.biomarker_units[biomarker['name']] = biomarker.get('unit')
+                self.name_index.add(biomarker['name'], biomarker.get('display_name'))
+            self.new_biomarkers.update(created)
+            self.stats['biomarkers_created'] += len(created)
 
     def get_or_create_biomarker(self, name: str, category: str, unit: str,
                                ref_min: str, ref_max: str) -> Optional[str]:
         """Get existing biomarker or create new one, return biomarker ID"""
+        name = self.canonical_name(name, unit)
 
-        # Check cache first
+        # Check cache first (filled by load_biomarker_catalog / ensure_biomarkers)
         if name in self.biomarker_map:
-            self.stats['biomarkers_existing'] += 1
+            if name in self.new_biomarkers:
+                # First row of a biomarker created by ensure_biomarkers, already counted as created
+                self.new_biomarkers.discard(name)
+            else:
+                self.stats['biomarkers_existing'] += 1
             return self.biomarker_map[name]
 
         # Check if biomarker exists in database
@@ -78,87 +210,265 @@ class LabDataImporter:
         if result.data and len(result.data) > 0:
             biomarker_id = result.data[0]['id']
             self.biomarker_map[name] = biomarker_id
+            self.name_index.add(name)
             self.stats['biomarkers_existing'] += 1
             return biomarker_id
 
         # Create new biomarker
-        biomarker_data = {
-            'name': name,
-            'display_name': name,
-            'category': self.category_mapping.get(category, 'other'),
-            'unit': unit if unit else '',
-            'reference_min': self.parse_numeric_value(ref_min) if ref_min else None,
-            'reference_max': self.parse_numeric_value(ref_max) if ref_max else None,
-            'description': f'Imported from lab data - {category}'
-        }
+        biomarker_data = self.build_biomarker(name, category, unit, ref_min, ref_max)
 
         try:
             result = self.supabase.table('biomarkers').insert(biomarker_data).execute()
             if result.data and len(result.data) > 0:
                 biomarker_id = result.data[0]['id']
                 self.biomarker_map[name] = biomarker_id
+                self.biomarker_units[name] = biomarker_data['unit']
+                self.name_index.add(name)
                 self.stats['biomarkers_created'] += 1
                 return biomarker_id
         except Exception as e:
             self.stats['errors'].append(f"Error creating biomarker {name}: {str(e)}")
             return None
 
-    def import_lab_result(self, patient_id: str, row: Dict[str, str]) -> Optional[str]:
-        """Import a single lab result and return its ID"""
+    def sync_fingerprints(self, patient_id: str, page_size: int = 1000):
+        """Fetch fingerprints of rows stored for the patient since the last sync (one paginated lookup)"""
+        if self.fingerprint_index is None:
+            return
+
+        entry = self.fingerprint_index.entry(patient_id)
+        latest = entry['synced_at']
+        start = 0
+        while True:
+            query = (self.supabase.table('lab_results')
+                     .select('test_name,test_date,value,unit,created_at,lab_parsed_values(raw_value)')
+                     .eq('patient_id', patient_id))
+            if entry['synced_at']:
+                query = query.gt('created_at', entry['synced_at'])
+            result = query.order('created_at').range(start, start + page_size - 1).execute()
+
+            for lab_result in result.data:
+                entry['fingerprints'].add(stored_fingerprint(patient_id, lab_result))
+                if not latest or lab_result['created_at'] > latest:
+                    latest = lab_result['created_at']
+            if len(result.data) < page_size:
+                break
+            start += page_size
+
+        entry['synced_at'] = latest
+
+    def is_new_row(self, patient_id: str, row: Dict[str, str], seen: set) -> bool:
+        """False if the row is already stored or repeated earlier in the input (tracked in seen)"""
+        if self.fingerprint_index is None:
+            return True
+
+        row_key = row_fingerprint(patient_id, row)
+        if row_key in seen or row_key in self.fingerprint_index.fingerprints(patient_id):
+            self.stats['rows_skipped_existing'] += 1
+            return False
+        seen.add(row_key)
+        return True
 
-        # Parse values
-        value = self.parse_numeric_value(row['Result'])
-        ref_min = self.parse_numeric_value(row['Ref_Min']) if row['Ref_Min'] else None
-        ref_max = self.parse_numeric_value(row['Ref_Max']) if row['Ref_Max'] else None
-        is_critical = row['Status'] == 'Abnormal'
+    def new_rows(self, patient_id: str, rows: Iterable[Dict[str, str]],
+                 seen: Optional[set] = None) -> Iterator[Dict[str, str]]:
+        """Yield only rows whose fingerprint is not already stored (or repeated earlier in the input)"""
+        seen = set() if seen is None else seen
+        return (row for row in rows if self.is_new_row(patient_id, row, seen))
+
+    def record_committed(self, patient_id: str, batch: List[Dict[str, str]]):
+        """Remember the fingerprints of a batch whose lab_results were committed"""
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.fingerprints(patient_id).update(row_fingerprint(patient_id, row) for row in batch)
+
+    def build_lab_result(self, patient_id: str, row: Dict[str, str]) -> Dict:
+        """Build a lab_results row; the id is generated here so parsed values can link to it"""
+
+        # Parse values into the biomarker's canonical unit
+        value, unit = self.parse_in_canonical_unit(row['Biomarker'], row['Units'], row['Result'])
+        ref_min, _ = self.parse_in_canonical_unit(row['Biomarker'], row['Units'], row['Ref_Min'])
+        ref_max, _ = self.parse_in_canonical_unit(row['Biomarker'], row['Units'], row['Ref_Max'])
+        # Outside the catalog's critical limits, not the report's '*' (see lab_ranges)
+        is_critical = self.ranges.is_critical(row['Biomarker'], unit, value)
         test_date = self.convert_date(row['Date'])
 
-        lab_result_data = {
+        return {
+            'id': str(uuid.uuid4()),
             'patient_id': patient_id,
             'test_name': row['Biomarker'],
             'value': value,
-            'unit': row['Units'] if row['Units'] else None,
+            'unit': unit if unit else None,
             'reference_min': ref_min,
             'reference_max': ref_max,
             'is_critical': is_critical,
             'test_date': test_date
         }
 
-        try:
-            result = self.supabase.table('lab_results').insert(lab_result_data).execute()
-            if result.data and len(result.data) > 0:
-                self.stats['lab_results_created'] += 1
-                return result.data[0]['id']
-        except Exception as e:
-            self.stats['errors'].append(f"Error creating lab result for {row['Biomarker']}: {str(e)}")
-            return None
+    def build_lab_parsed_value(self, lab_result_id: str, biomarker_id: str, row: Dict[str, str]) -> Dict:
+        """Build a lab_parsed_values row linking a result to its biomarker"""
 
-    def create_lab_parsed_value(self, lab_result_id: str, biomarker_id: str,
-                               row: Dict[str, str]) -> bool:
-        """Create lab parsed value entry linking result to biomarker"""
+        value, unit = self.parse_in_canonical_unit(row['Biomarker'], row['Units'], row['Result'])
 
-        value = self.parse_numeric_value(row['Result'])
-
-        parsed_value_data = {
+        return {
             'lab_result_id': lab_result_id,
             'biomarker_id': biomarker_id,
             'raw_name': row['Biomarker'],
             'raw_value': row['Result'],
             'parsed_value': value,
-            'unit': row['Units'] if row['Units'] else None,
+            'unit': unit if unit else None,
             'confidence_score': 1.0,  # High confidence for CSV import
             'extraction_method': 'csv_import'
         }
 
+    def build_rpc_row(self, patient_id: str, row: Dict[str, str]) -> Dict:
+        """Build one element of the import_lab_batch payload: the lab result plus its biomarker attributes"""
+        rpc_row = self.build_lab_result(patient_id, row)
+        del rpc_row['patient_id']  # Passed once per call
+        biomarker = self.build_biomarker(row['Biomarker'], row['Category'], row['Units'], row['Ref_Min'],
+                                         row['Ref_Max'])
+        rpc_row.update(biomarker=self.canonical_name(row['Biomarker'], row['Units']), raw_value=row['Result'],
+                       category=biomarker['category'], description=biomarker['description'])
+        return rpc_row
+
+    def row_id(self, patient_id: str, position: int) -> str:
+        """lab_results id of an input row, the same on every run over the same file"""
+        return str(uuid.uuid5(IMPORT_ID_NAMESPACE, f'{self.source_hash}:{patient_id}:{position}'))
+
+    def import_batch_rpc(self, patient_id: str, batch: List[Dict[str, str]], batch_start: Optional[int] = None,
+                         positions: Optional[List[int]] = None) -> bool:
+        """Import a batch with a single import_lab_batch call
+
+        The function creates missing biomarkers, the lab results and their parsed
+        values in one transaction, so the batch is either fully stored or not at all.
+        With positions (input rows of the batch) the ids derive from the input, so a
+        retried or resumed batch re-sends ids the function already stored and skips them.
+        """
+        with self.metrics.stage('build_rows'):
+            rpc_rows = [self.build_rpc_row(patient_id, row) for row in batch]
+            if positions is not None and self.source_hash is not None:
+                for rpc_row, position in zip(rpc_rows, positions):
+                    rpc_row['id'] = self.row_id(patient_id, position)
         try:
-            result = self.supabase.table('lab_parsed_values').insert(parsed_value_data).execute()
-            if result.data:
-                self.stats['lab_parsed_values_created'] += 1
-                return True
+            with self.metrics.stage('import_lab_batch'):
+                result = self.supabase.rpc('import_lab_batch', {'p_patient_id': patient_id,
+                                                                 'p_rows': rpc_rows}).execute()
         except Exception as e:
-            self.stats['errors'].append(f"Error creating parsed value for {row['Biomarker']}: {str(e)}")
+            self.stats['errors'].append(f"Error importing batch ({len(batch)} rows) via import_lab_batch: {str(e)}")
             return False
 
+        counts = result.data
+        for rpc_row in rpc_rows:
+            if rpc_row['biomarker'] not in self.name_index:  # Created by the function under the report name
+                self.biomarker_units[rpc_row['biomarker']] = rpc_row['unit'] or ''
+                self.name_index.add(rpc_row['biomarker'])
+        self.stats['biomarkers_created'] += counts['biomarkers_created']
+        self.stats['biomarkers_existing'] += counts['lab_results_created'] - counts['biomarkers_created']
+        self.stats['lab_results_created'] += counts['lab_results_created']
+        self.stats['lab_parsed_values_created'] += counts['lab_parsed_values_created']
+        self.record_committed(patient_id, batch)
+        if self.journal is not None and batch_start is not None:
+            self.journal.record_lab_results(batch_start, positions, [rpc_row['id'] for rpc_row in rpc_rows])
+            self.journal.record_complete(batch_start)
+        return True
+
+    def import_batch(self, patient_id: str, batch: List[Dict[str, str]], batch_start: Optional[int] = None,
+                     positions: Optional[List[int]] = None, lab_result_ids: Optional[List[str]] = None) -> bool:
+        """Insert a batch with one multi-row request per table
+
+        With batch_start/positions (input rows of the batch) each committed step is
+        written to the journal. lab_result_ids come from the journal when resuming a
+        batch whose lab_results were stored: only its parsed values are sent then.
+        """
+        journaled = self.journal is not None and batch_start is not None
+
+        # 1. Resolve biomarkers
+        with self.metrics.stage('resolve_biomarkers'):
+            biomarker_ids = [
+                self.get_or_create_biomarker(
+                    name=row['Biomarker'],
+                    category=row['Category'],
+                    unit=row['Units'],
+                    ref_min=row['Ref_Min'],
+                    ref_max=row['Ref_Max']
+                )
+                for row in batch
+            ]
+
+        # 2. Create all lab results of the batch in one insert
+        with self.metrics.stage('build_rows'):
+            lab_results_batch = [self.build_lab_result(patient_id, row) for row in batch]
+        parsed_value_ids = self.parsed_value_ids(batch, batch_start, lab_result_ids)
+        if lab_result_ids:
+            for lab_result, lab_result_id in zip(lab_results_batch, lab_result_ids):
+                lab_result['id'] = lab_result_id
+        else:
+            try:
+                with self.metrics.stage('insert_lab_results'):
+                    self.supabase.table('lab_results').insert(lab_results_batch, returning='minimal').execute()
+            except Exception as e:
+                self.stats['errors'].append(f"Error creating lab results batch ({len(batch)} rows): {str(e)}")
+                return False
+            self.stats['lab_results_created'] += len(lab_results_batch)
+            self.record_committed(patient_id, batch)
+            if journaled:
+                self.journal.record_lab_results(batch_start, positions, [r['id'] for r in lab_results_batch],
+                                                parsed_value_ids)
+
+        # 3. Create parsed values linked through the client-generated result ids
+        with self.metrics.stage('build_rows'):
+            parsed_values_batch = [
+                dict(self.build_lab_parsed_value(lab_result['id'], biomarker_id, row), id=parsed_value_id)
+                for lab_result, biomarker_id, row, parsed_value_id
+                in zip(lab_results_batch, biomarker_ids, batch, parsed_value_ids)
+                if biomarker_id
+            ]
+        if parsed_values_batch:
+            try:
+                with self.metrics.stage('insert_parsed_values'):
+                    # Ids are journaled with the batch: a resend after an unseen commit is ignored
+                    self.supabase.table('lab_parsed_values').upsert(parsed_values_batch, on_conflict='id',
+                                                                    ignore_duplicates=True,
+                                                                    returning='minimal').execute()
+            except Exception as e:
+                self.stats['errors'].append(
+                    f"Error creating parsed values batch ({len(parsed_values_batch)} rows): {str(e)}")
+                return False
+            self.stats['lab_parsed_values_created'] += len(parsed_values_batch)
+
+        if journaled:
+            self.journal.record_complete(batch_start)
+        return True
+
+    def parsed_value_ids(self, batch: List[Dict[str, str]], batch_start: Optional[int],
+                         lab_result_ids: Optional[List[str]]) -> List[str]:
+        """Ids for the batch's parsed values: the journaled ones when resuming a batch, else new ones"""
+        if lab_result_ids and self.journal is not None and batch_start is not None:
+            journaled = (self.journal.batch(batch_start) or {}).get('parsed_value_ids')
+            if journaled:
+                return journaled
+        return [str(uuid.uuid4()) for _ in batch]
+
+    def pending_batches(self, patient_id: str, batches: Iterable[Tuple[int, List[Dict[str, str]]]]):
+        """Yield (batch_start, positions, rows, lab_result_ids) for every input batch still to import
+
+        Committed batches are skipped; a batch with stored lab_results is replayed
+        with its journaled rows and ids; other batches drop already-imported rows.
+        """
+        seen = set()
+        for batch_start, batch in batches:
+            journaled = self.journal.batch(batch_start) if self.journal is not None else None
+            if journaled and journaled['complete']:
+                self.stats['batches_resumed'] += 1
+                continue
+            if journaled:
+                positions = journaled['rows']
+                yield (batch_start, positions, [batch[position - batch_start] for position in positions],
+                       journaled['lab_result_ids'])
+                continue
+
+            positions = [batch_start + offset for offset, row in enumerate(batch)
+                         if self.is_new_row(patient_id, row, seen)]
+            if positions:
+                yield batch_start, positions, [batch[position - batch_start] for position in positions], None
+
     def get_patient_id(self) -> Optional[str]:
         """Get the first patient ID from the database"""
         result = self.supabase.table('patients').select('id').limit(1).execute()
@@ -169,8 +479,9 @@ class LabDataImporter:
             print("No patient found in database. Please create a patient first.")
             return None
 
-    def import_csv_data(self, csv_file: str, patient_id: Optional[str] = None, batch_size: int = 50):
-        """Import all data from CSV file with batch processing"""
+    def import_csv_data(self, csv_file: str, patient_id: Optional[str] = None, batch_size: int = 500,
+                        resume: bool = False):
+        """Import all data from CSV file with batch processing (resume=True continues a journaled import)"""
 
         # Get patient ID if not provided
         if not patient_id:
@@ -180,42 +491,39 @@ class LabDataImporter:
 
         print(f"Importing data for patient ID: {patient_id}")
 
-        # Read CSV file
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-
-        # Filter out empty rows
-        rows = [r for r in rows if r.get('Biomarker')]
-        print(f"Processing {len(rows)} lab results...")
-
-        # Process in batches for better performance
-        for batch_start in range(0, len(rows), batch_size):
-            batch_end = min(batch_start + batch_size, len(rows))
-            batch = rows[batch_start:batch_end]
-
-            print(f"Processing batch {batch_start+1}-{batch_end}/{len(rows)}...")
-
-            lab_results_batch = []
-            parsed_values_batch = []
-
-            for row in batch:
-                # 1. Get or create biomarker
-                biomarker_id = self.get_or_create_biomarker(
-                    name=row['Biomarker'],
-                    category=row['Category'],
-                    unit=row['Units'],
-                    ref_min=row['Ref_Min'],
-                    ref_max=row['Ref_Max']
-                )
-
-                # 2. Create lab result
-                lab_result_id = self.import_lab_result(patient_id, row)
-
-                # 3. Create parsed value linking result to biomarker
-                if lab_result_id and biomarker_id:
-                    self.create_lab_parsed_value(lab_result_id, biomarker_id, row)
-
+        if self.journal is not None or self.use_rpc:
+            # Identifies the input for the journal and for the ids of import_lab_batch rows
+            with self.metrics.stage('hash_input'):
+                self.source_hash = file_hash(csv_file)
+        if self.journal is not None:
+            with self.metrics.stage('journal'):
+                batch_size = self.journal.begin(self.source_hash, patient_id, batch_size, resume)
+        with self.metrics.stage('sync_fingerprints'):
+            self.sync_fingerprints(patient_id)
+
+        # Stream the CSV (plain, .gz or .zst): each batch is sent as soon as it is read
+        if self.use_rpc and not self.catalog_loaded:
+            # Names are resolved against the catalog before they are sent to import_lab_batch
+            with self.metrics.stage('load_catalog'), self.biomarker_lock:
+                self.load_biomarker_catalog()
+
+        batches = self.metrics.timed(iter_batches(iter_csv_rows(csv_file), batch_size), 'read_csv')
+        for batch_start, positions, batch, lab_result_ids in self.pending_batches(patient_id, batches):
+            print(f"Processing batch {batch_start+1}-{batch_start+batch_size}...")
+            if self.use_rpc and lab_result_ids is None:
+                self.import_batch_rpc(patient_id, batch, batch_start, positions)
+                continue
+            # Biomarkers new to the catalog are created with one bulk upsert per batch that has any
+            with self.metrics.stage('ensure_biomarkers'):
+                self.ensure_biomarkers(batch)
+            self.import_batch(patient_id, batch, batch_start, positions, lab_result_ids)
+
+        print(f"Skipped {self.stats['rows_skipped_existing']} rows already imported "
+              f"and {self.stats['batches_resumed']} journaled batches")
+
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.save()
+        self.name_index.save()
         return True
 
     def print_summary(self):
@@ -228,6 +536,17 @@ class LabDataImporter:
         print(f"Lab results created: {self.stats['lab_results_created']}")
         print(f"Lab parsed values created: {self.stats['lab_parsed_values_created']}")
 
+        metrics = self.metrics.as_dict()
+        if metrics['stages']:
+            print("\nStage timings (wall / CPU seconds):")
+            for name, totals in metrics['stages'].items():
+                print(f"  {name:22} {totals['wall_s']:8.3f} / {totals['cpu_s']:8.3f}  ({totals['calls']} calls)")
+        for endpoint, endpoint_metrics in metrics['endpoints'].items():
+            latency = endpoint_metrics.get('latency_ms', {})
+            print(f"  {endpoint:28} {endpoint_metrics['requests']:5} requests  "
+                  f"p50 {latency.get('p50', 0):7.1f} ms  p95 {latency.get('p95', 0):7.1f} ms  "
+                  f"p99 {latency.get('p99', 0):7.1f} ms  {endpoint_metrics['bytes_sent']:,} B sent")
+
         if self.stats['errors']:
             print(f"\nErrors encountered: {len(self.stats['errors'])}")
             for error in self.stats['errors'][:5]:  # Show first 5 errors
@@ -239,52 +558,108 @@ class LabDataImporter:
 
         # Save detailed stats to file
         with open('import_summary.json', 'w', encoding='utf-8') as f:
-            json.dump(self.stats, f, indent=2, ensure_ascii=False)
+            json.dump(dict(self.stats, metrics=metrics), f, indent=2, ensure_ascii=False)
         print("\nDetailed summary saved to import_summary.json")
 
 
 def main():
     """Main import function"""
+    parser = argparse.ArgumentParser(description='Import extracted lab results into Supabase')
+    parser.add_argument('csv_file', nargs='?', help='CSV to import (default: choose interactively)')
+    parser.add_argument('--patient-id', help='Patient id (default: first patient in the database)')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Pipelined async import over a pooled HTTP client')
+    parser.add_argument('--max-in-flight', type=int, default=8, help='Async mode: concurrent requests')
+    parser.add_argument('--queue-size', type=int, default=4, help='Async mode: batches buffered ahead of writers')
+    parser.add_argument('--rpc', action='store_true',
+                        help='One import_lab_batch database function call per batch (see supabase/migrations)')
+    parser.add_argument('--copy', action='store_true',
+                        help='Bulk load over a direct Postgres connection (COPY into a staging table)')
+    parser.add_argument('--database-url', help='Postgres connection string for --copy (default: SUPABASE_DB_URL)')
+    parser.add_argument('--fingerprints', default='lab_fingerprints.json',
+                        help='Index of rows already imported per patient (re-imports skip them)')
+    parser.add_argument('--journal', default='import_journal.jsonl', help='Write-ahead log of committed batches')
+    parser.add_argument('--name-cache', default='biomarker_names.json',
+                        help='Resolutions of report names to catalog biomarkers, kept between runs')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted import of the same file, skipping committed batches')
+    parser.add_argument('--metrics-textfile', help='Also write metrics in Prometheus textfile format to this path')
+    parser.add_argument('--no-dedupe', action='store_true', help='Import every row, even ones already stored')
+    args = parser.parse_args()
+    # Each mode has its own writer: none of them would honor another's flag
+    modes = [flag for flag, used in (('--async', args.use_async), ('--rpc', args.rpc), ('--copy', args.copy)) if used]
+    if len(modes) > 1:
+        parser.error(f"{' and '.join(modes)} are separate import modes; choose one")
+
     print("Lab Data Importer for Supabase")
     print("="*50)
 
     # Initialize importer
     try:
-        importer = LabDataImporter()
+        fingerprint_file = None if args.no_dedupe else args.fingerprints
+        if args.copy:
+            from postgres_copy_import import PostgresCopyImporter
+
+            importer = PostgresCopyImporter(args.database_url, fingerprint_file=fingerprint_file,
+                                            name_cache_file=args.name_cache)
+        else:
+            importer = LabDataImporter(fingerprint_file=fingerprint_file, journal_file=args.journal,
+                                       use_rpc=args.rpc, name_cache_file=args.name_cache)
     except ValueError as e:
         print(f"Error: {e}")
-        print("Please ensure your .env.local file contains SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+        print("Please ensure your .env.local file contains SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY "
+              "(or SUPABASE_DB_URL with --copy)")
         return
 
-    # Choose which CSV to import
-    csv_files = {
-        '1': ('lab_results_full.csv', 'Full lab results (all 563 records)'),
-        '2': ('lab_results_abnormal_full.csv', 'Abnormal results only (208 records)'),
-        '3': ('lab_results_complete.csv', 'Sample data (45 records)')
-    }
+    if args.csv_file:
+        csv_file = args.csv_file
+        print(f"\nImporting: {csv_file}")
+    else:
+        # Choose which CSV to import
+        csv_files = {
+            '1': ('lab_results_full.csv', 'Full lab results (all 563 records)'),
+            '2': ('lab_results_abnormal_full.csv', 'Abnormal results only (208 records)'),
+            '3': ('lab_results_complete.csv', 'Sample data (45 records)')
+        }
 
-    print("\nAvailable CSV files:")
-    for key, (filename, description) in csv_files.items():
-        print(f"{key}. {description} - {filename}")
+        print("\nAvailable CSV files:")
+        for key, (filename, description) in csv_files.items():
+            print(f"{key}. {description} - {filename}")
 
-    choice = input("\nWhich file would you like to import? (1/2/3): ").strip()
+        choice = input("\nWhich file would you like to import? (1/2/3): ").strip()
 
-    if choice not in csv_files:
-        print("Invalid choice. Defaulting to full results.")
-        choice = '1'
+        if choice not in csv_files:
+            print("Invalid choice. Defaulting to full results.")
+            choice = '1'
 
-    csv_file, description = csv_files[choice]
-    print(f"\nImporting: {description}")
+        csv_file, description = csv_files[choice]
+        print(f"\nImporting: {description}")
 
     # Import data
-    success = importer.import_csv_data(csv_file)
+    try:
+        if args.use_async:
+            from async_import import run_async_import
+
+            success = run_async_import(importer, csv_file, importer.url, importer.key, args.patient_id,
+                                       args.batch_size, resume=args.resume, max_in_flight=args.max_in_flight,
+                                       queue_size=args.queue_size)
+        else:
+            success = importer.import_csv_data(csv_file, args.patient_id, args.batch_size, args.resume)
+    except ValueError as e:
+        # Unreadable input, e.g. a .zst export without the zstandard package; committed batches are journaled
+        print(f"Error: {e}")
+        success = False
 
     if success:
         print("\nImport completed successfully!")
         importer.print_summary()
+        if args.metrics_textfile:
+            importer.metrics.write_prometheus(args.metrics_textfile, importer.stats)
+            print(f"Metrics written to {args.metrics_textfile}")
     else:
         print("\nImport failed. Check errors above.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,205 @@
+"""
+Import instrumentation: stage timings, per-endpoint request latency and bytes
+Stages accumulate wall and CPU time (CPU is process-wide, so stages that
+overlap in async mode each see the shared CPU). HTTP requests are measured
+through httpx event hooks on the client that sends them, so the importer code
+does not change per request. Results go into import_summary.json and can be
+written as a Prometheus textfile for node_exporter.
+"""
+
+import math
+import os
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+# Prometheus histogram buckets for request latency, in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUANTILES = [('p50', 0.50), ('p95', 0.95), ('p99', 0.99)]
+START_KEY = 'import_metrics_start'
+
+
+def quantile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class EndpointMetrics:
+    __slots__ = ('requests', 'errors', 'bytes_sent', 'bytes_received', 'latencies')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies = array('d')
+
+    def bucket_counts(self) -> List[int]:
+        """Cumulative counts per LATENCY_BUCKETS bound (Prometheus 'le' semantics)"""
+        return [sum(1 for latency in self.latencies if latency <= bound) for bound in LATENCY_BUCKETS]
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            result['latency_ms'] = {name: round(quantile(latencies, q) * 1000, 2) for name, q in QUANTILES}
+            result['latency_ms']['mean'] = round(sum(latencies) / len(latencies) * 1000, 2)
+            result['latency_ms']['max'] = round(latencies[-1] * 1000, 2)
+            result['latency_histogram'] = {str(bound): count
+                                           for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts())}
+        return result
+
+
+class ImportMetrics:
+    """Stage timers plus per-endpoint request statistics for one import run"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.endpoints: Dict[str, EndpointMetrics] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            totals['calls'] += 1
+            totals['wall_s'] += time.perf_counter() - wall
+            totals['cpu_s'] += time.process_time() - cpu
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        """Iterate, adding the time spent producing each item to a stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def merge(self, other: 'ImportMetrics'):
+        """Add another run's metrics (e.g. one patient of a bulk import) into this one"""
+        for name, totals in other.stages.items():
+            merged = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            for field, value in totals.items():
+                merged[field] += value
+        for endpoint, metrics in other.endpoints.items():
+            merged = self.endpoints.get(endpoint)
+            if merged is None:
+                merged = self.endpoints[endpoint] = EndpointMetrics()
+            merged.requests += metrics.requests
+            merged.errors += metrics.errors
+            merged.bytes_sent += metrics.bytes_sent
+            merged.bytes_received += metrics.bytes_received
+            merged.latencies.extend(metrics.latencies)
+
+    def observe(self, endpoint: str, seconds: float, bytes_sent: int, bytes_received: int, error: bool = False):
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics()
+        metrics.requests += 1
+        metrics.errors += error
+        metrics.bytes_sent += bytes_sent
+        metrics.bytes_received += bytes_received
+        metrics.latencies.append(seconds)
+
+    # httpx instrumentation
+
+    @staticmethod
+    def endpoint(request: httpx.Request) -> str:
+        """'POST lab_results', 'GET biomarkers', 'POST rpc/...'"""
+        path = urlparse(str(request.url)).path
+        name = path.split('/rest/v1/', 1)[-1].strip('/') or path
+        return f"{request.method} {name}"
+
+    def on_request(self, request: httpx.Request):
+        request.extensions[START_KEY] = time.perf_counter()
+
+    def on_response(self, response: httpx.Response):
+        response.read()
+        self.record_response(response)
+
+    async def on_request_async(self, request: httpx.Request):
+        self.on_request(request)
+
+    async def on_response_async(self, response: httpx.Response):
+        await response.aread()
+        self.record_response(response)
+
+    def record_response(self, response: httpx.Response):
+        request = response.request
+        started = request.extensions.get(START_KEY)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        self.observe(self.endpoint(request), elapsed, len(request.content), len(response.content),
+                     error=response.status_code >= 400)
+
+    def instrument(self, client: httpx.Client):
+        """Measure every request sent through a sync httpx client"""
+        client.event_hooks['request'].append(self.on_request)
+        client.event_hooks['response'].append(self.on_response)
+
+    def event_hooks_async(self) -> Dict[str, list]:
+        """event_hooks argument for an httpx.AsyncClient"""
+        return {'request': [self.on_request_async], 'response': [self.on_response_async]}
+
+    # Output
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'stages': {name: {'calls': totals['calls'], 'wall_s': round(totals['wall_s'], 4),
+                              'cpu_s': round(totals['cpu_s'], 4)}
+                       for name, totals in self.stages.items()},
+            'endpoints': {endpoint: metrics.as_dict() for endpoint, metrics in sorted(self.endpoints.items())},
+        }
+
+    def write_prometheus(self, filename: str, counters: Optional[Dict[str, Any]] = None):
+        """Write a node_exporter textfile (atomically, so a scrape never sees half a file)"""
+        lines = [
+            '# TYPE lab_import_stage_wall_seconds gauge',
+            *(f'lab_import_stage_wall_seconds{{stage="{name}"}} {totals["wall_s"]:.6f}'
+              for name, totals in self.stages.items()),
+            '# TYPE lab_import_stage_cpu_seconds gauge',
+            *(f'lab_import_stage_cpu_seconds{{stage="{name}"}} {totals["cpu_s"]:.6f}'
+              for name, totals in self.stages.items()),
+            '# TYPE lab_import_requests_total counter',
+            *(f'lab_import_requests_total{{endpoint="{endpoint}"}} {metrics.requests}'
+              for endpoint, metrics in sorted(self.endpoints.items())),
+            '# TYPE lab_import_request_errors_total counter',
+            *(f'lab_import_request_errors_total{{endpoint="{endpoint}"}} {metrics.errors}'
+              for endpoint, metrics in sorted(self.endpoints.items())),
+            '# TYPE lab_import_bytes_sent_total counter',
+            *(f'lab_import_bytes_sent_total{{endpoint="{endpoint}"}} {metrics.bytes_sent}'
+              for endpoint, metrics in sorted(self.endpoints.items())),
+            '# TYPE lab_import_bytes_received_total counter',
+            *(f'lab_import_bytes_received_total{{endpoint="{endpoint}"}} {metrics.bytes_received}'
+              for endpoint, metrics in sorted(self.endpoints.items())),
+            '# TYPE lab_import_request_duration_seconds histogram',
+        ]
+        for endpoint, metrics in sorted(self.endpoints.items()):
+            for bound, count in zip(LATENCY_BUCKETS, metrics.bucket_counts()):
+                lines.append(f'lab_import_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'lab_import_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} '
+                         f'{metrics.requests}')
+            lines.append(f'lab_import_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+                         f'{sum(metrics.latencies):.6f}')
+            lines.append(f'lab_import_request_duration_seconds_count{{endpoint="{endpoint}"}} {metrics.requests}')
+        for name, value in (counters or {}).items():
+            if isinstance(value, (int, float)):
+                lines.append(f'# TYPE lab_import_{name} gauge')
+                lines.append(f'lab_import_{name} {value}')
+
+        temporary = f'{filename}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temporary, filename)
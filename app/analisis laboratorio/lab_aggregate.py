@@ -0,0 +1,187 @@
+"""
+Single-pass aggregation over a LabResultStore
+Groups rows by their dictionary codes (category, biomarker, status) in one
+walk over the columns and derives every summary figure from those groups:
+totals, abnormal counts, date range, per-category counts and per-biomarker
+min/max/mean/median/latest and abnormal rate. The median is exact for one
+store; when stores or streamed chunks are merged, each biomarker keeps a
+uniform sample of at most SAMPLE_SIZE values, so memory stays bounded and the
+median is estimated once a biomarker has more values than that.
+"""
+
+import random
+from array import array
+from datetime import date
+from itertools import islice
+from statistics import median
+from typing import Any, Dict, Iterable, Optional
+
+from lab_store import LabResultStore
+
+# Rows folded per chunk when aggregating a plain iterable of records
+CHUNK_ROWS = 50_000
+# Values kept per biomarker across merged stores (the median is exact up to this many)
+SAMPLE_SIZE = 4096
+# Seeded so a summary of the same input is reproducible
+SAMPLER = random.Random(0)
+
+
+class BiomarkerAggregate:
+    """Running figures for one biomarker"""
+
+    __slots__ = ('count', 'abnormal', 'min', 'max', 'total', 'seen', 'values', 'latest_day', 'latest_result')
+
+    def __init__(self):
+        self.count = 0
+        self.abnormal = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.total = 0.0
+        self.seen = 0  # Numeric values folded in
+        self.values = array('d')  # All of them, or a uniform sample once merges exceed SAMPLE_SIZE
+        self.latest_day = 0
+        self.latest_result: Any = None
+
+    def merge(self, other: 'BiomarkerAggregate'):
+        self.count += other.count
+        self.abnormal += other.abnormal
+        if other.values:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.total += other.total
+            self.values = self.merged_values(other)
+            self.seen += other.seen
+        if other.latest_day > self.latest_day:
+            self.latest_day = other.latest_day
+            self.latest_result = other.latest_result
+
+    def merged_values(self, other: 'BiomarkerAggregate') -> array:
+        """Both value lists, or a uniform sample of SAMPLE_SIZE drawn from each in proportion to its values"""
+        seen = self.seen + other.seen
+        if seen <= SAMPLE_SIZE:
+            return self.values + other.values
+        size = min(SAMPLE_SIZE, len(self.values) + len(other.values))
+        from_self = min(len(self.values), max(size - len(other.values), round(size * self.seen / seen)))
+        return array('d', SAMPLER.sample(self.values, from_self) + SAMPLER.sample(other.values, size - from_self))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'abnormal': self.abnormal,
+            'abnormal_rate': round(self.abnormal / self.count, 4) if self.count else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.total / self.seen, 4) if self.seen else None,
+            'median': median(self.values) if self.values else None,
+            'latest': self.latest_result,
+            'latest_date': date.fromordinal(self.latest_day).isoformat() if self.latest_day else None
+        }
+
+
+class LabAggregates:
+    """Summary figures accumulated from one or more stores"""
+
+    def __init__(self):
+        self.total = 0
+        self.abnormal = 0
+        self.normal = 0
+        self.earliest_day = 0
+        self.latest_day = 0
+        self.categories: Dict[str, Dict[str, int]] = {}
+        self.category_biomarkers: Dict[str, set] = {}
+        self.biomarkers: Dict[str, BiomarkerAggregate] = {}
+
+    def add_store(self, store: LabResultStore):
+        """Fold every row of a store into the aggregates in a single pass"""
+        categories = store.dictionaries['Category'].values
+        biomarkers = store.dictionaries['Biomarker'].values
+        results = store.dictionaries['Result'].values
+        status_codes = store.dictionaries['Status'].codes
+        abnormal_code = status_codes.get('Abnormal', -1)
+        normal_code = status_codes.get('Normal', -1)
+
+        # Group accumulators indexed by dictionary code
+        cat_total = [0] * len(categories)
+        cat_abnormal = [0] * len(categories)
+        cat_biomarkers = [set() for _ in categories]
+        groups = [BiomarkerAggregate() for _ in biomarkers]
+        earliest = latest = 0
+
+        rows = zip(store.columns['Category'], store.columns['Biomarker'], store.columns['Status'],
+                   store.columns['Result'], store.days, store.values, store.value_mask)
+        for cat, bio, status, result, day, value, has_value in rows:
+            is_abnormal = status == abnormal_code
+            cat_total[cat] += 1
+            cat_biomarkers[cat].add(bio)
+            group = groups[bio]
+            group.count += 1
+            if is_abnormal:
+                cat_abnormal[cat] += 1
+                group.abnormal += 1
+            elif status == normal_code:
+                self.normal += 1
+            if has_value:
+                group.values.append(value)
+            if day:
+                if day > group.latest_day:
+                    group.latest_day = day
+                    group.latest_result = results[result]
+                if not earliest or day < earliest:
+                    earliest = day
+                if day > latest:
+                    latest = day
+
+        self.total += len(store)
+        self.abnormal += sum(cat_abnormal)
+        if earliest and (not self.earliest_day or earliest < self.earliest_day):
+            self.earliest_day = earliest
+        if latest > self.latest_day:
+            self.latest_day = latest
+
+        for code, name in enumerate(categories):
+            if not cat_total[code]:
+                continue
+            stats = self.categories.setdefault(name, {'total': 0, 'abnormal': 0})
+            stats['total'] += cat_total[code]
+            stats['abnormal'] += cat_abnormal[code]
+            self.category_biomarkers.setdefault(name, set()).update(biomarkers[b] for b in cat_biomarkers[code])
+
+        for code, name in enumerate(biomarkers):
+            group = groups[code]
+            if not group.count:
+                continue
+            group.seen = len(group.values)
+            if group.values:
+                group.min = min(group.values)
+                group.max = max(group.values)
+                group.total = sum(group.values)
+            if name in self.biomarkers:
+                self.biomarkers[name].merge(group)
+            else:
+                self.biomarkers[name] = group
+
+    def add_records(self, records: Iterable[Dict[str, Any]], fieldnames):
+        """Fold a stream of record dicts in bounded chunks (per-biomarker values are sampled, see SAMPLE_SIZE)"""
+        records = iter(records)
+        while True:
+            chunk = LabResultStore(fieldnames)
+            chunk.extend(islice(records, CHUNK_ROWS))
+            if not len(chunk):
+                break
+            self.add_store(chunk)
+
+    def date_range(self) -> Dict[str, Optional[str]]:
+        return {
+            'earliest': date.fromordinal(self.earliest_day).isoformat() if self.earliest_day else None,
+            'latest': date.fromordinal(self.latest_day).isoformat() if self.latest_day else None
+        }
+
+
+def aggregate(records, fieldnames=None) -> LabAggregates:
+    """Aggregate a LabResultStore directly, or any iterable of records chunk by chunk"""
+    aggregates = LabAggregates()
+    if isinstance(records, LabResultStore):
+        aggregates.add_store(records)
+    else:
+        aggregates.add_records(records, fieldnames)
+    return aggregates
@@ -0,0 +1,88 @@
+"""
+Content-hash cache for incremental re-extraction of cumulative reports
+Ornament exports repeat every historical row, so parsed records are cached
+under a hash of (category, normalized line) and extracted PDF page text under
+a hash of the page's raw content stream. On a re-run only new or changed
+content is parsed; everything else is served from the cache file.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Bump when parsing changes so stale cached records are not reused
+CACHE_VERSION = 1
+
+
+def normalize_line(line: str) -> str:
+    return ' '.join(line.split())
+
+
+class ExtractionCache:
+    """Persistent record and page-text cache with hit/miss counters"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.rows: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.pages: Dict[str, str] = {}
+        self.stats = {'rows_cached': 0, 'rows_parsed': 0, 'pages_cached': 0, 'pages_extracted': 0}
+
+        # Only entries used in this run are written back, which prunes content
+        # that no longer appears in the report
+        self._used_rows = {}
+        self._used_pages = {}
+
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.rows = data.get('rows', {})
+                self.pages = data.get('pages', {})
+
+    @staticmethod
+    def key(*parts: Union[str, bytes]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(CACHE_VERSION).encode())
+        for part in parts:
+            digest.update(b'\x1f')
+            digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_row(self, category: str, line: str) -> Tuple[str, bool, Optional[Dict[str, Any]]]:
+        """Return (key, hit, record); record is None for lines that produce no row"""
+        key = self.key(category, line)
+        if key in self.rows:
+            record = self.rows[key]
+            self._used_rows[key] = record
+            if record is not None:
+                self.stats['rows_cached'] += 1
+            return key, True, record
+        return key, False, None
+
+    def put_row(self, key: str, record: Optional[Dict[str, Any]]):
+        self.rows[key] = self._used_rows[key] = record
+        if record is not None:
+            self.stats['rows_parsed'] += 1
+
+    def get_page(self, key: str) -> Optional[str]:
+        text = self.pages.get(key)
+        if text is not None:
+            self._used_pages[key] = text
+            self.stats['pages_cached'] += 1
+        return text
+
+    def put_page(self, key: str, text: str):
+        self.pages[key] = self._used_pages[key] = text
+        self.stats['pages_extracted'] += 1
+
+    def save(self):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'rows': self._used_rows, 'pages': self._used_pages},
+                      f, ensure_ascii=False)
+
+    def print_stats(self):
+        print(f"Rows served from cache: {self.stats['rows_cached']}, freshly parsed: {self.stats['rows_parsed']}")
+        if self.stats['pages_cached'] or self.stats['pages_extracted']:
+            print(f"Pages served from cache: {self.stats['pages_cached']}, "
+                  f"freshly extracted: {self.stats['pages_extracted']}")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Columnar lab result datasets (Parquet or Arrow IPC)
+Writes the rows of a LabResultStore as a typed dataset partitioned by
+category and year (category=.../year=.../part-0.parquet): dates as date32,
+numeric results and reference bounds as float64, every string column
+dictionary-encoded straight from the store's own dictionaries. Readers open
+the directory memory-mapped and load only the columns and partitions a query
+needs; abnormal results are a filter on Status, not a second copy.
+Needs the optional 'pyarrow' package.
+"""
+
+import argparse
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+from lab_normalize import parse_number
+from lab_store import LabResultStore
+
+FORMATS = {'parquet': ('parquet', 'parquet'), 'arrow': ('ipc', 'arrow')}  # Name -> (pyarrow format, extension)
+BOUND_FIELDS = ['Ref_Min', 'Ref_Max']
+EPOCH = date(1970, 1, 1).toordinal()
+
+
+def pyarrow_modules():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+    except ImportError:
+        raise ValueError("Columnar output requires the 'pyarrow' package (pip install pyarrow)")
+    return pyarrow, pyarrow.dataset, pyarrow.fs
+
+
+def partitioning():
+    pa, ds, _ = pyarrow_modules()
+    return ds.partitioning(pa.schema([('category', pa.string()), ('year', pa.int16())]), flavor='hive')
+
+
+def store_table(store: LabResultStore):
+    """Arrow table of a store, built from its codes and typed columns without re-parsing rows"""
+    pa, _, _ = pyarrow_modules()
+
+    def dictionary_column(name: str):
+        return pa.DictionaryArray.from_arrays(pa.array(store.columns[name], type=pa.int32()),
+                                              pa.array(store.dictionaries[name].values, type=pa.string()))
+
+    def bound_column(name: str):
+        # Parsed once per distinct string
+        parsed = [parse_number(value) if value else None for value in store.dictionaries[name].values]
+        return pa.array([parsed[code] for code in store.columns[name]], type=pa.float64())
+
+    years: Dict[int, Optional[int]] = {0: None}
+    for day in set(store.days):
+        if day:
+            years[day] = date.fromordinal(day).year
+
+    columns = {
+        'category': pa.array(store.column('Category'), type=pa.string()),
+        'year': pa.array([years[day] for day in store.days], type=pa.int16()),
+        'Biomarker': dictionary_column('Biomarker'),
+        'Date': pa.array([day - EPOCH if day else None for day in store.days], type=pa.int32()).cast(pa.date32()),
+        'Result': dictionary_column('Result'),
+        'Value': pa.array([value if present else None for value, present in zip(store.values, store.value_mask)],
+                          type=pa.float64()),
+    }
+    for name in BOUND_FIELDS:
+        columns[name] = bound_column(name)
+    for name in ('Units', 'Status'):
+        columns[name] = dictionary_column(name)
+    return pa.table(columns)
+
+
+def write_dataset(store: LabResultStore, directory: str, format: str = 'parquet') -> int:
+    """Write the store as a dataset partitioned by category and year, replacing partitions it rewrites"""
+    _, ds, _ = pyarrow_modules()
+    file_format, extension = FORMATS[format]
+    ds.write_dataset(store_table(store), directory, format=file_format, partitioning=partitioning(),
+                     basename_template=f'part-{{i}}.{extension}', existing_data_behavior='delete_matching')
+    return len(store)
+
+
+def open_dataset(directory: str):
+    """Memory-mapped dataset; the format is recognized from the file extensions"""
+    _, ds, fs = pyarrow_modules()
+    file_format = 'parquet'
+    for _, _, files in os.walk(directory):
+        if any(name.endswith('.arrow') for name in files):
+            file_format = 'ipc'
+            break
+    return ds.dataset(directory, format=file_format, partitioning=partitioning(),
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def read(directory: str, columns: Optional[List[str]] = None, filter=None):
+    """Only the given columns of the rows matching filter (partition filters skip whole files)"""
+    return open_dataset(directory).to_table(columns=columns, filter=filter)
+
+
+def read_abnormal(directory: str, columns: Optional[List[str]] = None):
+    _, ds, _ = pyarrow_modules()
+    return read(directory, columns, ds.field('Status') == 'Abnormal')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a results CSV into a partitioned columnar dataset')
+    parser.add_argument('csv_file', nargs='?', default='lab_results_full.csv')
+    parser.add_argument('-o', '--output', default='lab_results_dataset', help='Dataset directory')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    args = parser.parse_args()
+
+    rows = write_dataset(LabResultStore.from_csv(args.csv_file), args.output, args.format)
+    dataset = open_dataset(args.output)
+    abnormal = read_abnormal(args.output, ['Biomarker'])
+    print(f"Saved {rows} records to {args.output} ({args.format}, {len(dataset.files)} partitions, "
+          f"{abnormal.num_rows} abnormal)")
+
+
+if __name__ == "__main__":
+    main()
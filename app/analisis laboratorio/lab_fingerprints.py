@@ -0,0 +1,84 @@
+"""
+Natural-key fingerprints for idempotent lab imports
+A row is identified by (patient, biomarker, test date, value, unit), with
+the value and unit in the biomarker's canonical unit, so a CSV row matches
+what the importer stored whichever spelling or unit the report used. The
+local index remembers the fingerprints already stored for each patient and
+the server timestamp it was last synced to, so a re-import only needs one
+lookup of rows created since then and sends just the rows it has not seen.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Set
+
+from lab_normalize import parse_number, to_iso_date
+from lab_units import normalize_value
+
+# Bumped when fingerprints change meaning; entries of another version are re-synced from the server
+FINGERPRINT_VERSION = 3
+
+
+def value_key(value: Any) -> str:
+    """Numeric values compare as floats ('0.10' == 0.1), anything else as trimmed text"""
+    number = parse_number(value) if value is not None else None
+    return repr(number) if number is not None else str(value or '').strip()
+
+
+def fingerprint(patient_id: str, biomarker: str, test_date: str, value: Any, unit: Optional[str]) -> str:
+    number = parse_number(value) if value is not None else None
+    number, unit = normalize_value(biomarker, unit or '', number)
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (patient_id, biomarker, test_date, repr(number) if number is not None else value_key(value), unit):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def row_fingerprint(patient_id: str, row: Dict[str, str]) -> str:
+    """Fingerprint of a CSV row as the importer would store it"""
+    return fingerprint(patient_id, row['Biomarker'], to_iso_date(row['Date']), row['Result'], row['Units'])
+
+
+def stored_fingerprint(patient_id: str, lab_result: Dict[str, Any]) -> str:
+    """Fingerprint of a lab_results row read back from the server"""
+    value = lab_result.get('value')
+    if value is None:
+        # Qualitative results keep their text only in lab_parsed_values.raw_value
+        parsed = lab_result.get('lab_parsed_values') or []
+        value = parsed[0]['raw_value'] if parsed else ''
+    return fingerprint(patient_id, lab_result['test_name'], lab_result['test_date'], value, lab_result.get('unit'))
+
+
+class FingerprintIndex:
+    """Per-patient fingerprint sets persisted to a JSON file"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.patients: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.patients = {
+                patient_id: {'synced_at': entry.get('synced_at'), 'fingerprints': set(entry['fingerprints'])}
+                for patient_id, entry in data.items() if entry.get('version') == FINGERPRINT_VERSION
+            }
+
+    def entry(self, patient_id: str) -> Dict[str, Any]:
+        return self.patients.setdefault(patient_id, {'synced_at': None, 'fingerprints': set()})
+
+    def fingerprints(self, patient_id: str) -> Set[str]:
+        return self.entry(patient_id)['fingerprints']
+
+    def save(self):
+        # list() snapshots are atomic under the GIL, so importers of other patients can keep adding
+        data = {
+            patient_id: {'version': FINGERPRINT_VERSION, 'synced_at': entry['synced_at'],
+                         'fingerprints': sorted(list(entry['fingerprints']))}
+            for patient_id, entry in list(self.patients.items())
+        }
+        with self.lock, open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Canonical biomarker name resolution
+Reports spell one analyte many ways: accents and typos ('Bilirubina total'),
+specimen suffixes ('Creatinina suero', 'Bicarbonate, serum'), word order
+('Colesterol HDL' / 'HDL Colesterol') and language ('Alanina
+aminotransferasa' / 'ALT'). BiomarkerNameIndex maps a raw name to the name of
+a biomarkers catalog row: first by exact key over names, display names and
+seed aliases, then through a character-trigram index whose candidates must
+match word for word, so 'Colesterol LDL' never resolves to 'Colesterol HDL'.
+Resolutions are memoized and can be kept in a JSON cache between runs.
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Bump when keys or matching change so cached resolutions are not reused
+NAMES_VERSION = 1
+
+# Seed catalog name -> other spellings seen in reports (supabase/migrations/*_biomarker_seed_data.sql)
+ALIASES = {
+    'glucose': ['glucose'],
+    'triglycerides': ['triglycerides'],
+    'total_cholesterol': ['total cholesterol'],
+    'ldl_cholesterol': ['ldl cholesterol'],
+    'hdl_cholesterol': ['hdl cholesterol'],
+    'non_hdl_cholesterol': ['non-hdl cholesterol'],
+    'creatinine': ['creatinine'],
+    'bun': ['nitrógeno ureico', 'blood urea nitrogen', 'urea nitrogen'],
+    'egfr': ['filtrado glomerular estimado', 'estimated gfr'],
+    'alt': ['alanina aminotransferasa', 'alanine aminotransferase', 'tgp', 'gpt'],
+    'ast': ['aspartato aminotransferasa', 'aspartato amino transferasa', 'aspartate aminotransferase', 'tgo',
+            'got'],
+    'alkaline_phosphatase': ['alkaline phosphatase'],
+    'total_bilirubin': ['total bilirubin'],
+    'albumin': ['albumin'],
+    'sodium': ['sodium', 'na'],
+    'potassium': ['potassium', 'k'],
+    'chloride': ['cloro', 'chloride', 'cl'],
+    'co2': ['bicarbonato', 'bicarbonate', 'hco3', 'co2 total'],
+    'calcium': ['calcium', 'calcio total'],
+    'hemoglobin': ['hemoglobin', 'hgb'],
+    'hematocrit': ['hematocrit', 'hct'],
+    'wbc': ['leukocytes', 'white blood cells', 'glóbulos blancos'],
+    'platelets': ['platelets', 'plt'],
+    'mcv': ['volumen corpuscular medio', 'mean corpuscular volume'],
+}
+
+# Dropped anywhere: they never tell two analytes apart
+STOPWORDS = {'de', 'del', 'en', 'la', 'el', 'los', 'las', 'y', 'of', 'the', 'in', 'and'}
+# Dropped only as a trailing qualifier ('Creatinina suero'); urine is a different test and is kept
+SPECIMENS = {'suero', 'serum', 'serico', 'serica', 'plasma', 'sangre', 'blood', 'sanguineo', 'sanguinea'}
+
+MIN_WORD_SIMILARITY = 0.7
+CANDIDATES = 8
+
+
+def words(name: str) -> List[str]:
+    """Lowercase, accent-free words; '%' is kept since 'Eosinófilos %' is not 'Eosinófilos'"""
+    text = unicodedata.normalize('NFKD', name or '').lower().replace('%', ' pct ')
+    text = ''.join(char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char))
+    tokens = [token for token in text.split() if token not in STOPWORDS]
+    while len(tokens) > 1 and tokens[-1] in SPECIMENS:
+        tokens.pop()
+    return tokens
+
+
+def name_key(name: str) -> str:
+    """Order-insensitive key: the sorted words"""
+    return ' '.join(sorted(words(name)))
+
+
+def variants(name: str) -> List[str]:
+    """Keys for a name, without and inside its parenthesis: 'Volumen corpuscular medio (VCM)' -> + 'vcm'"""
+    keys = [name_key(name)]
+    if '(' in name and ')' in name:
+        start, end = name.index('('), name.rindex(')')
+        keys += [name_key(name[:start] + name[end + 1:]), name_key(name[start + 1:end])]
+    return [key for key in dict.fromkeys(keys) if key]
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Dice coefficient of character trigrams"""
+    if a == b:
+        return 1.0
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def word_match(query: List[str], candidate: List[str]) -> float:
+    """Mean similarity pairing every word with a distinct one, 0 when any pair falls short
+
+    Short words and words with digits are codes ('hdl', 't4', 'a1c') and must match exactly.
+    """
+    if len(query) != len(candidate):
+        return 0.0
+    remaining = list(candidate)
+    total = 0.0
+    for word in query:
+        if word in remaining:
+            remaining.remove(word)
+            total += 1.0
+            continue
+        if len(word) < 5 or any(char.isdigit() for char in word):
+            return 0.0
+        score, best = max((similarity(word, other), other) for other in remaining)
+        if score < MIN_WORD_SIMILARITY:
+            return 0.0
+        remaining.remove(best)
+        total += score
+    return total / len(query)
+
+
+class BiomarkerNameIndex:
+    """Raw biomarker name -> catalog name, by exact key then trigram candidates"""
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = cache_file
+        self.names: Set[str] = set()
+        self.exact: Dict[str, Optional[str]] = {}  # Key -> name (None when two names share it)
+        self.derived: Dict[str, Optional[str]] = {}  # Parenthesis and alias keys, used after exact ones
+        self.postings: Dict[str, Set[str]] = {}  # Trigram -> keys
+        self.resolved: Dict[str, str] = {}
+        self.misses: Set[str] = set()  # Unresolved since the last add(), not persisted
+        self.lock = threading.Lock()
+        self.stats = {'cached': 0, 'exact': 0, 'fuzzy': 0, 'unresolved': 0}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == NAMES_VERSION:
+                self.resolved = data.get('names', {})
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def _key(self, table: Dict[str, Optional[str]], key: str, name: str):
+        if key not in self.exact and key not in self.derived:
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, set()).add(key)
+        if table.get(key, name) != name:
+            table[key] = None
+        else:
+            table[key] = name
+
+    def add(self, name: str, display_name: Optional[str] = None, aliases: Iterable[str] = ()):
+        """Index a catalog name with its display name and aliases (seed aliases are added for seed names)"""
+        with self.lock:
+            self.names.add(name)
+            self.misses.clear()
+            for spelling in (name, display_name):
+                keys = variants(spelling) if spelling else []
+                for position, key in enumerate(keys):
+                    self._key(self.derived if position else self.exact, key, name)
+            for alias in (*ALIASES.get(name, ()), *aliases):
+                for key in variants(alias):
+                    self._key(self.derived, key, name)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], cache_file: Optional[str] = None) -> 'BiomarkerNameIndex':
+        index = cls(cache_file)
+        for row in rows:
+            index.add(row['name'], row.get('display_name'))
+        return index
+
+    @classmethod
+    def load(cls, filename: str, cache_file: Optional[str] = None) -> 'BiomarkerNameIndex':
+        """Index from a JSON list of biomarkers rows (e.g. an export of the table)"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            return cls.from_rows(json.load(f), cache_file)
+
+    @classmethod
+    def from_database(cls, dsn: str, cache_file: Optional[str] = None) -> 'BiomarkerNameIndex':
+        import psycopg
+        from psycopg.rows import dict_row
+
+        with psycopg.connect(dsn, row_factory=dict_row) as conn:
+            return cls.from_rows(conn.execute("select name, display_name from public.biomarkers").fetchall(),
+                                 cache_file)
+
+    def match(self, raw_name: str) -> Tuple[Optional[str], str]:
+        """(catalog name or None, how it matched), without the resolution cache"""
+        if raw_name in self.names:
+            return raw_name, 'exact'  # Rows already stored under this name stay with it
+        keys = variants(raw_name)
+        for table in (self.exact, self.derived):
+            for key in keys:
+                if table.get(key):
+                    return table[key], 'exact'
+
+        # Candidates share the most trigrams with the full key, then must match word for word
+        shared = Counter()
+        for gram in trigrams(keys[0]) if keys else ():
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for key, _ in shared.most_common(CANDIDATES):
+            name = self.exact.get(key) or self.derived.get(key)
+            score = word_match(keys[0].split(), key.split()) if name else 0.0
+            if score:
+                scored.append((score, name))
+        scored.sort(reverse=True)
+        if scored and (len(scored) == 1 or scored[0][0] > scored[1][0] or scored[0][1] == scored[1][1]):
+            return scored[0][1], 'fuzzy'
+        return None, 'unresolved'
+
+    def resolve(self, raw_name: str) -> Optional[str]:
+        """Catalog name for a raw name, None when nothing matches closely enough"""
+        name = self.resolved.get(raw_name)
+        if name is not None and name in self.names:
+            self.stats['cached'] += 1
+            return name
+        if raw_name in self.misses:
+            return None
+        with self.lock:
+            name, how = self.match(raw_name)
+            self.stats[how] += 1
+            if name is not None:
+                self.resolved[raw_name] = name
+            else:
+                self.misses.add(raw_name)
+        return name
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self.lock, open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': NAMES_VERSION, 'names': dict(sorted(self.resolved.items()))}, f, indent=1,
+                      ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve raw biomarker names to biomarkers catalog names')
+    parser.add_argument('csv_file', nargs='?', default='lab_results_full.csv', help='Names from its Biomarker column')
+    parser.add_argument('--catalog', help='JSON export of the biomarkers table')
+    parser.add_argument('--database-url', default=os.environ.get('SUPABASE_DB_URL'),
+                        help='Postgres connection string (default: SUPABASE_DB_URL)')
+    parser.add_argument('--cache', help='Persistent resolution cache (JSON)')
+    args = parser.parse_args()
+
+    if args.catalog:
+        index = BiomarkerNameIndex.load(args.catalog, args.cache)
+    elif args.database_url:
+        index = BiomarkerNameIndex.from_database(args.database_url, args.cache)
+    else:
+        parser.error('needs --catalog or --database-url (or SUPABASE_DB_URL)')
+
+    with open(args.csv_file, 'r', encoding='utf-8', newline='') as f:
+        raw_names = list(dict.fromkeys(row['Biomarker'] for row in csv.DictReader(f) if row.get('Biomarker')))
+
+    started = time.perf_counter()
+    resolved = {raw_name: index.resolve(raw_name) for raw_name in raw_names}
+    elapsed = time.perf_counter() - started
+    index.save()
+
+    print(f"{len(raw_names)} names against {len(index)} catalog biomarkers "
+          f"({elapsed / max(len(raw_names), 1) * 1e6:.1f} µs per name)")
+    for raw_name, name in resolved.items():
+        if name is not None:
+            print(f"  {raw_name:50} -> {name}")
+    print(", ".join(f"{how}: {count}" for how, count in index.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
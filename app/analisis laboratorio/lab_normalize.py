@@ -0,0 +1,84 @@
+"""
+Shared date and number normalization for the lab scripts
+A hand-written DD.MM.YYYY parser and a single numeric parser, both memoized
+with a bounded cache: a report only has a few hundred distinct dates and
+values, so almost every call after the first pass is a cache hit
+"""
+
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+SUFFIX_MULTIPLIERS = {'K': 1_000.0, 'M': 1_000_000.0}
+THOUSANDS_GROUPING = re.compile(r'^[+-]?\d{1,3}(?:,\d{3})+(?:\.\d+)?$')
+
+
+@lru_cache(maxsize=1024)
+def parse_date(value: str) -> Optional[date]:
+    """Parse a DD.MM.YYYY date, returning None when it is not one"""
+    value = value.strip()
+    if len(value) != 10 or value[2] != '.' or value[5] != '.':
+        return None
+    day, month, year = value[0:2], value[3:5], value[6:10]
+    if not (day.isascii() and day.isdigit() and month.isascii() and month.isdigit()
+            and year.isascii() and year.isdigit()):
+        return None
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def day_number(value: str) -> int:
+    """Proleptic ordinal of a DD.MM.YYYY date, or 0 when it does not parse"""
+    parsed = parse_date(value)
+    return parsed.toordinal() if parsed else 0
+
+
+def to_iso_date(value: str) -> str:
+    """Convert DD.MM.YYYY to YYYY-MM-DD, returning the input unchanged if it does not parse"""
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else value
+
+
+@lru_cache(maxsize=4096)
+def parse_number(value: str) -> Optional[float]:
+    """Parse a lab number: '*' abnormal markers, K/M suffixes and ',' / '.' separators
+
+    '3.4K' -> 3400.0, '15M' -> 15000000.0, '-4.1*' -> -4.1, '1,234.5' -> 1234.5,
+    '1.234,5' -> 1234.5, '12,5' -> 12.5. Returns None for anything non-numeric.
+    """
+    if value is None:
+        return None
+    cleaned = str(value).replace('*', '').replace('−', '-').replace(' ', '').strip()
+    if not cleaned:
+        return None
+
+    multiplier = SUFFIX_MULTIPLIERS.get(cleaned[-1])
+    if multiplier:
+        cleaned = cleaned[:-1]
+
+    if ',' in cleaned:
+        if '.' in cleaned:
+            # Whichever separator comes last is the decimal point
+            if cleaned.rfind(',') > cleaned.rfind('.'):
+                cleaned = cleaned.replace('.', '').replace(',', '.')
+            else:
+                cleaned = cleaned.replace(',', '')
+        elif THOUSANDS_GROUPING.match(cleaned):
+            cleaned = cleaned.replace(',', '')
+        else:
+            cleaned = cleaned.replace(',', '.')
+
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    # Reject 'nan' / 'inf' spellings that float() would accept
+    if number != number or number in (float('inf'), float('-inf')):
+        return None
+    if multiplier:
+        # Round away binary noise such as 0.3K -> 300.00000000000006
+        return round(number * multiplier, 9)
+    return number
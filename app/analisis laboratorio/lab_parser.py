@@ -0,0 +1,71 @@
+"""
+Shared parsing engine for Ornament Health lab report text
+Compiles category header detection and the row grammar once, so the
+extractor scripts only decide how a matched row becomes a record
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, Optional, Pattern, Tuple, Match
+
+DATE_PATTERN = r'\d{2}\.\d{2}\.\d{4}'
+
+# Strict grammar used by LabDataExtractor: biomarker date result range units
+STRICT_ROW_GRAMMAR = re.compile(
+    r'^(?P<biomarker>.+?)\s+(?P<date>' + DATE_PATTERN + r')\s+(?P<result>[^\s]+)'
+    r'\s+(?P<range>.+?)\s+(?P<units>[^\s]+)$'
+)
+
+# Token grammar used by FullLabDataProcessor: the biomarker is every token before
+# the first token starting with a date (never the first token), then the result
+# token and whatever remains (reference range and units)
+TOKEN_ROW_GRAMMAR = re.compile(
+    r'^(?!' + DATE_PATTERN + r')(?P<biomarker>\S+(?:\s+\S+)*?)\s+(?P<date>' + DATE_PATTERN + r'\S*)'
+    r'\s+(?P<result>\S+)(?:\s+(?P<tail>.+))?$'
+)
+
+
+class LabLineParser:
+    """Line parser shared by the lab extraction scripts"""
+
+    def __init__(self, categories: Dict[str, str], row_grammar: Pattern, exact_headers: bool = False):
+        self.categories = categories
+        self.row_grammar = row_grammar
+
+        if exact_headers:
+            # A header is a line equal to a category name: one dict lookup per line
+            self.detect_header = categories.get
+        else:
+            # A header is any line containing a category name: one combined pattern
+            header_pattern = re.compile('|'.join(re.escape(name) for name in categories))
+
+            def detect_header(line: str) -> Optional[str]:
+                match = header_pattern.search(line)
+                return categories[match.group(0)] if match else None
+
+            self.detect_header = detect_header
+
+    def iter_lines(self, lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """Yield (category, stripped line) for each non-empty line under a category header"""
+        detect_header = self.detect_header
+        current_category = None
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            category = detect_header(line)
+            if category:
+                current_category = category
+
+            if current_category:
+                yield current_category, line
+
+    def iter_rows(self, lines: Iterable[str]) -> Iterator[Tuple[str, Match]]:
+        """Yield (category, row match) for each data line found under a category header"""
+        match_row = self.row_grammar.match
+
+        for category, line in self.iter_lines(lines):
+            match = match_row(line)
+            if match:
+                yield category, match
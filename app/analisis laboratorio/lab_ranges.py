@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Reference-range and critical-value evaluation
+Classifies values as critical_low / low / normal / high / critical_high
+against the biomarkers catalog (reference_min/max, critical_min/max), falling
+back to the range printed on the report when the catalog has no entry or keeps
+the biomarker in a unit the row's unit does not convert to (see lab_units).
+Bounds are laid out as typed columns aligned with the values, so a whole
+store (or a chunk of lab_results) is classified with one pass of interval
+comparisons; a missing bound is NaN and never matches. Reports rows where
+the computed class disagrees with the source '*' flag, and can set
+lab_results.is_critical in bulk over a direct Postgres connection.
+is_critical means outside the catalog's critical limits for the biomarker in
+the row's unit (RangeCatalog.is_critical); the importers write it the same way.
+"""
+
+import argparse
+import csv
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lab_names import BiomarkerNameIndex
+from lab_normalize import parse_number
+from lab_store import LabResultStore
+from lab_units import canonical_spelling, conversion
+
+CLASSES = ['unknown', 'critical_low', 'low', 'normal', 'high', 'critical_high']
+UNKNOWN, CRITICAL_LOW, LOW, NORMAL, HIGH, CRITICAL_HIGH = range(len(CLASSES))
+NAN = float('nan')
+BOUND_FIELDS = ['reference_min', 'reference_max', 'critical_min', 'critical_max']
+
+SELECT_CATALOG = "select name, display_name, unit, reference_min, reference_max, critical_min, critical_max " \
+                 "from public.biomarkers"
+
+SELECT_LAB_RESULTS = """
+select id, test_name, unit, value::float8, reference_min::float8, reference_max::float8, is_critical
+from public.lab_results
+where %(patient_id)s::uuid is null or patient_id = %(patient_id)s::uuid
+"""
+
+UPDATE_IS_CRITICAL = """
+update public.lab_results lr
+set is_critical = u.is_critical
+from unnest(%s::uuid[], %s::boolean[]) as u(id, is_critical)
+where lr.id = u.id and lr.is_critical is distinct from u.is_critical
+"""
+
+
+def bound(value: Any) -> float:
+    """A catalog or report bound as a float, NaN when absent"""
+    if value is None or value == '':
+        return NAN
+    if isinstance(value, str):
+        value = parse_number(value)
+        return NAN if value is None else value
+    return float(value)
+
+
+class RangeCatalog:
+    """Biomarker name (or display name, case-insensitive) -> (reference_min, reference_max, critical_min, critical_max)
+
+    Other spellings of a catalog biomarker ('Creatinina suero' for creatinine) are
+    resolved through a BiomarkerNameIndex. Bounds are in the catalog row's unit.
+    """
+
+    def __init__(self):
+        self.ranges: Dict[str, Tuple[float, float, float, float]] = {}
+        self.units: Dict[str, str] = {}
+        self.names = BiomarkerNameIndex()
+
+    @staticmethod
+    def key(name: str) -> str:
+        return name.strip().lower()
+
+    def add(self, row: Dict[str, Any]):
+        bounds = tuple(bound(row.get(field)) for field in BOUND_FIELDS)
+        for name in (row.get('name'), row.get('display_name')):
+            if name:
+                self.ranges.setdefault(self.key(name), bounds)
+                self.units.setdefault(self.key(name), canonical_spelling(row.get('unit')))
+        if row.get('name'):
+            self.names.add(row['name'], row.get('display_name'))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> 'RangeCatalog':
+        catalog = cls()
+        for row in rows:
+            catalog.add(row)
+        return catalog
+
+    @classmethod
+    def load(cls, filename: str) -> 'RangeCatalog':
+        """Catalog from a JSON list of biomarkers rows (e.g. an export of the table)"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            return cls.from_rows(json.load(f))
+
+    @classmethod
+    def from_database(cls, dsn: str) -> 'RangeCatalog':
+        import psycopg
+        from psycopg.rows import dict_row
+
+        with psycopg.connect(dsn, row_factory=dict_row) as conn:
+            return cls.from_rows(conn.execute(SELECT_CATALOG).fetchall())
+
+    def lookup(self, name: str, unit: str) -> Optional[Tuple[float, float, float, float]]:
+        """Bounds for values of name reported in unit, scaled into that unit
+
+        None when the biomarker is not in the catalog or values in this unit do not
+        convert to the catalog's unit (a count per µL against a K/μL range).
+        """
+        key = self.key(name)
+        if key not in self.ranges:
+            canonical = self.names.resolve(name)
+            key = self.key(canonical) if canonical else None
+        if key not in self.ranges:
+            return None
+        target, factor = conversion(name, unit or '')
+        if target != self.units[key]:
+            return None
+        if factor == 1.0:
+            return self.ranges[key]
+        return tuple(round(value / factor, 9) for value in self.ranges[key])
+
+    def is_critical(self, name: str, unit: str, value: Optional[float]) -> bool:
+        """Whether value is outside the catalog's critical limits for name in unit (False without a limit)"""
+        bounds = None if value is None else self.lookup(name, unit)
+        # NaN limits never compare, like in classify
+        return bounds is not None and (value < bounds[2] or value > bounds[3])
+
+    def __len__(self):
+        return len(self.ranges)
+
+
+def classify(values: Sequence[float], has_value: Sequence[int], reference_min: Sequence[float],
+             reference_max: Sequence[float], critical_min: Sequence[float],
+             critical_max: Sequence[float]) -> array:
+    """Class code per value from aligned bound columns (NaN bounds never match)"""
+    classes = array('B', bytes(len(values)))
+    columns = zip(values, has_value, reference_min, reference_max, critical_min, critical_max)
+    for index, (value, present, low, high, critical_low, critical_high) in enumerate(columns):
+        if not present or (low != low and high != high and critical_low != critical_low
+                            and critical_high != critical_high):
+            continue
+        if value < critical_low:
+            classes[index] = CRITICAL_LOW
+        elif value > critical_high:
+            classes[index] = CRITICAL_HIGH
+        elif value < low:
+            classes[index] = LOW
+        elif value > high:
+            classes[index] = HIGH
+        else:
+            classes[index] = NORMAL
+    return classes
+
+
+def row_bounds(catalog: RangeCatalog, names: Sequence[str], units: Sequence[str], reference_min: Sequence[float],
+               reference_max: Sequence[float]) -> List[array]:
+    """Bound columns for rows: the catalog range when known in the row's unit, else the row's own reference range"""
+    columns = [array('d') for _ in BOUND_FIELDS]
+    ranges: Dict[Tuple[str, str], Optional[Tuple[float, float, float, float]]] = {}
+    for name, unit, row_min, row_max in zip(names, units, reference_min, reference_max):
+        if (name, unit) not in ranges:
+            ranges[name, unit] = catalog.lookup(name, unit)
+        bounds = ranges[name, unit] or (row_min, row_max, NAN, NAN)
+        for column, value in zip(columns, bounds):
+            column.append(value)
+    return columns
+
+
+class StoreEvaluation:
+    """Classes for every row of a LabResultStore plus disagreements with the source flag"""
+
+    def __init__(self, store: LabResultStore, catalog: RangeCatalog):
+        self.store = store
+        names = list(store.column('Biomarker'))
+        units = list(store.column('Units'))
+        # Report ranges are parsed once per distinct string, like the store's typed columns
+        ref_min = self.parsed_column('Ref_Min')
+        ref_max = self.parsed_column('Ref_Max')
+        self.classes = classify(store.values, store.value_mask,
+                                *row_bounds(catalog, names, units, ref_min, ref_max))
+
+    def parsed_column(self, name: str) -> array:
+        parsed = [bound(value) for value in self.store.dictionaries[name].values]
+        return array('d', (parsed[code] for code in self.store.columns[name]))
+
+    def counts(self) -> Dict[str, int]:
+        totals = [0] * len(CLASSES)
+        for code in self.classes:
+            totals[code] += 1
+        return dict(zip(CLASSES, totals))
+
+    def disagreements(self) -> List[Dict[str, Any]]:
+        """Rows where '*' (Status Abnormal) and the computed class disagree on abnormal vs normal"""
+        abnormal_code = self.store.dictionaries['Status'].codes.get('Abnormal', -1)
+        rows = []
+        for index, (code, status) in enumerate(zip(self.classes, self.store.columns['Status'])):
+            if code == UNKNOWN or (code != NORMAL) == (status == abnormal_code):
+                continue
+            row = self.store.row(index)
+            rows.append({'Biomarker': row['Biomarker'], 'Date': row['Date'], 'Result': row['Result'],
+                         'Ref_Min': row['Ref_Min'], 'Ref_Max': row['Ref_Max'], 'Status': row['Status'],
+                         'computed': CLASSES[code]})
+        return rows
+
+
+def update_is_critical(dsn: str, catalog: RangeCatalog, patient_id: Optional[str] = None,
+                       chunk_size: int = 50_000, dry_run: bool = False) -> Dict[str, int]:
+    """Set lab_results.is_critical from the computed class, one UPDATE per chunk of rows
+
+    Rewrites rows stored before the importers computed the flag, when it held the
+    report's '*' (abnormal): every row gets the importers' meaning, so a row the
+    catalog has no critical limit for is no longer critical (whether it was outside
+    the reference range stays readable from value and reference_min/max). Rows are
+    streamed with a server-side cursor; only rows whose flag changes are written.
+    """
+    import psycopg
+
+    stats = {'rows': 0, 'critical': 0, 'unknown': 0, 'updated': 0}
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor(name='lab_results_scan') as scan, conn.cursor() as cursor:
+            scan.execute(SELECT_LAB_RESULTS, {'patient_id': patient_id})
+            while True:
+                rows = scan.fetchmany(chunk_size)
+                if not rows:
+                    break
+                ids, names, units, values, ref_min, ref_max, current = zip(*rows)
+                bounds = row_bounds(catalog, names, units, [bound(value) for value in ref_min],
+                                    [bound(value) for value in ref_max])
+                classes = classify([value if value is not None else 0.0 for value in values],
+                                   [value is not None for value in values], *bounds)
+                flags = [code in (CRITICAL_LOW, CRITICAL_HIGH) for code in classes]
+                stats['rows'] += len(rows)
+                stats['critical'] += sum(flags)
+                stats['unknown'] += sum(code == UNKNOWN for code in classes)
+                changed = [(row_id, flag) for row_id, flag, old in zip(ids, flags, current) if flag != old]
+                if changed and not dry_run:
+                    cursor.execute(UPDATE_IS_CRITICAL, ([row_id for row_id, _ in changed],
+                                                        [flag for _, flag in changed]))
+                    stats['updated'] += cursor.rowcount
+                elif changed:
+                    stats['updated'] += len(changed)
+        if dry_run:
+            conn.rollback()
+    return stats
+
+
+def load_catalog(args) -> RangeCatalog:
+    if args.catalog:
+        return RangeCatalog.load(args.catalog)
+    if args.database_url:
+        return RangeCatalog.from_database(args.database_url)
+    return RangeCatalog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate lab values against reference and critical ranges')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    evaluate = subparsers.add_parser('evaluate', help='Classify a results CSV and report disagreements with "*"')
+    evaluate.add_argument('csv_file', nargs='?', default='lab_results_full.csv')
+    evaluate.add_argument('--report', help='Write the disagreements to this CSV')
+
+    update = subparsers.add_parser('update-db', help='Set lab_results.is_critical in bulk from critical ranges, '
+                                                     'as the importers do (replaces the abnormal flag of older rows)')
+    update.add_argument('--patient-id', help='Only this patient (default: all)')
+    update.add_argument('--chunk-size', type=int, default=50_000)
+    update.add_argument('--dry-run', action='store_true', help='Count changes without writing them')
+
+    for subparser in (evaluate, update):
+        subparser.add_argument('--catalog', help='JSON export of the biomarkers table')
+        subparser.add_argument('--database-url', default=os.environ.get('SUPABASE_DB_URL'),
+                               help='Postgres connection string (default: SUPABASE_DB_URL)')
+    args = parser.parse_args()
+
+    catalog = load_catalog(args)
+    print(f"Catalog ranges for {len(catalog)} biomarker names")
+
+    if args.command == 'evaluate':
+        evaluation = StoreEvaluation(LabResultStore.from_csv(args.csv_file), catalog)
+        for name, count in evaluation.counts().items():
+            print(f"  {name:14} {count:8}")
+        disagreements = evaluation.disagreements()
+        print(f"{len(disagreements)} values disagree with the source '*' flag")
+        for row in disagreements[:10]:
+            print(f"  {row['Biomarker']:35} {row['Date']} {row['Result']:>10} "
+                  f"[{row['Ref_Min']} - {row['Ref_Max']}] {row['Status']} -> {row['computed']}")
+        if args.report:
+            with open(args.report, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max',
+                                                       'Status', 'computed'])
+                writer.writeheader()
+                writer.writerows(disagreements)
+            print(f"Disagreements saved to {args.report}")
+    else:
+        if not args.database_url:
+            parser.error('update-db needs --database-url or SUPABASE_DB_URL')
+        stats = update_is_critical(args.database_url, catalog, args.patient_id, args.chunk_size, args.dry_run)
+        print(f"{stats['rows']} lab results evaluated: {stats['critical']} critical, {stats['unknown']} without "
+              f"a range, {stats['updated']} is_critical flags {'to change' if args.dry_run else 'changed'}")
+
+
+if __name__ == "__main__":
+    main()
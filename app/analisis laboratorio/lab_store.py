@@ -0,0 +1,121 @@
+"""
+Columnar store for extracted lab results
+Every field is dictionary-encoded (each distinct string kept once, rows hold
+integer codes), with typed columns for the test day number and the numeric
+result. Rows still iterate as dicts, so the CSV writers and summaries work
+unchanged and CSV output round-trips the original strings.
+"""
+
+import csv
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from csv_stream import open_text
+from lab_normalize import day_number, parse_number
+
+
+class StringDictionary:
+    """Maps each distinct value to a small integer code"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+
+    def encode(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class LabResultStore:
+    """Columnar, dictionary-encoded container for lab result records"""
+
+    def __init__(self, fieldnames: List[str], date_field: str = 'Date', value_field: str = 'Result'):
+        self.fieldnames = list(fieldnames)
+        self.date_field = date_field
+        self.value_field = value_field
+        self.dictionaries = {name: StringDictionary() for name in self.fieldnames}
+        self.columns = {name: array('I') for name in self.fieldnames}
+
+        # Typed columns: day number (0 = unparseable) and numeric result with a null mask
+        self.days = array('i')
+        self.values = array('d')
+        self.value_mask = array('B')
+
+        # Typed values are derived once per distinct date / result string
+        self._day_by_code = array('i')
+        self._value_by_code: List[Optional[float]] = []
+
+    @classmethod
+    def from_csv(cls, csv_file: str) -> 'LabResultStore':
+        """Read a results CSV (as written by extract_lab_data; plain, .gz or .zst), skipping rows without a biomarker"""
+        with open_text(csv_file) as f:
+            reader = csv.DictReader(f)
+            store = cls(reader.fieldnames)
+            store.extend(row for row in reader if row.get('Biomarker'))
+        return store
+
+    def __len__(self):
+        return len(self.days)
+
+    def append(self, record: Dict[str, Any]):
+        for name in self.fieldnames:
+            self.columns[name].append(self.dictionaries[name].encode(record.get(name, '')))
+
+        date_code = self.columns[self.date_field][-1]
+        while len(self._day_by_code) <= date_code:
+            self._day_by_code.append(day_number(self.dictionaries[self.date_field].values[len(self._day_by_code)]))
+        self.days.append(self._day_by_code[date_code])
+
+        value_code = self.columns[self.value_field][-1]
+        while len(self._value_by_code) <= value_code:
+            self._value_by_code.append(
+                parse_number(self.dictionaries[self.value_field].values[len(self._value_by_code)]))
+        value = self._value_by_code[value_code]
+        self.values.append(value if value is not None else 0.0)
+        self.value_mask.append(value is not None)
+
+    def extend(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.append(record)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Rebuild the original record at index"""
+        return {name: self.dictionaries[name].values[self.columns[name][index]] for name in self.fieldnames}
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('record index out of range')
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        decoded = [(name, self.dictionaries[name].values, self.columns[name]) for name in self.fieldnames]
+        for index in range(len(self)):
+            yield {name: values[codes[index]] for name, values, codes in decoded}
+
+    def column(self, name: str) -> Iterator[Any]:
+        """Decoded values of one field, in row order"""
+        values = self.dictionaries[name].values
+        return (values[code] for code in self.columns[name])
+
+    def where(self, name: str, value: Any) -> Iterator[Dict[str, Any]]:
+        """Rows whose field equals value, compared on codes without decoding other rows"""
+        code = self.dictionaries[name].codes.get(value)
+        if code is None:
+            return
+        for index, row_code in enumerate(self.columns[name]):
+            if row_code == code:
+                yield self.row(index)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the column arrays (dictionaries not included)"""
+        arrays = list(self.columns.values()) + [self.days, self.values, self.value_mask]
+        return sum(column.itemsize * len(column) for column in arrays)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Per-biomarker time-series index for lab results
+Keeps each biomarker's measurements sorted by test day, supports incremental
+inserts, date-range slicing by binary search and latest-N lookups, and
+saves to / loads from a JSON file so timelines can be queried without
+reparsing the report
+"""
+
+import argparse
+import csv
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lab_normalize import day_number
+
+ENTRY_FIELDS = ['Date', 'Result', 'Status', 'Category']
+
+
+class BiomarkerSeries:
+    """Measurements of one biomarker sorted by day (ties keep insertion order)"""
+
+    def __init__(self):
+        self.days = array('i')
+        self.entries: List[Dict[str, str]] = []
+
+    def insert(self, day: int, entry: Dict[str, str]):
+        position = bisect_right(self.days, day)
+        self.days.insert(position, day)
+        self.entries.insert(position, entry)
+
+    def between(self, start_day: int, end_day: int) -> List[Dict[str, str]]:
+        """Entries with start_day <= day <= end_day"""
+        return self.entries[bisect_left(self.days, start_day):bisect_right(self.days, end_day)]
+
+    def latest(self, n: int) -> List[Dict[str, str]]:
+        """The n most recent entries, oldest first"""
+        return self.entries[-n:] if n > 0 else []
+
+    def __len__(self):
+        return len(self.days)
+
+
+class BiomarkerTimeSeriesIndex:
+    """Biomarker name -> date-sorted series"""
+
+    def __init__(self):
+        self.series: Dict[str, BiomarkerSeries] = {}
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'BiomarkerTimeSeriesIndex':
+        index = cls()
+        index.add_records(records)
+        return index
+
+    def add(self, record: Dict):
+        """Insert one record (needs Biomarker plus the ENTRY_FIELDS)"""
+        series = self.series.get(record['Biomarker'])
+        if series is None:
+            series = self.series[record['Biomarker']] = BiomarkerSeries()
+        series.insert(day_number(record['Date']), {field: record[field] for field in ENTRY_FIELDS})
+
+    def add_records(self, records: Iterable[Dict], skip_existing: bool = False) -> int:
+        """Insert records, returning how many were added
+
+        With skip_existing, records already in the index (same biomarker, day, Result
+        and Status) are skipped, so a cumulative export can be appended to the index
+        built from an earlier one. Matches are counted, so repeated measurements are kept.
+        """
+        existing = Counter(self.keys()) if skip_existing else Counter()
+        added = 0
+        for record in records:
+            if existing:
+                key = (record['Biomarker'], day_number(record['Date']), record['Result'], record['Status'])
+                if existing[key]:
+                    existing[key] -= 1
+                    continue
+            self.add(record)
+            added += 1
+        return added
+
+    def keys(self) -> Iterator[Tuple[str, int, str, str]]:
+        """(biomarker, day, Result, Status) of every entry"""
+        for biomarker, series in self.series.items():
+            for day, entry in zip(series.days, series.entries):
+                yield biomarker, day, entry['Result'], entry['Status']
+
+    def range(self, biomarker: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, str]]:
+        """Entries for a biomarker between two dates (inclusive, open-ended when None)"""
+        series = self.series.get(biomarker)
+        if series is None:
+            return []
+        start_day = start.toordinal() if start else 0
+        end_day = end.toordinal() if end else date.max.toordinal()
+        return series.between(start_day, end_day)
+
+    def latest(self, biomarker: str, n: int = 1) -> List[Dict[str, str]]:
+        series = self.series.get(biomarker)
+        return series.latest(n) if series else []
+
+    def timeline(self) -> Dict[str, List[Dict[str, str]]]:
+        """Every biomarker's entries sorted by date, in the create_biomarker_timeline format"""
+        return {biomarker: list(series.entries) for biomarker, series in self.series.items()}
+
+    def save(self, filename: str):
+        data = {
+            biomarker: [[entry[field] for field in ENTRY_FIELDS] for entry in series.entries]
+            for biomarker, series in self.series.items()
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename: str) -> 'BiomarkerTimeSeriesIndex':
+        """Load a saved index; entries are stored sorted, so no re-sorting is needed"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = cls()
+        for biomarker, rows in data.items():
+            series = index.series[biomarker] = BiomarkerSeries()
+            for row in rows:
+                entry = dict(zip(ENTRY_FIELDS, row))
+                series.days.append(day_number(entry['Date']))
+                series.entries.append(entry)
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the biomarker time-series index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Build (or extend) an index from a results CSV')
+    build.add_argument('csv_file')
+    build.add_argument('index_file')
+    build.add_argument('--append', action='store_true', help='Insert into an existing index file')
+
+    query = subparsers.add_parser('query', help='Query a saved index')
+    query.add_argument('index_file')
+    query.add_argument('biomarker')
+    query.add_argument('--from', dest='start', type=date.fromisoformat, help='YYYY-MM-DD')
+    query.add_argument('--to', dest='end', type=date.fromisoformat, help='YYYY-MM-DD')
+    query.add_argument('--latest', type=int, help='Only the N most recent values (within --from/--to)')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = BiomarkerTimeSeriesIndex.load(args.index_file) if args.append else BiomarkerTimeSeriesIndex()
+        with open(args.csv_file, 'r', encoding='utf-8') as f:
+            added = index.add_records((row for row in csv.DictReader(f) if row.get('Biomarker')),
+                                      skip_existing=args.append)
+        index.save(args.index_file)
+        print(f"Indexed {sum(len(s) for s in index.series.values())} values ({added} new) "
+              f"for {len(index.series)} biomarkers in {args.index_file}")
+    else:
+        index = BiomarkerTimeSeriesIndex.load(args.index_file)
+        if args.latest and not (args.start or args.end):
+            entries = index.latest(args.biomarker, args.latest)
+        else:
+            entries = index.range(args.biomarker, args.start, args.end)
+            if args.latest:
+                entries = entries[-args.latest:]
+        print(json.dumps(entries, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Trend and rate-of-change analytics per biomarker
+Works on the typed columns of a LabResultStore: rows of every biomarker are
+ordered by (biomarker, day) with one sort, then a single walk fills derived
+columns for all biomarkers at once - change from the previous value, slope
+per 30 days, rolling mean/median over the last N values and days since the
+last abnormal value. Writes a JSON the dashboard can load (one columnar
+series per biomarker plus a latest-values summary).
+"""
+
+import argparse
+import json
+import math
+from array import array
+from collections import deque
+from datetime import date
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+from lab_store import LabResultStore
+
+TREND_COLUMNS = ['delta', 'slope_30d', 'rolling_mean', 'rolling_median', 'days_since_abnormal']
+NAN = float('nan')
+
+
+def rounded(value: float, digits: Optional[int] = 4) -> Optional[float]:
+    """JSON-friendly value: NaN (no value) becomes null, digits=None rounds to an int"""
+    return None if math.isnan(value) else round(value, digits)
+
+
+def iso_day(day: int) -> Optional[str]:
+    return date.fromordinal(day).isoformat() if day else None
+
+
+class LabTrends:
+    """Derived trend columns for every row of a store, grouped by biomarker"""
+
+    def __init__(self, store: LabResultStore, window: int = 5):
+        self.store = store
+        self.window = window
+        codes = store.columns['Biomarker']
+        days = store.days
+
+        # Rows without a date cannot be placed on a trajectory
+        self.order = array('I', sorted((index for index in range(len(store)) if days[index]),
+                                       key=lambda index: (codes[index], days[index], index)))
+        self.columns = {name: array('d', [NAN]) * len(self.order) for name in TREND_COLUMNS}
+        self.segments: Dict[int, range] = {}  # Biomarker code -> positions in order
+        self.as_of = max((days[index] for index in self.order), default=0)
+        self.compute()
+
+    def compute(self):
+        store = self.store
+        codes, days, values, has_value = store.columns['Biomarker'], store.days, store.values, store.value_mask
+        abnormal_code = store.dictionaries['Status'].codes.get('Abnormal', -1)
+        statuses = store.columns['Status']
+        delta, slope, rolling_mean, rolling_median, since_abnormal = (self.columns[name] for name in TREND_COLUMNS)
+
+        current = -1
+        segment_start = 0
+        recent = deque(maxlen=self.window)
+        previous_day = previous_value = last_abnormal = None
+        for position, index in enumerate(self.order):
+            code, day = codes[index], days[index]
+            if code != current:
+                if current >= 0:
+                    self.segments[current] = range(segment_start, position)
+                current, segment_start = code, position
+                recent.clear()
+                previous_day = previous_value = last_abnormal = None
+
+            if statuses[index] == abnormal_code:
+                last_abnormal = day
+            if last_abnormal is not None:
+                since_abnormal[position] = day - last_abnormal
+
+            if not has_value[index]:
+                continue
+            value = values[index]
+            if previous_value is not None:
+                delta[position] = value - previous_value
+                if day > previous_day:
+                    slope[position] = (value - previous_value) / (day - previous_day) * 30
+            recent.append(value)
+            rolling_mean[position] = sum(recent) / len(recent)
+            rolling_median[position] = median(recent)
+            previous_day, previous_value = day, value
+
+        if current >= 0:
+            self.segments[current] = range(segment_start, len(self.order))
+
+    def series(self, biomarker: str) -> Optional[Dict[str, Any]]:
+        """Columnar series of one biomarker for charts, oldest first"""
+        code = self.store.dictionaries['Biomarker'].codes.get(biomarker)
+        if code is None or code not in self.segments:
+            return None
+
+        store = self.store
+        positions = self.segments[code]
+        rows = [self.order[position] for position in positions]
+        decode = {name: (store.dictionaries[name].values, store.columns[name])
+                  for name in ('Category', 'Units', 'Result', 'Status', 'Ref_Min', 'Ref_Max')}
+
+        def field(name: str, index: int) -> str:
+            values, codes = decode[name]
+            return values[codes[index]]
+
+        series = {
+            'category': field('Category', rows[-1]),
+            'unit': field('Units', rows[-1]),
+            'reference_min': field('Ref_Min', rows[-1]) or None,
+            'reference_max': field('Ref_Max', rows[-1]) or None,
+            'dates': [iso_day(store.days[index]) for index in rows],
+            'results': [field('Result', index) for index in rows],
+            'values': [rounded(store.values[index]) if store.value_mask[index] else None for index in rows],
+            'status': [field('Status', index) for index in rows],
+        }
+        for name in TREND_COLUMNS:
+            column = self.columns[name]
+            digits = None if name == 'days_since_abnormal' else 4
+            series[name] = [rounded(column[position], digits) for position in positions]
+        series['latest'] = self.latest(series)
+        return series
+
+    def latest(self, series: Dict[str, Any]) -> Dict[str, Any]:
+        """Most recent value with its trend figures; days since abnormal is counted to the newest date overall"""
+        abnormal_dates = [day for day, status in zip(series['dates'], series['status']) if status == 'Abnormal']
+        last_abnormal = abnormal_dates[-1] if abnormal_dates else None
+        summary = {'date': series['dates'][-1], 'result': series['results'][-1], 'value': series['values'][-1],
+                   'status': series['status'][-1], 'count': len(series['dates']), 'last_abnormal': last_abnormal,
+                   'days_since_abnormal': (self.as_of - date.fromisoformat(last_abnormal).toordinal()
+                                           if last_abnormal else None)}
+        for name in ('delta', 'slope_30d', 'rolling_mean', 'rolling_median'):
+            summary[name] = series[name][-1]
+        return summary
+
+    def as_dict(self, biomarkers: Optional[List[str]] = None) -> Dict[str, Any]:
+        names = self.store.dictionaries['Biomarker'].values
+        selected = biomarkers if biomarkers is not None else [names[code] for code in sorted(self.segments)]
+        series = {name: self.series(name) for name in selected}
+        return {
+            'as_of': iso_day(self.as_of),
+            'window': self.window,
+            'biomarkers': {name: data for name, data in series.items() if data is not None},
+        }
+
+    def save(self, filename: str, biomarkers: Optional[List[str]] = None):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(biomarkers), f, indent=2, ensure_ascii=False)
+
+
+def compute_trends(source, window: int = 5) -> LabTrends:
+    """Trends from a LabResultStore or a results CSV path"""
+    store = LabResultStore.from_csv(source) if isinstance(source, str) else source
+    return LabTrends(store, window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute per-biomarker trends for the dashboard')
+    parser.add_argument('csv_file', nargs='?', default='lab_results_full.csv')
+    parser.add_argument('-o', '--output', default='lab_trends.json')
+    parser.add_argument('--window', type=int, default=5, help='Values in the rolling mean/median')
+    parser.add_argument('--biomarker', action='append', help='Only these biomarkers (repeatable)')
+    args = parser.parse_args()
+
+    trends = compute_trends(args.csv_file, args.window)
+    data = trends.as_dict(args.biomarker)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+    print(f"Trends for {len(data['biomarkers'])} biomarkers as of {data['as_of']} saved to {args.output}")
+    for name, series in data['biomarkers'].items():
+        latest = series['latest']
+        if latest['count'] < 2 or latest['slope_30d'] is None:
+            continue
+        since = latest['days_since_abnormal']
+        print(f"  {name:35} {latest['result']:>10} {series['unit']:8} slope/30d {latest['slope_30d']:+9.3f}  "
+              f"mean({args.window}) {latest['rolling_mean']:9.3f}  "
+              f"{'never abnormal' if since is None else f'abnormal {since} days ago'}")
+
+
+if __name__ == "__main__":
+    main()
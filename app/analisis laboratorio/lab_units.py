@@ -0,0 +1,135 @@
+"""
+Unit normalization for lab values
+Each (biomarker, unit) pair resolves once (memoized) to a canonical unit and
+a multiplier, from tables compiled at import time: spelling aliases
+('units/mm³' -> '/µL'), same-dimension scalings (mg/L -> mg/dL) and
+analyte-specific conversions (calcium mmol/L -> mg/dL, blood counts into the
+catalog's K/µL). The importers apply it when they build rows, so stored
+values, reference ranges, charts and range checks all use one unit per
+biomarker. K/M magnitude suffixes on numbers ('3.4K') are already scaled by
+lab_normalize.parse_number.
+"""
+
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# Spellings seen in reports -> one canonical spelling
+UNIT_ALIASES = {
+    'units/mm³': '/µL', 'units/mcL': '/µL', 'cells/µL': '/µL', 'cells/mcL': '/µL', '/mm³': '/µL', '/mcL': '/µL',
+    'units/mL': '/mL', 'mcm³': 'fL', 'µm³': 'fL',
+    'mg/dl': 'mg/dL', 'g/dl': 'g/dL', 'ng/dl': 'ng/dL', 'mcg/dL': 'µg/dL', 'mcg/L': 'µg/L', 'mcg/mL': 'µg/mL',
+    'mcIU/mL': 'µIU/mL', 'µU/mL': 'µIU/mL', 'mcmol/L': 'µmol/L', 'umol/L': 'µmol/L',
+    'mmol/l': 'mmol/L', 'meq/L': 'mEq/L', 'iu/L': 'IU/L', 'U/L': 'IU/L',
+    '×100%': 'ratio', 'x100%': 'ratio',
+}
+
+# Units of one dimension, as multiples of a common base; any two convert by the ratio
+DIMENSIONS = [
+    {'g/dL': 1000.0, 'g/L': 100.0, 'mg/dL': 1.0, 'mg/L': 0.1, 'µg/mL': 0.1, 'µg/dL': 1e-3, 'µg/L': 1e-4,
+     'ng/mL': 1e-4, 'ng/dL': 1e-6, 'pg/mL': 1e-7},
+    {'/µL': 1.0, '10³/µL': 1e3, 'K/µL': 1e3, '10⁹/L': 1e3, '10^9/L': 1e3, '10⁶/µL': 1e6, 'M/µL': 1e6,
+     '10¹²/L': 1e6, '10^12/L': 1e6, '/mL': 1e-3, '/L': 1e-6},
+    {'mmol/L': 1.0, 'µmol/L': 1e-3},
+    {'IU/mL': 1.0, 'mIU/mL': 1e-3, 'µIU/mL': 1e-6, 'IU/L': 1e-3},
+]
+
+# Analytes whose reports differ in unit: name keywords (first match wins), canonical unit and
+# molar or equivalent conversions into it (mg/dL = mmol/L x molar mass / 10)
+ANALYTES = [
+    ('bun', ('nitrógeno ureico', 'urea nitrogen', 'bun'), 'mg/dL', {'mmol/L': 2.801}),
+    ('calcium', ('calcio', 'calcium'), 'mg/dL', {'mmol/L': 4.008, 'mEq/L': 2.004}),
+    ('glucose', ('glucosa', 'glucose'), 'mg/dL', {'mmol/L': 18.016}),
+    ('creatinine', ('creatinina', 'creatinine'), 'mg/dL', {'mmol/L': 1000 / 88.42}),
+    ('urea', ('urea',), 'mg/dL', {'mmol/L': 6.006}),
+    ('cholesterol', ('colesterol', 'cholesterol'), 'mg/dL', {'mmol/L': 38.67}),
+    ('triglycerides', ('triglicéridos', 'triglycerides'), 'mg/dL', {'mmol/L': 88.57}),
+    ('phosphate', ('fosfato', 'phosphate', 'phosphorus'), 'mg/dL', {'mmol/L': 3.097}),
+    ('magnesium', ('magnesio', 'magnesium'), 'mg/dL', {'mmol/L': 2.431, 'mEq/L': 1.215}),
+    ('uric_acid', ('ácido úrico', 'uric acid'), 'mg/dL', {'mmol/L': 1000 / 59.48}),
+    ('bilirubin', ('bilirrubina', 'bilirubina', 'bilirubin'), 'mg/dL', {'mmol/L': 1000 / 17.1}),
+    ('crp', ('proteína c reactiva', 'c-reactive protein'), 'mg/L', {}),
+    ('mchc', ('chcm', 'mchc'), 'g/dL', {'%': 1.0}),
+    ('specific_gravity', ('densidad orina', 'densidad urinaria', 'specific gravity'), 'ratio', {}),
+    # Urine sediment counts stay per µL; listed before the blood counts that share their names
+    ('urine', ('orina', 'urine'), '/µL', {}),
+    # Blood counts in the biomarkers catalog's units (K/μL), so stored values and catalog ranges agree
+    ('wbc', ('leucocitos', 'leukocytes', 'white blood cells', 'glóbulos blancos', 'wbc'), 'K/µL', {}),
+    ('platelets', ('plaquetas', 'platelets'), 'K/µL', {}),
+    ('rbc', ('eritrocitos', 'erythrocytes', 'red blood cells', 'glóbulos rojos', 'rbc'), 'M/µL', {}),
+    ('differential', ('neutrófilos', 'linfocitos', 'monocitos', 'eosinófilos', 'basófilos', 'blastos',
+                      'neutrophils', 'lymphocytes', 'monocytes', 'eosinophils', 'basophils', 'blasts'), 'K/µL', {}),
+]
+
+# Analytes some reports print without the decimal point: values from the threshold up are multiplied
+# by the factor (a urine specific gravity of 1010 is 1.010)
+MAGNITUDE_FIXES = {'specific_gravity': (100.0, 1e-3)}
+
+
+def clean(text: str) -> str:
+    """NFC-normalized, trimmed; the micro sign and Greek mu spell the same prefix"""
+    return unicodedata.normalize('NFC', text or '').strip().replace('μ', 'µ')
+
+
+def canonical_spelling(unit: str) -> str:
+    unit = clean(unit)
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def scale_between(unit: str, target: str) -> Optional[float]:
+    """Multiplier from unit to target when both belong to one dimension table"""
+    for dimension in DIMENSIONS:
+        if unit in dimension and target in dimension:
+            return dimension[unit] / dimension[target]
+    return None
+
+
+@lru_cache(maxsize=1024)
+def analyte(biomarker: str) -> Optional[Tuple[str, str, Dict[str, float]]]:
+    """(analyte, canonical unit, conversions) for a biomarker name, or None"""
+    name = clean(biomarker).lower()
+    for key, keywords, unit, conversions in ANALYTES:
+        if any(keyword in name for keyword in keywords):
+            return key, unit, conversions
+    return None
+
+
+@lru_cache(maxsize=4096)
+def conversion(biomarker: str, unit: str) -> Tuple[str, float]:
+    """Canonical unit and multiplier for values of a biomarker reported in unit
+
+    Units without a known conversion keep their (canonical) spelling with a
+    multiplier of 1, so nothing is ever scaled by guesswork.
+    """
+    spelled = canonical_spelling(unit)
+    known = analyte(biomarker)
+    if not spelled or known is None:
+        return spelled, 1.0
+
+    _, target, conversions = known
+    if spelled == target:
+        return target, 1.0
+    factor = scale_between(spelled, target)
+    if factor is None:
+        # Through an analyte conversion, scaling within its dimension first (µmol/L -> mmol/L -> mg/dL)
+        for source, multiplier in conversions.items():
+            step = 1.0 if spelled == source else scale_between(spelled, source)
+            if step is not None:
+                factor = step * multiplier
+                break
+    if factor is None:
+        return spelled, 1.0
+    return target, factor
+
+
+def normalize_value(biomarker: str, unit: str, value: Optional[float]) -> Tuple[Optional[float], str]:
+    """(value in the canonical unit, canonical unit)"""
+    target, factor = conversion(biomarker, unit)
+    known = analyte(biomarker)
+    fix = MAGNITUDE_FIXES.get(known[0]) if known else None
+    if fix is not None and value is not None and abs(value) >= fix[0]:
+        factor *= fix[1]
+    if value is None or factor == 1.0:
+        return value, target
+    # Round away binary noise such as 0.3 x 10 -> 3.0000000000000004
+    return round(value * factor, 9), target
@@ -0,0 +1,296 @@
+"""
+Local mock of the PostgREST endpoints used by the lab importer
+Serves biomarkers, lab_results, lab_parsed_values and patients from memory
+with the unique/foreign-key checks the importer relies on, and can inject
+latency and 503 failures so import strategies can be benchmarked offline.
+Requests are served over HTTP (start()) or in-process through handle(), which
+is what fake_supabase.InMemorySupabase uses.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+UNIQUE_KEYS = {'biomarkers': ['name']}
+# With compact=True only these columns of the high-volume tables are kept (enough for keys and counts)
+COMPACT_TABLES = {'lab_results', 'lab_parsed_values'}
+COMPACT_COLUMNS = ['id', 'patient_id', 'lab_result_id', 'created_at']
+LAB_RESULT_COLUMNS = ['id', 'test_name', 'value', 'unit', 'reference_min', 'reference_max', 'is_critical',
+                      'test_date']
+
+
+class MockPostgREST:
+    """In-memory PostgREST stand-in running on a background thread"""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0, compact: bool = False):
+        self.latency = latency
+        self.compact = compact
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            'biomarkers': [], 'lab_results': [], 'lab_parsed_values': [], 'patients': []
+        }
+        self.indexes: Dict[str, Dict[str, Dict[Any, Dict[str, Any]]]] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def add_patient(self, external_id: str = None, email: str = None) -> str:
+        patient_id = str(uuid.uuid4())
+        self.insert('patients', [{'id': patient_id, 'external_id': external_id, 'email': email}], None, '')
+        return patient_id
+
+    def start(self, port: int = 0) -> str:
+        """Start serving; returns the base URL to pass to create_client"""
+        mock = self
+
+        class Handler(MockRequestHandler):
+            pass
+
+        Handler.mock = mock
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def round_trips(self) -> int:
+        return len(self.requests)
+
+    def handle(self, method: str, table: str, query: List, body: bytes = b'', prefer: str = '',
+               range_header: Optional[str] = None):
+        """Serve one request with injected latency/failures; returns (status, JSON body or None)"""
+        with self.lock:
+            self.requests.append({'method': method, 'table': table, 'bytes': len(body)})
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 503, {'message': 'injected failure'}
+
+        with self.lock:
+            if method == 'GET':
+                return 200, self.select(table, query, range_header)
+            if table == 'rpc/import_lab_batch':
+                params = json.loads(body)
+                return self.import_lab_batch(params['p_patient_id'], params['p_rows'])
+            payload = json.loads(body or b'[]')
+            rows = payload if isinstance(payload, list) else [payload]
+            status, written = self.insert(table, rows, dict(query).get('on_conflict'), prefer)
+        if status == 201 and 'return=minimal' in prefer:
+            return 201, None
+        return status, written
+
+    # Query helpers
+
+    @staticmethod
+    def split_top_level(expression: str) -> List[str]:
+        """Split 'a.eq.1,b.in.(2,3)' on commas outside parentheses and quotes"""
+        parts, depth, quoted, current = [], 0, False, ''
+        for char in expression:
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in '()':
+                depth += 1 if char == '(' else -1
+            elif not quoted and depth == 0 and char == ',':
+                parts.append(current)
+                current = ''
+                continue
+            current += char
+        return parts + [current]
+
+    @classmethod
+    def matches(cls, row: Dict[str, Any], filters: List) -> bool:
+        for column, expression in filters:
+            if column == 'or':
+                alternatives = [part.split('.', 1) for part in cls.split_top_level(expression[1:-1])]
+                if not any(cls.matches(row, [alternative]) for alternative in alternatives):
+                    return False
+                continue
+            operator, _, operand = expression.partition('.')
+            value = row.get(column)
+            if operator == 'eq' and str(value) != operand:
+                return False
+            if operator in ('gt', 'gte') and (value is None or str(value) < operand
+                                              or (operator == 'gt' and str(value) == operand)):
+                return False
+            if operator == 'in':
+                options = [option.strip('"') for option in cls.split_top_level(operand[1:-1])]
+                if str(value) not in options:
+                    return False
+        return True
+
+    def select(self, table: str, query: List, range_header: Optional[str]) -> List[Dict[str, Any]]:
+        params = dict(query)
+        filters = [(k, v) for k, v in query if k not in ('select', 'limit', 'offset', 'order', 'on_conflict')]
+        rows = [row for row in self.tables[table] if self.matches(row, filters)]
+        if 'order' in params:
+            column = params['order'].split('.')[0]
+            rows.sort(key=lambda row: str(row.get(column)))
+
+        offset = int(params.get('offset', 0))
+        limit = int(params['limit']) if 'limit' in params else None
+        if range_header:
+            first, last = range_header.split('-')
+            offset, limit = int(first), int(last) - int(first) + 1
+        rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+        columns = params.get('select', '*')
+        if columns != '*':
+            rows = [self.project(table, row, columns) for row in rows]
+        return rows
+
+    def project(self, table: str, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+        """Pick columns, embedding child rows for 'child_table(col,...)' entries"""
+        projected = {}
+        for column in re.findall(r'\w+\([^)]*\)|\w+', columns):
+            if '(' in column:
+                child, child_columns = column[:-1].split('(')
+                foreign_key = f"{table.rstrip('s')}_id"
+                projected[child] = [{name: child_row.get(name) for name in child_columns.split(',')}
+                                    for child_row in self.tables[child] if child_row.get(foreign_key) == row['id']]
+            else:
+                projected[column] = row.get(column)
+        return projected
+
+    def index(self, table: str, key: str) -> Dict[Any, Dict[str, Any]]:
+        """Value -> row index on a column, built on first use and kept up to date by insert"""
+        indexes = self.indexes.setdefault(table, {})
+        if key not in indexes:
+            indexes[key] = {row[key]: row for row in self.tables[table] if row.get(key) is not None}
+        return indexes[key]
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[str], prefer: str):
+        """Insert rows atomically; returns (status, written rows or error)"""
+        conflict_target = on_conflict.split(',') if on_conflict else []
+        keys = list(dict.fromkeys(UNIQUE_KEYS.get(table, []) + conflict_target + ['id']))
+        indexes = {key: self.index(table, key) for key in keys}
+
+        if table == 'lab_parsed_values':
+            result_ids = self.index('lab_results', 'id')
+            if any(row['lab_result_id'] not in result_ids for row in rows):
+                return 409, {'code': '23503', 'message': 'lab_result_id violates foreign key constraint'}
+
+        written, pending = [], []
+        staged = {key: {} for key in keys}  # Rows of this request, indexed only once it succeeds
+        for row in rows:
+            row = dict(row)
+            conflict = None
+            for key in keys:
+                value = row.get(key)
+                if value is not None:
+                    conflict = indexes[key].get(value) or staged[key].get(value)
+                    if conflict is not None:
+                        break
+            if conflict is not None:
+                if 'ignore-duplicates' in prefer:
+                    continue
+                if 'merge-duplicates' in prefer:
+                    conflict.update({k: v for k, v in row.items() if k != 'id'})
+                    written.append(conflict)
+                    continue
+                return 409, {'code': '23505', 'message': f'duplicate key value violates unique constraint on {table}'}
+            row.setdefault('id', str(uuid.uuid4()))
+            row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+            stored = {column: row.get(column) for column in COMPACT_COLUMNS} \
+                if self.compact and table in COMPACT_TABLES else row
+            for key in keys:
+                if row.get(key) is not None:
+                    staged[key][row[key]] = stored
+            pending.append(stored)
+            written.append(row)
+
+        self.tables[table].extend(pending)
+        for key in keys:
+            indexes[key].update(staged[key])
+        return 201, written
+
+
+    def rollback(self, sizes: Dict[str, int]):
+        """Drop rows added since sizes (table -> row count) were taken; indexes are rebuilt on next use"""
+        for table, size in sizes.items():
+            del self.tables[table][size:]
+            self.indexes.pop(table, None)
+
+    def import_lab_batch(self, patient_id: str, rows: List[Dict[str, Any]]):
+        """The import_lab_batch database function (supabase/migrations), all-or-nothing like the real one"""
+        sizes = {table: len(self.tables[table]) for table in ('biomarkers', 'lab_results', 'lab_parsed_values')}
+        biomarkers = self.index('biomarkers', 'name')
+        missing = {}
+        for row in rows:
+            name = row.get('biomarker') or row['test_name']
+            if name not in biomarkers and name not in missing:
+                missing[name] = {
+                    'name': name, 'display_name': name, 'category': row['category'],
+                    'unit': row['unit'] or '', 'reference_min': row['reference_min'],
+                    'reference_max': row['reference_max'], 'description': row['description']
+                }
+        status, error = self.insert('biomarkers', list(missing.values()), None, '')
+        if status != 201:
+            return status, error
+
+        # Ids already stored (a retried batch) are skipped, and so are their parsed values
+        lab_results = [dict({column: row.get(column) for column in LAB_RESULT_COLUMNS}, patient_id=patient_id)
+                       for row in rows]
+        status, written = self.insert('lab_results', lab_results, 'id', 'resolution=ignore-duplicates')
+        if status != 201:
+            self.rollback(sizes)
+            return status, written
+        created = {lab_result['id'] for lab_result in written}
+
+        biomarkers = self.index('biomarkers', 'name')
+        parsed_values = [{
+            'lab_result_id': row['id'], 'biomarker_id': biomarkers[row.get('biomarker') or row['test_name']]['id'],
+            'raw_name': row['test_name'], 'raw_value': row['raw_value'], 'parsed_value': row['value'],
+            'unit': row['unit'], 'confidence_score': 1.0, 'extraction_method': 'csv_import'
+        } for row in rows if row['id'] in created]
+        status, error = self.insert('lab_parsed_values', parsed_values, None, '')
+        if status != 201:
+            self.rollback(sizes)
+            return status, error
+        return 200, {'biomarkers_created': len(missing), 'lab_results_created': len(created),
+                     'lab_parsed_values_created': len(parsed_values)}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock: MockPostgREST = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, body: Any = None, headers: Dict[str, str] = None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        url = urlparse(self.path)
+        return url.path.rstrip('/').split('/rest/v1/', 1)[-1], parse_qsl(url.query, keep_blank_values=True)
+
+    def do_GET(self):
+        table, query = self.route()
+        status, rows = self.mock.handle('GET', table, query, range_header=self.headers.get('Range'))
+        self.send_json(status, rows)
+
+    def do_POST(self):
+        table, query = self.route()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, written = self.mock.handle('POST', table, query, body, self.headers.get('Prefer', ''))
+        self.send_json(status, written)
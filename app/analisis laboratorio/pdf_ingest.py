@@ -0,0 +1,75 @@
+"""
+PDF ingestion for Ornament Health lab reports
+Extracts text page by page in a worker pool with pypdf (pure Python, works
+offline: pip install pypdf) and yields the lines in page order, so the row
+parser consumes early pages while later ones are still being extracted
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from pypdf import PdfReader
+
+from lab_cache import ExtractionCache
+
+# Each worker opens the PDF once and keeps the reader for all its pages
+_reader: Optional[PdfReader] = None
+
+
+def _open_reader(path: str):
+    global _reader
+    _reader = PdfReader(path)
+
+
+def _extract_page(page_number: int) -> str:
+    return _reader.pages[page_number].extract_text() or ''
+
+
+def _page_content(page) -> bytes:
+    """Raw content stream of a page; hashing it is far cheaper than text extraction"""
+    contents = page.get_contents()
+    return contents.get_data() if contents is not None else b''
+
+
+def _extract_pages(path: str, page_numbers: List[int], workers: int = None) -> Iterator[str]:
+    """Yield the text of the given pages in order, extracting them in parallel"""
+    workers = min(workers or os.cpu_count() or 1, max(len(page_numbers), 1))
+
+    if workers == 1:
+        _open_reader(path)
+        yield from map(_extract_page, page_numbers)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_reader, initargs=(path,)) as pool:
+        # map() submits every page up front and yields results in page order as they finish
+        yield from pool.map(_extract_page, page_numbers)
+
+
+def iter_pdf_lines(path: str, workers: int = None, cache: ExtractionCache = None) -> Iterator[str]:
+    """Yield the text lines of a PDF in page order, extracting pages in parallel
+
+    With a cache, pages whose content stream hash is already known are served
+    from it and only new or changed pages are sent to the workers.
+    """
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+    cached_text: Dict[int, str] = {}
+    keys = []
+
+    if cache is not None:
+        for number, page in enumerate(reader.pages):
+            key = cache.key('page', _page_content(page))
+            keys.append(key)
+            text = cache.get_page(key)
+            if text is not None:
+                cached_text[number] = text
+
+    extracted = _extract_pages(path, [n for n in range(page_count) if n not in cached_text], workers)
+    for number in range(page_count):
+        text = cached_text.get(number)
+        if text is None:
+            text = next(extracted)
+            if cache is not None:
+                cache.put_page(keys[number], text)
+        yield from text.splitlines()
@@ -0,0 +1,206 @@
+"""
+Direct Postgres backend for LabDataImporter
+Streams the CSV into a temporary staging table with COPY FROM STDIN, then fans
+it out into biomarkers, lab_results and lab_parsed_values with set-based
+INSERT ... SELECT statements in a single transaction. Meant for large
+backfills where PostgREST JSON inserts are the bottleneck; a failed import
+leaves the database untouched.
+"""
+
+import os
+from typing import Dict, Iterator, Optional
+
+import psycopg
+from psycopg.rows import dict_row
+
+from csv_stream import iter_csv_rows
+from import_lab_to_supabase import LabDataImporter
+from lab_fingerprints import stored_fingerprint
+
+STAGING_COLUMNS = [
+    'line', 'id', 'test_name', 'biomarker', 'category', 'source_category', 'unit', 'value', 'raw_value',
+    'reference_min', 'reference_max', 'is_critical', 'test_date'
+]
+
+CREATE_STAGING = """
+create temp table lab_import_staging (
+  line integer,
+  id uuid,
+  test_name text,
+  biomarker text,
+  category text,
+  source_category text,
+  unit text,
+  value numeric,
+  raw_value text,
+  reference_min numeric,
+  reference_max numeric,
+  is_critical boolean,
+  test_date date
+) on commit drop
+"""
+
+# Biomarker attributes come from the first row that mentions it, as in the REST path;
+# biomarker is the catalog name the report name (test_name) resolved to
+INSERT_BIOMARKERS = """
+insert into public.biomarkers (name, display_name, category, unit, reference_min, reference_max, description)
+select distinct on (biomarker)
+  biomarker, biomarker, category, coalesce(unit, ''), reference_min, reference_max,
+  'Imported from lab data - ' || source_category
+from lab_import_staging
+order by biomarker, line
+on conflict (name) do nothing
+"""
+
+INSERT_LAB_RESULTS = """
+insert into public.lab_results (id, patient_id, test_name, value, unit, reference_min, reference_max,
+                                is_critical, test_date)
+select id, %s, test_name, value, unit, reference_min, reference_max, is_critical, test_date
+from lab_import_staging
+"""
+
+INSERT_PARSED_VALUES = """
+insert into public.lab_parsed_values (lab_result_id, biomarker_id, raw_name, raw_value, parsed_value, unit,
+                                      confidence_score, extraction_method)
+select s.id, b.id, s.test_name, s.raw_value, s.value, s.unit, 1.0, 'csv_import'
+from lab_import_staging s
+join public.biomarkers b on b.name = s.biomarker
+"""
+
+SELECT_CATALOG = """
+select id, name, display_name, unit, reference_min, reference_max, critical_min, critical_max
+from public.biomarkers
+"""
+
+SELECT_STORED_RESULTS = """
+select lr.test_name, lr.test_date::text, lr.value::float8, lr.unit, lr.created_at,
+       (select pv.raw_value from public.lab_parsed_values pv where pv.lab_result_id = lr.id limit 1)
+from public.lab_results lr
+where lr.patient_id = %(patient_id)s
+  and (%(synced_at)s::timestamptz is null or lr.created_at > %(synced_at)s::timestamptz)
+order by lr.created_at
+"""
+
+
+class PostgresCopyImporter(LabDataImporter):
+    """LabDataImporter that writes through a direct Postgres connection instead of PostgREST"""
+
+    def __init__(self, dsn: Optional[str] = None, fingerprint_file: Optional[str] = 'lab_fingerprints.json',
+                 name_cache_file: Optional[str] = 'biomarker_names.json'):
+        self.dsn = dsn or os.environ.get('SUPABASE_DB_URL')
+        # One transaction: nothing to resume
+        super().__init__(fingerprint_file=fingerprint_file, journal_file=None, name_cache_file=name_cache_file)
+
+    def connect(self, client) -> None:
+        """No Supabase client: every statement goes over psycopg"""
+        if not self.dsn:
+            raise ValueError("Postgres connection string not found (pass --database-url or set SUPABASE_DB_URL)")
+        return None
+
+    def get_patient_id(self, conn: Optional[psycopg.Connection] = None) -> Optional[str]:
+        """Get the first patient ID from the database"""
+        if conn is None:
+            with psycopg.connect(self.dsn) as conn:
+                return self.get_patient_id(conn)
+
+        row = conn.execute("select id from public.patients limit 1").fetchone()
+        if row:
+            return str(row[0])
+        print("No patient found in database. Please create a patient first.")
+        return None
+
+    def load_biomarker_catalog(self, conn: Optional[psycopg.Connection] = None):
+        """Load the whole biomarkers table (name -> id) into the cache with one query"""
+        if conn is None:
+            with psycopg.connect(self.dsn) as conn:
+                return self.load_biomarker_catalog(conn)
+
+        with conn.cursor(row_factory=dict_row) as cursor:
+            for biomarker in cursor.execute(SELECT_CATALOG):
+                self.biomarker_map[biomarker['name']] = str(biomarker['id'])
+                self.biomarker_units[biomarker['name']] = biomarker['unit']
+                self.name_index.add(biomarker['name'], biomarker['display_name'])
+                self.ranges.add(biomarker)
+        self.catalog_loaded = True
+
+    def sync_fingerprints(self, patient_id: str, conn: Optional[psycopg.Connection] = None):
+        """Fetch fingerprints of rows stored for the patient since the last sync (one query)"""
+        if self.fingerprint_index is None:
+            return
+
+        if conn is None:
+            with psycopg.connect(self.dsn) as conn:
+                return self.sync_fingerprints(patient_id, conn)
+
+        entry = self.fingerprint_index.entry(patient_id)
+        latest = entry['synced_at']
+        cursor = conn.execute(SELECT_STORED_RESULTS, {'patient_id': patient_id, 'synced_at': entry['synced_at']})
+        for test_name, test_date, value, unit, created_at, raw_value in cursor:
+            lab_result = {'test_name': test_name, 'test_date': test_date, 'value': value, 'unit': unit,
+                          'lab_parsed_values': [{'raw_value': raw_value}] if raw_value is not None else []}
+            entry['fingerprints'].add(stored_fingerprint(patient_id, lab_result))
+            created_at = created_at.isoformat()
+            if not latest or created_at > latest:
+                latest = created_at
+
+        entry['synced_at'] = latest
+
+    def staging_rows(self, patient_id: str, rows: Iterator[Dict[str, str]]):
+        """Yield COPY tuples for the staging table"""
+        for line, row in enumerate(rows):
+            lab_result = self.build_lab_result(patient_id, row)
+            yield (line, lab_result['id'], row['Biomarker'], self.canonical_name(row['Biomarker'], row['Units']),
+                   self.category_mapping.get(row['Category'], 'other'),
+                   row['Category'], lab_result['unit'], lab_result['value'], row['Result'],
+                   lab_result['reference_min'], lab_result['reference_max'], lab_result['is_critical'],
+                   lab_result['test_date'])
+
+    def import_csv_data(self, csv_file: str, patient_id: Optional[str] = None, batch_size: int = 500,
+                        resume: bool = False):
+        """Import the whole CSV in one COPY + INSERT ... SELECT transaction (batch_size and resume are not used)"""
+        with psycopg.connect(self.dsn) as conn:
+            if not patient_id:
+                patient_id = self.get_patient_id(conn)
+                if not patient_id:
+                    return False
+
+            print(f"Importing data for patient ID: {patient_id} (Postgres COPY)")
+            with self.metrics.stage('sync_fingerprints'):
+                self.sync_fingerprints(patient_id, conn)
+            with self.metrics.stage('load_catalog'):
+                self.load_biomarker_catalog(conn)
+
+            staged = set()  # Fingerprints of the rows sent, recorded once the transaction commits
+            try:
+                with conn.transaction(), conn.cursor() as cursor:
+                    cursor.execute(CREATE_STAGING)
+                    rows = self.new_rows(patient_id, iter_csv_rows(csv_file), staged)
+                    with self.metrics.stage('copy_staging'), \
+                            cursor.copy(f"copy lab_import_staging ({', '.join(STAGING_COLUMNS)}) from stdin") as copy:
+                        for staging_row in self.staging_rows(patient_id, rows):
+                            copy.write_row(staging_row)
+
+                    with self.metrics.stage('insert_biomarkers'):
+                        cursor.execute(INSERT_BIOMARKERS)
+                        biomarkers_created = cursor.rowcount
+                    with self.metrics.stage('insert_lab_results'):
+                        cursor.execute(INSERT_LAB_RESULTS, (patient_id,))
+                        lab_results_created = cursor.rowcount
+                    print(f"Loaded {lab_results_created} new lab results "
+                          f"({self.stats['rows_skipped_existing']} already imported)...")
+                    with self.metrics.stage('insert_parsed_values'):
+                        cursor.execute(INSERT_PARSED_VALUES)
+                        lab_parsed_values_created = cursor.rowcount
+            except (psycopg.Error, OSError, ValueError) as e:
+                self.stats['errors'].append(f"Error importing {csv_file} via COPY (rolled back): {str(e)}")
+                return False
+
+        self.stats['biomarkers_created'] += biomarkers_created
+        self.stats['biomarkers_existing'] += lab_results_created - biomarkers_created
+        self.stats['lab_results_created'] += lab_results_created
+        self.stats['lab_parsed_values_created'] += lab_parsed_values_created
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.fingerprints(patient_id).update(staged)
+            self.fingerprint_index.save()
+        self.name_index.save()
+        return True
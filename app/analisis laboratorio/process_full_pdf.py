@@ -4,12 +4,21 @@ Complete Lab Results Processor for Full Ornament PDF
 Processes all laboratory test results and creates comprehensive CSV files
 """
 
-import re
+import argparse
 import csv
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 import json
 
+from lab_parser import LabLineParser, TOKEN_ROW_GRAMMAR
+from lab_store import LabResultStore
+from lab_aggregate import aggregate
+from lab_cache import ExtractionCache, normalize_line
+
+QUALITATIVE_RESULTS = {'Undetected', 'Negative', 'Positive', 'Detected', 'Positive*', 'Detected*'}
+
+CSV_FIELDNAMES = ['Category', 'Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max', 'Units', 'Status']
+
 # Full lab data from the PDF
 FULL_LAB_DATA = """
 Signos Vitales
@@ -599,7 +608,7 @@ class FullLabDataProcessor:
     """Complete processor for full Ornament PDF lab data"""
 
     def __init__(self):
-        self.results = []
+        self.results = LabResultStore(CSV_FIELDNAMES)
         self.categories = {
             'Signos Vitales': 'Vital Signs',
             'Análisis bioquímicos (sangre)': 'Blood Chemistry',
@@ -611,6 +620,7 @@ class FullLabDataProcessor:
             'Estudios hormonales': 'Hormonal Studies',
             'Examen clínico general': 'Complete Blood Count'
         }
+        self.parser = LabLineParser(self.categories, TOKEN_ROW_GRAMMAR, exact_headers=True)
 
     def parse_reference_range(self, ref_range: str) -> Tuple[Optional[str], Optional[str]]:
         """Parse reference range string, keeping original format"""
@@ -636,85 +646,75 @@ class FullLabDataProcessor:
         clean_result = result.replace('*', '').strip()
         return clean_result, is_abnormal
 
-    def process_data(self):
-        """Process the full lab data"""
-        lines = FULL_LAB_DATA.strip().split('\n')
-        current_category = None
-
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Check for category headers
-            for cat_spanish, cat_english in self.categories.items():
-                if line == cat_spanish:
-                    current_category = cat_english
-                    break
-
-            # Skip if no category set yet
-            if not current_category:
-                continue
-
-            # Try to parse data lines
-            # Pattern: biomarker date result range units
-            parts = line.split()
-            if len(parts) >= 5:
-                # Look for date pattern DD.MM.YYYY
-                date_pattern = r'\d{2}\.\d{2}\.\d{4}'
-                date_match = None
-                date_idx = -1
-
-                for idx, part in enumerate(parts):
-                    if re.match(date_pattern, part):
-                        date_match = part
-                        date_idx = idx
-                        break
-
-                if date_match and date_idx > 0:
-                    # Extract components
-                    biomarker = ' '.join(parts[:date_idx])
-                    date = date_match
-
-                    # Result is next after date
-                    if date_idx + 1 < len(parts):
-                        result_raw = parts[date_idx + 1]
-
-                        # Check for qualitative results
-                        if result_raw in ['Undetected', 'Negative', 'Positive', 'Detected', 'Positive*', 'Detected*']:
-                            # Qualitative result
-                            result, is_abnormal = self.parse_result_value(result_raw)
-                            ref_range = parts[date_idx + 2] if date_idx + 2 < len(parts) else ''
-                            units = parts[-1] if parts[-1] not in ['—', result_raw, ref_range] else ''
-                        else:
-                            # Quantitative result
-                            result, is_abnormal = self.parse_result_value(result_raw)
-
-                            # Find units (last element that's not —)
-                            units = parts[-1] if parts[-1] != '—' else ''
-
-                            # Reference range is between result and units
-                            if date_idx + 2 < len(parts) - 1:
-                                ref_range = ' '.join(parts[date_idx + 2:-1])
-                            else:
-                                ref_range = '—'
-
-                        # Parse reference range
-                        ref_min, ref_max = self.parse_reference_range(ref_range)
-
-                        # Create record
-                        record = {
-                            'Category': current_category,
-                            'Biomarker': biomarker,
-                            'Date': date,
-                            'Result': result,
-                            'Ref_Min': ref_min,
-                            'Ref_Max': ref_max,
-                            'Units': units if units != '—' else '',
-                            'Status': 'Abnormal' if is_abnormal else 'Normal'
-                        }
-
-                        self.results.append(record)
+    def build_record(self, category: str, match) -> Optional[Dict]:
+        """Turn a row grammar match into a result record"""
+        biomarker = ' '.join(match.group('biomarker').split())
+        result_raw = match.group('result')
+        rest = match.group('tail').split() if match.group('tail') else []
+
+        # Same minimum as the original token check: biomarker + date + result + 2 tokens
+        if len(biomarker.split()) + 2 + len(rest) < 5:
+            return None
+
+        last = rest[-1] if rest else result_raw
+
+        # Check for qualitative results
+        if result_raw in QUALITATIVE_RESULTS:
+            result, is_abnormal = self.parse_result_value(result_raw)
+            ref_range = rest[0] if rest else ''
+            units = last if last not in ['—', result_raw, ref_range] else ''
+        else:
+            # Quantitative result
+            result, is_abnormal = self.parse_result_value(result_raw)
+
+            # Units are the last token, the reference range sits between result and units
+            units = last if last != '—' else ''
+            ref_range = ' '.join(rest[:-1]) if len(rest) >= 2 else '—'
+
+        ref_min, ref_max = self.parse_reference_range(ref_range)
+
+        return {
+            'Category': category,
+            'Biomarker': biomarker,
+            'Date': match.group('date'),
+            'Result': result,
+            'Ref_Min': ref_min,
+            'Ref_Max': ref_max,
+            'Units': units if units != '—' else '',
+            'Status': 'Abnormal' if is_abnormal else 'Normal'
+        }
+
+    def iter_records(self, lines: Iterable[str], cache: ExtractionCache = None) -> Iterator[Dict]:
+        """Yield records for the data lines of one report, in line order"""
+        if cache is None:
+            for category, match in self.parser.iter_rows(lines):
+                record = self.build_record(category, match)
+                if record:
+                    yield record
+            return
+
+        # Cached mode: lines seen in a previous run are not parsed again
+        match_row = self.parser.row_grammar.match
+        for category, line in self.parser.iter_lines(lines):
+            line = normalize_line(line)
+            key, hit, record = cache.get_row(category, line)
+            if not hit:
+                match = match_row(line)
+                record = self.build_record(category, match) if match else None
+                cache.put_row(key, record)
+            if record:
+                yield dict(record)
+
+    def process_data(self, text: str = FULL_LAB_DATA, cache: ExtractionCache = None):
+        """Process the full lab data (defaults to the embedded report)"""
+        self.results.extend(self.iter_records(text.strip().split('\n'), cache))
+
+    def process_pdf(self, path: str, workers: int = None, cache: ExtractionCache = None):
+        """Process an Ornament PDF, parsing pages as they are extracted"""
+        # Imported here so the embedded-data mode does not need pypdf installed
+        from pdf_ingest import iter_pdf_lines
+
+        self.results.extend(self.iter_records(iter_pdf_lines(path, workers, cache), cache))
 
     def save_complete_csv(self, filename='lab_results_full.csv'):
         """Save all results to CSV"""
@@ -722,10 +722,8 @@ class FullLabDataProcessor:
             print(f"No results to save")
             return
 
-        fieldnames = ['Category', 'Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max', 'Units', 'Status']
-
         with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
             writer.writeheader()
             writer.writerows(self.results)
 
@@ -733,54 +731,68 @@ class FullLabDataProcessor:
 
     def save_abnormal_csv(self, filename='lab_results_abnormal_full.csv'):
         """Save only abnormal results"""
-        abnormal = [r for r in self.results if r['Status'] == 'Abnormal']
+        abnormal = list(self.results.where('Status', 'Abnormal'))
 
         if not abnormal:
             print("No abnormal results found")
             return
 
-        fieldnames = ['Category', 'Biomarker', 'Date', 'Result', 'Ref_Min', 'Ref_Max', 'Units', 'Status']
-
         with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDNAMES)
             writer.writeheader()
             writer.writerows(abnormal)
 
         print(f"Saved {len(abnormal)} abnormal records to {filename}")
 
+    def save_dataset(self, directory='lab_results_dataset', format='parquet'):
+        """Save all results as a columnar dataset partitioned by category and year (see lab_dataset)"""
+        from lab_dataset import write_dataset
+
+        if not self.results:
+            print(f"No results to save")
+            return
+
+        write_dataset(self.results, directory, format)
+        print(f"Saved {len(self.results)} records to {directory} ({format}, abnormal rows are a Status filter)")
+
     def generate_summary(self):
         """Generate summary statistics"""
-        summary = {
-            'total_tests': len(self.results),
-            'abnormal_count': sum(1 for r in self.results if r['Status'] == 'Abnormal'),
-            'categories': {},
-            'biomarkers': {}
-        }
+        aggregates = aggregate(self.results)
 
-        # Category breakdown
-        for record in self.results:
-            cat = record['Category']
-            bio = record['Biomarker']
+        return {
+            'total_tests': aggregates.total,
+            'abnormal_count': aggregates.abnormal,
+            'categories': aggregates.categories,
+            'biomarkers': {bio: stats.as_dict() for bio, stats in aggregates.biomarkers.items()}
+        }
 
-            if cat not in summary['categories']:
-                summary['categories'][cat] = {'total': 0, 'abnormal': 0}
-            summary['categories'][cat]['total'] += 1
-            if record['Status'] == 'Abnormal':
-                summary['categories'][cat]['abnormal'] += 1
+    def save_summary_json(self, summary: Dict, filename='lab_results_summary_full.json'):
+        """Save a summary produced by generate_summary"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
 
-            # Biomarker tracking
-            if bio not in summary['biomarkers']:
-                summary['biomarkers'][bio] = {'count': 0, 'abnormal': 0}
-            summary['biomarkers'][bio]['count'] += 1
-            if record['Status'] == 'Abnormal':
-                summary['biomarkers'][bio]['abnormal'] += 1
 
-        return summary
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Process the full Ornament lab report')
+    parser.add_argument('pdf', nargs='?', help='Ornament PDF (default: the embedded FULL_LAB_DATA)')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='Reuse rows/pages from a content-hash cache file (created if missing)')
+    parser.add_argument('--dataset', metavar='DIR',
+                        help='Also write a columnar dataset partitioned by category and year (needs pyarrow)')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help='Format of --dataset')
+    args = parser.parse_args()
 
+    cache = ExtractionCache(args.cache) if args.cache else None
 
-if __name__ == "__main__":
     processor = FullLabDataProcessor()
-    processor.process_data()
+    if args.pdf:
+        processor.process_pdf(args.pdf, cache=cache)
+    else:
+        processor.process_data(cache=cache)
+
+    if cache:
+        cache.save()
+        cache.print_stats()
 
     # Save complete results
     processor.save_complete_csv('lab_results_full.csv')
@@ -788,6 +800,9 @@ if __name__ == "__main__":
     # Save abnormal results only
     processor.save_abnormal_csv('lab_results_abnormal_full.csv')
 
+    if args.dataset:
+        processor.save_dataset(args.dataset, args.format)
+
     # Generate and display summary
     summary = processor.generate_summary()
 
@@ -807,5 +822,4 @@ if __name__ == "__main__":
         print(f"{bio:40} {stats['count']:3} tests, {stats['abnormal']:2} abnormal ({abnormal_pct:.1f}%)")
 
     # Save summary to JSON
-    with open('lab_results_summary_full.json', 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+    processor.save_summary_json(summary, 'lab_results_summary_full.json')
\ No newline at end of file
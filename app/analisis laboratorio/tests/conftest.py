@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The modules are sibling scripts imported by bare name
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from mock_postgrest import MockPostgREST  # noqa: E402
+
+CSV_FILE = os.path.join(HERE, 'lab_results_complete.csv')
+
+
+@pytest.fixture
+def server(request):
+    """A running MockPostgREST and its URL; parametrize indirectly with biomarker rows to seed the catalog"""
+    mock = MockPostgREST()
+    catalog = getattr(request, 'param', None)
+    if catalog:
+        mock.insert('biomarkers', catalog, None, '')
+    url = mock.start()
+    yield mock, url
+    mock.stop()
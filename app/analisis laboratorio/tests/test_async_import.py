@@ -0,0 +1,66 @@
+import sys
+import threading
+
+import pytest
+from supabase import create_client
+
+import async_import
+from async_import import run_async_import
+from conftest import CSV_FILE
+from csv_stream import iter_csv_rows
+from import_lab_to_supabase import LabDataImporter
+
+
+def test_async_import_resolves_biomarkers_off_the_event_loop(server, tmp_path):
+    mock, url = server
+    patient_id = mock.add_patient()
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               name_cache_file=None)
+    threads = set()
+    get_or_create = importer.get_or_create_biomarker
+
+    def recording(*args):
+        threads.add(threading.current_thread() is threading.main_thread())
+        return get_or_create(*args)
+
+    importer.get_or_create_biomarker = recording
+    assert run_async_import(importer, CSV_FILE, url, 'key', patient_id, batch_size=10, max_in_flight=2)
+
+    assert threads == {False}
+    assert len(mock.tables['lab_results']) == 45
+    assert len(mock.tables['lab_parsed_values']) == 45
+    assert importer.stats['errors'] == []
+
+
+def test_async_import_reads_the_csv_off_the_event_loop(server, monkeypatch):
+    mock, url = server
+    patient_id = mock.add_patient()
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               name_cache_file=None)
+    threads = set()
+
+    def reading(path):
+        for row in iter_csv_rows(path):
+            threads.add(threading.current_thread() is threading.main_thread())
+            yield row
+
+    monkeypatch.setattr(async_import, 'iter_csv_rows', reading)
+    assert run_async_import(importer, CSV_FILE, url, 'key', patient_id, batch_size=10, max_in_flight=2)
+
+    assert threads == {False}
+    assert len(mock.tables['lab_results']) == 45
+
+
+def test_async_import_raises_on_unreadable_input(server, monkeypatch, tmp_path):
+    mock, url = server
+    patient_id = mock.add_patient()
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               name_cache_file=None)
+    compressed = tmp_path / 'lab_results.csv.zst'
+    compressed.write_bytes(b'not read')
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+
+    # The reader's error stops the writers and surfaces instead of hanging the import
+    with pytest.raises(ValueError, match='zstandard'):
+        run_async_import(importer, str(compressed), url, 'key', patient_id, batch_size=10, max_in_flight=2)
+    assert mock.tables['lab_results'] == []
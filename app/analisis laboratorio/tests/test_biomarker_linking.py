@@ -0,0 +1,55 @@
+import pytest
+from supabase import create_client
+
+from import_lab_to_supabase import LabDataImporter
+
+CATALOG = [
+    {'name': 'wbc', 'display_name': 'Leucocitos', 'category': 'cbc', 'unit': 'K/μL'},
+    {'name': 'ck_mb', 'display_name': 'CK-MB', 'category': 'cardiac', 'unit': 'ng/mL'},
+]
+ROWS = """Category,Biomarker,Date,Result,Ref_Min,Ref_Max,Units,Status
+Complete Blood Count,Leucocitos,06.09.2025,7310,3400,9600,units/mm³,Normal
+Blood Chemistry,Creatina quinasa MB (CK-MB),06.09.2025,18,0,25,IU/L,Normal
+"""
+
+
+@pytest.mark.parametrize('server', [CATALOG], indirect=True)
+@pytest.mark.parametrize('use_rpc', [False, True])
+def test_links_only_to_catalog_biomarkers_in_the_same_unit(server, tmp_path, use_rpc):
+    mock, url = server
+    patient_id = mock.add_patient()
+    csv_file = tmp_path / 'results.csv'
+    csv_file.write_text(ROWS, encoding='utf-8')
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               use_rpc=use_rpc, name_cache_file=None)
+    assert importer.import_csv_data(str(csv_file), patient_id, 10)
+
+    names = {biomarker['id']: biomarker['name'] for biomarker in mock.tables['biomarkers']}
+    links = {value['raw_name']: names[value['biomarker_id']] for value in mock.tables['lab_parsed_values']}
+    # Counts per µL convert to the catalog's K/μL; an enzyme activity (IU/L) is not the mass assay (ng/mL)
+    assert links == {'Leucocitos': 'wbc', 'Creatina quinasa MB (CK-MB)': 'Creatina quinasa MB (CK-MB)'}
+    values = {value['raw_name']: value['parsed_value'] for value in mock.tables['lab_parsed_values']}
+    assert values['Leucocitos'] == 7.31
+
+
+@pytest.mark.parametrize('server', [CATALOG], indirect=True)
+def test_ensure_biomarkers_leaves_concurrently_created_names_alone(server):
+    mock, url = server
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               name_cache_file=None)
+    importer.load_biomarker_catalog()
+    # Created by another import after the catalog was loaded
+    mock.insert('biomarkers', [{'name': 'Bicarbonate, serum', 'display_name': 'Bicarbonato', 'category': 'x',
+                                'unit': 'mEq/L', 'reference_min': 22, 'reference_max': 29}], None, '')
+    rows = [{'Biomarker': 'Bicarbonate, serum', 'Category': 'Blood Chemistry', 'Units': 'mEq/L', 'Ref_Min': '18',
+             'Ref_Max': '35'},
+            {'Biomarker': 'Ferritina', 'Category': 'Blood Chemistry', 'Units': 'ng/mL', 'Ref_Min': '30',
+             'Ref_Max': '400'}]
+    importer.ensure_biomarkers(rows)
+
+    existing = mock.index('biomarkers', 'name')['Bicarbonate, serum']
+    assert (existing['display_name'], existing['reference_min'], existing['reference_max']) == ('Bicarbonato', 22, 29)
+    assert importer.biomarker_map['Bicarbonate, serum'] == existing['id']
+    assert 'Ferritina' in importer.biomarker_map
+    assert importer.stats['biomarkers_created'] == 1
+    assert importer.stats['errors'] == []
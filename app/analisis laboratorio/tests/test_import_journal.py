@@ -0,0 +1,24 @@
+from import_journal import ImportJournal, file_hash
+
+
+def test_file_hash_covers_the_whole_file(tmp_path):
+    path = tmp_path / 'lab_results.csv'
+    middle = 3 << 20
+    content = bytearray(b'x' * (middle * 2))
+    path.write_bytes(bytes(content))
+    before = file_hash(str(path))
+
+    # Same size and same first and last MiB, one byte changed in the middle
+    content[middle] = ord('y')
+    path.write_bytes(bytes(content))
+    assert file_hash(str(path)) != before
+
+
+def test_resume_ignores_batches_of_another_file(tmp_path):
+    journal = ImportJournal(str(tmp_path / 'journal.jsonl'))
+    journal.begin('old', 'patient', 100)
+    journal.record_lab_results(0, [0], ['id'])
+
+    journal = ImportJournal(str(tmp_path / 'journal.jsonl'))
+    assert journal.begin('new', 'patient', 250, resume=True) == 250
+    assert journal.batch(0) is None
@@ -0,0 +1,67 @@
+"""import_lab_batch against a real Postgres with the migrations applied (SUPABASE_DB_URL)"""
+
+import os
+import uuid
+
+import pytest
+from supabase import create_client
+
+from conftest import CSV_FILE
+from csv_stream import iter_csv_rows
+from import_lab_to_supabase import LabDataImporter
+from lab_names import BiomarkerNameIndex
+
+DATABASE_URL = os.environ.get('SUPABASE_DB_URL')
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason='needs SUPABASE_DB_URL')
+
+
+@pytest.fixture
+def conn():
+    psycopg = pytest.importorskip('psycopg')
+    from psycopg.rows import dict_row
+
+    # Everything the test writes is rolled back
+    with psycopg.connect(DATABASE_URL, row_factory=dict_row) as conn:
+        yield conn
+        conn.rollback()
+
+
+def import_lab_batch(conn, patient_id, rpc_rows):
+    from psycopg.types.json import Jsonb
+
+    return conn.execute('select public.import_lab_batch(%s, %s) as counts',
+                        (patient_id, Jsonb(rpc_rows))).fetchone()['counts']
+
+
+def test_import_lab_batch_stores_links_and_skips_repeated_rows(conn):
+    patient_id = conn.execute("insert into public.patients (full_name) values ('Import test') returning id"
+                              ).fetchone()['id']
+    # Only builds rows: the client never sends a request
+    importer = LabDataImporter(create_client('http://localhost', 'key'), fingerprint_file=None, journal_file=None,
+                               use_rpc=True, name_cache_file=None)
+    importer.name_index = BiomarkerNameIndex.from_rows(
+        conn.execute('select name, display_name from public.biomarkers').fetchall())
+    importer.source_hash = uuid.uuid4().hex
+    rows = list(iter_csv_rows(CSV_FILE))
+    rpc_rows = [importer.build_rpc_row(str(patient_id), row) for row in rows]
+    for position, rpc_row in enumerate(rpc_rows):
+        rpc_row['id'] = importer.row_id(str(patient_id), position)
+
+    counts = import_lab_batch(conn, patient_id, rpc_rows)
+    assert counts['lab_results_created'] == len(rows)
+    assert counts['lab_parsed_values_created'] == len(rows)
+
+    linked = conn.execute(
+        'select v.raw_name, b.name from public.lab_parsed_values v '
+        'join public.lab_results r on r.id = v.lab_result_id join public.biomarkers b on b.id = v.biomarker_id '
+        'where r.patient_id = %s', (patient_id,)).fetchall()
+    expected = {(rpc_row['test_name'], rpc_row['biomarker']) for rpc_row in rpc_rows}
+    assert {(row['raw_name'], row['name']) for row in linked} == expected
+
+    # A retried batch carries the same ids: nothing is stored twice
+    counts = import_lab_batch(conn, patient_id, rpc_rows)
+    assert counts == {'biomarkers_created': 0, 'lab_results_created': 0, 'lab_parsed_values_created': 0}
+    stored = conn.execute('select count(*) as n from public.lab_results where patient_id = %s',
+                          (patient_id,)).fetchone()['n']
+    assert stored == len(rows)
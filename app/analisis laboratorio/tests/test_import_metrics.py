@@ -0,0 +1,10 @@
+from import_metrics import quantile
+
+
+def test_quantile_is_nearest_rank():
+    values = [float(i) for i in range(1, 11)]
+    assert quantile(values, 0.5) == 5.0
+    assert quantile(values, 0.9) == 9.0
+    assert quantile(values, 0.95) == 10.0
+    assert quantile(values, 0.0) == 1.0
+    assert quantile([3.0], 0.99) == 3.0
@@ -0,0 +1,50 @@
+import pytest
+from supabase import create_client
+
+from async_import import run_async_import
+from conftest import CSV_FILE
+from import_journal import ImportJournal
+from import_lab_to_supabase import LabDataImporter
+
+
+class Crash(Exception):
+    pass
+
+
+def importer_for(url, journal_file):
+    return LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=journal_file,
+                           name_cache_file=None)
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_resume_after_parsed_values_commit_does_not_duplicate(server, tmp_path, mode, monkeypatch):
+    """The process dies after the server stored a batch's parsed values but before the journal says so"""
+    mock, url = server
+    patient_id = mock.add_patient()
+    journal_file = str(tmp_path / 'journal.jsonl')
+
+    def run(importer, resume=False):
+        if mode == 'sync':
+            return importer.import_csv_data(CSV_FILE, patient_id, 10, resume)
+        return run_async_import(importer, CSV_FILE, url, 'key', patient_id, 10, resume=resume, max_in_flight=1)
+
+    calls = []
+
+    def crash(self, start):
+        calls.append(start)
+        if len(calls) == 2:
+            raise Crash()
+        original(self, start)
+
+    original = ImportJournal.record_complete
+    monkeypatch.setattr(ImportJournal, 'record_complete', crash)
+    with pytest.raises(Crash):
+        run(importer_for(url, journal_file))
+    monkeypatch.setattr(ImportJournal, 'record_complete', original)
+    assert len(mock.tables['lab_parsed_values']) == 20
+
+    importer = importer_for(url, journal_file)
+    assert run(importer, resume=True)
+    assert len(mock.tables['lab_results']) == 45
+    assert len(mock.tables['lab_parsed_values']) == 45
+    assert importer.stats['errors'] == []
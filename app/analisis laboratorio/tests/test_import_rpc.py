@@ -0,0 +1,73 @@
+import subprocess
+import sys
+
+import pytest
+from supabase import create_client
+
+from conftest import CSV_FILE, HERE
+from import_journal import ImportJournal
+from import_lab_to_supabase import LabDataImporter
+
+
+class Crash(Exception):
+    pass
+
+
+def importer_for(url, journal_file):
+    return LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=journal_file,
+                           use_rpc=True, name_cache_file=None)
+
+
+def test_rpc_resume_after_unjournaled_commit_does_not_duplicate(server, tmp_path, monkeypatch):
+    """The process dies after import_lab_batch committed a batch but before the journal says so"""
+    mock, url = server
+    patient_id = mock.add_patient()
+    journal_file = str(tmp_path / 'journal.jsonl')
+    calls = []
+
+    def crash(self, *args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise Crash()
+        original(self, *args)
+
+    original = ImportJournal.record_lab_results
+    monkeypatch.setattr(ImportJournal, 'record_lab_results', crash)
+    with pytest.raises(Crash):
+        importer_for(url, journal_file).import_csv_data(CSV_FILE, patient_id, 10)
+    monkeypatch.setattr(ImportJournal, 'record_lab_results', original)
+    assert len(mock.tables['lab_results']) == 20
+
+    importer = importer_for(url, journal_file)
+    assert importer.import_csv_data(CSV_FILE, patient_id, 10, resume=True)
+    assert len(mock.tables['lab_results']) == 45
+    assert len(mock.tables['lab_parsed_values']) == 45
+    assert importer.stats['lab_results_created'] == 25
+    assert importer.stats['errors'] == []
+
+
+def test_rpc_failure_stores_nothing(server, monkeypatch):
+    mock, url = server
+    patient_id = mock.add_patient()
+    insert = mock.insert
+
+    def failing(table, rows, on_conflict, prefer):
+        if table == 'lab_parsed_values':
+            return 409, {'code': '23503', 'message': 'lab_result_id violates foreign key constraint'}
+        return insert(table, rows, on_conflict, prefer)
+
+    monkeypatch.setattr(mock, 'insert', failing)
+    importer = importer_for(url, None)
+    importer.import_csv_data(CSV_FILE, patient_id, 50)
+
+    assert len(importer.stats['errors']) == 1
+    assert importer.stats['lab_results_created'] == 0
+    assert mock.tables['lab_results'] == [] and mock.tables['biomarkers'] == []
+
+
+@pytest.mark.parametrize('other', ['--async', '--copy'])
+def test_rpc_cannot_be_combined_with_other_modes(other):
+    result = subprocess.run([sys.executable, 'import_lab_to_supabase.py', 'lab_results_complete.csv', '--rpc', other],
+                            capture_output=True, text=True, cwd=HERE)
+    assert result.returncode == 2
+    assert 'separate import modes' in result.stderr
@@ -0,0 +1,28 @@
+import lab_aggregate
+from lab_aggregate import aggregate
+from lab_store import LabResultStore
+
+FIELDNAMES = ['Category', 'Biomarker', 'Date', 'Result', 'Units', 'Status']
+
+
+def records(count):
+    for index in range(count):
+        yield {'Category': 'Blood Chemistry', 'Biomarker': 'Glucosa', 'Date': '01.02.2024', 'Result': str(index),
+               'Units': 'mg/dL', 'Status': 'Normal'}
+
+
+def test_streamed_values_are_sampled(monkeypatch):
+    monkeypatch.setattr(lab_aggregate, 'CHUNK_ROWS', 1000)
+    monkeypatch.setattr(lab_aggregate, 'SAMPLE_SIZE', 500)
+    glucose = aggregate(records(20_000), FIELDNAMES).biomarkers['Glucosa']
+
+    assert len(glucose.values) == 500
+    figures = glucose.as_dict()
+    assert (figures['count'], figures['min'], figures['max'], figures['mean']) == (20_000, 0.0, 19_999.0, 9999.5)
+    assert abs(figures['median'] - 9999.5) < 2000
+
+
+def test_median_of_one_store_is_exact():
+    store = LabResultStore(FIELDNAMES)
+    store.extend(records(10_001))
+    assert aggregate(store).biomarkers['Glucosa'].as_dict()['median'] == 5000.0
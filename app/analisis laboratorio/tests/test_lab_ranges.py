@@ -0,0 +1,89 @@
+import os
+import uuid
+
+import pytest
+from supabase import create_client
+
+from import_lab_to_supabase import LabDataImporter
+from lab_ranges import CLASSES, RangeCatalog, StoreEvaluation, update_is_critical
+from lab_store import LabResultStore
+
+DATABASE_URL = os.environ.get('SUPABASE_DB_URL')
+BIOMARKERS = [
+    {'name': 'wbc', 'display_name': 'Leucocitos', 'category': 'cbc', 'unit': 'K/μL', 'reference_min': 4.5,
+     'reference_max': 11.0, 'critical_min': 2.0, 'critical_max': 30.0},
+    {'name': 'ck_mb', 'display_name': 'CK-MB', 'category': 'cardiac', 'unit': 'ng/mL', 'reference_min': 0,
+     'reference_max': 5, 'critical_min': None, 'critical_max': 10},
+]
+CATALOG = RangeCatalog.from_rows(BIOMARKERS)
+ROWS = """Category,Biomarker,Date,Result,Ref_Min,Ref_Max,Units,Status
+Complete Blood Count,Leucocitos,06.09.2025,7310,3.4K,9.6K,units/mm³,Normal
+Complete Blood Count,Leucocitos,08.10.2024,31500,3.4K,9.6K,units/mm³,Abnormal
+Complete Blood Count,Leucocitos,01.10.2024,7.1,3.4,9.6,K/µL,Normal
+Blood Chemistry,CK-MB,06.09.2025,18,0,25,IU/L,Normal
+"""
+
+
+def test_catalog_ranges_apply_only_in_a_convertible_unit(tmp_path):
+    csv_file = tmp_path / 'results.csv'
+    csv_file.write_text(ROWS, encoding='utf-8')
+    evaluation = StoreEvaluation(LabResultStore.from_csv(str(csv_file)), CATALOG)
+
+    # Per-µL counts are compared with the K/μL range scaled to /µL; IU/L falls back to the report's range
+    assert [CLASSES[code] for code in evaluation.classes] == ['normal', 'critical_high', 'normal', 'normal']
+    assert CATALOG.lookup('Leucocitos', 'units/mm³') == (4500.0, 11000.0, 2000.0, 30000.0)
+    assert CATALOG.lookup('CK-MB', 'IU/L') is None
+
+
+@pytest.mark.parametrize('server', [BIOMARKERS], indirect=True)
+@pytest.mark.parametrize('use_rpc', [False, True])
+def test_imports_flag_values_outside_the_critical_limits(server, tmp_path, use_rpc):
+    mock, url = server
+    patient_id = mock.add_patient()
+    csv_file = tmp_path / 'results.csv'
+    # Abnormal ('*') but inside the critical limits
+    csv_file.write_text(ROWS + 'Complete Blood Count,Leucocitos,02.10.2024,10.2,3.4,9.6,K/µL,Abnormal\n',
+                        encoding='utf-8')
+    importer = LabDataImporter(create_client(url, 'key'), url, 'key', fingerprint_file=None, journal_file=None,
+                               use_rpc=use_rpc, name_cache_file=None)
+    assert importer.import_csv_data(str(csv_file), patient_id, 10)
+
+    flags = [lab_result['is_critical'] for lab_result in mock.tables['lab_results']]
+    assert flags == [False, True, False, False, False]
+
+
+@pytest.mark.skipif(not DATABASE_URL, reason='needs SUPABASE_DB_URL')
+def test_update_is_critical_applies_the_import_rule_to_every_row():
+    psycopg = pytest.importorskip('psycopg')
+
+    rows = [  # test_name, unit, value, reference range, is_critical before ('*'), after
+        ('Leucocitos', 'K/µL', 7.31, (3.4, 9.6), True, False),
+        ('Leucocitos', 'K/µL', 31.5, (3.4, 9.6), False, True),
+        ('Leucocitos', 'K/µL', 7.0, (3.4, 9.6), False, False),
+        ('Leucocitos', 'K/µL', None, (3.4, 9.6), True, False),  # No value
+        ('CK-MB', 'IU/L', 18, (0, 25), True, False),  # Catalog range in another unit, report range has no limit
+        ('Ferritina', 'ng/mL', 900, (30, 400), True, False),  # Not in the catalog
+    ]
+    # The flag the importers would have written
+    assert [CATALOG.is_critical(name, unit, value) for name, unit, value, *_ in rows] == [
+        after for *_, after in rows]
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        patient_id = conn.execute("insert into public.patients (full_name) values ('Range test') returning id"
+                                  ).fetchone()[0]
+        try:
+            ids = []
+            for test_name, unit, value, (low, high), before, _ in rows:
+                row_id = uuid.uuid4()
+                ids.append(row_id)
+                conn.execute('insert into public.lab_results (id, patient_id, test_name, value, unit, reference_min, '
+                             'reference_max, is_critical, test_date) values (%s, %s, %s, %s, %s, %s, %s, %s, '
+                             'current_date)', (row_id, patient_id, test_name, value, unit, low, high, before))
+
+            stats = update_is_critical(DATABASE_URL, CATALOG, str(patient_id))
+            flags = dict(conn.execute('select id, is_critical from public.lab_results where patient_id = %s',
+                                      (patient_id,)).fetchall())
+            assert [flags[row_id] for row_id in ids] == [after for *_, after in rows]
+            assert stats['updated'] == 5 and stats['critical'] == 1
+        finally:
+            conn.execute('delete from public.lab_results where patient_id = %s', (patient_id,))
+            conn.execute('delete from public.patients where id = %s', (patient_id,))
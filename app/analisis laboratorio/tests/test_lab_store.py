@@ -0,0 +1,22 @@
+import gzip
+
+from conftest import CSV_FILE
+from lab_store import LabResultStore
+
+
+def test_from_csv_reads_plain_and_compressed_exports(tmp_path):
+    store = LabResultStore.from_csv(CSV_FILE)
+    assert len(store) == 45
+
+    compressed = tmp_path / 'lab_results_complete.csv.gz'
+    with open(CSV_FILE, 'rb') as f:
+        compressed.write_bytes(gzip.compress(f.read()))
+    assert list(LabResultStore.from_csv(str(compressed))) == list(store)
+
+
+def test_from_csv_skips_rows_without_a_biomarker(tmp_path):
+    path = tmp_path / 'results.csv'
+    path.write_text('Biomarker,Date,Result\nGlucosa,01.02.2024,95\n,01.02.2024,\n', encoding='utf-8')
+    store = LabResultStore.from_csv(str(path))
+    assert len(store) == 1
+    assert store.values[0] == 95.0
@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from datetime import date
+
+from conftest import HERE
+from lab_timeseries import BiomarkerTimeSeriesIndex
+
+HEADER = 'Category,Biomarker,Date,Result,Ref_Min,Ref_Max,Units,Status\n'
+ROWS = ['Blood Chemistry,Glucosa,01.02.2024,95,70,100,mg/dL,Normal\n',
+        'Blood Chemistry,Glucosa,01.02.2024,95,70,100,mg/dL,Normal\n',  # Measured twice that day
+        'Blood Chemistry,Glucosa,01.03.2024,110,70,100,mg/dL,Abnormal\n']
+NEW_ROW = 'Blood Chemistry,Glucosa,01.04.2024,99,70,100,mg/dL,Normal\n'
+
+
+def build(index_file, csv_file, *options):
+    subprocess.run([sys.executable, 'lab_timeseries.py', 'build', str(csv_file), str(index_file), *options],
+                   check=True, capture_output=True, cwd=HERE)
+
+
+def query(index_file, *options):
+    result = subprocess.run([sys.executable, 'lab_timeseries.py', 'query', str(index_file), 'Glucosa', *options],
+                            check=True, capture_output=True, cwd=HERE)
+    return [entry['Result'] for entry in json.loads(result.stdout)]
+
+
+def test_append_of_a_cumulative_export_adds_only_new_rows(tmp_path):
+    index_file = tmp_path / 'index.json'
+    first, cumulative = tmp_path / 'first.csv', tmp_path / 'cumulative.csv'
+    first.write_text(HEADER + ''.join(ROWS), encoding='utf-8')
+    cumulative.write_text(HEADER + ''.join(ROWS) + NEW_ROW, encoding='utf-8')
+    build(index_file, first)
+    build(index_file, cumulative, '--append')
+
+    index = BiomarkerTimeSeriesIndex.load(str(index_file))
+    assert [entry['Result'] for entry in index.range('Glucosa')] == ['95', '95', '110', '99']
+
+
+def test_latest_is_taken_within_the_date_range(tmp_path):
+    index_file = tmp_path / 'index.json'
+    csv_file = tmp_path / 'results.csv'
+    csv_file.write_text(HEADER + ''.join(ROWS) + NEW_ROW, encoding='utf-8')
+    build(index_file, csv_file)
+
+    assert query(index_file, '--latest', '1') == ['99']
+    assert query(index_file, '--latest', '1', '--to', date(2024, 3, 31).isoformat()) == ['110']
@@ -0,0 +1,24 @@
+from lab_units import conversion, normalize_value
+
+
+def test_blood_counts_use_the_catalog_units():
+    assert normalize_value('Leucocitos', 'units/mm³', 7310.0) == (7.31, 'K/µL')
+    assert normalize_value('Plaquetas', 'units/mm³', 222000.0) == (222.0, 'K/µL')
+    assert normalize_value('Eritrocitos', 'units/mm³', 4270000.0) == (4.27, 'M/µL')
+    # The catalog spells micro with the Greek mu
+    assert conversion('Leucocitos', 'K/μL') == ('K/µL', 1.0)
+
+
+def test_urine_counts_stay_per_microliter():
+    assert normalize_value('Leucocitos orina', 'units/mcL', 3.3) == (3.3, '/µL')
+    assert normalize_value('Eritrocitos en orina', 'units/mcL', 4.0) == (4.0, '/µL')
+
+
+def test_specific_gravity_without_decimal_point_is_rescaled():
+    assert normalize_value('Densidad orina', '×100%', 1010.0) == (1.01, 'ratio')
+    assert normalize_value('Densidad orina', '×100%', 1.009) == (1.009, 'ratio')
+
+
+def test_unknown_units_are_not_scaled():
+    assert normalize_value('Eosinófilos %', '%', 5.0) == (5.0, '%')
+    assert normalize_value('Glucosa', 'mmol/L', 5.0) == (90.08, 'mg/dL')
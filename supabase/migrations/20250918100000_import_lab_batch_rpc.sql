@@ -0,0 +1,74 @@
+-- Bulk ingest RPC for the lab importer: one call per batch stores the lab results,
+-- creates missing biomarkers and links parsed values, returning the counts.
+-- p_rows is a JSON array of
+--   {id, biomarker, test_name, value, unit, reference_min, reference_max, is_critical,
+--    test_date, raw_value, category, description}
+-- biomarker is the biomarkers.name the client resolved the report name to (e.g.
+-- 'creatinine' for 'Creatinina suero'); lab_results.test_name and
+-- lab_parsed_values.raw_name keep the name as reported, and rows without it use
+-- test_name. ids are derived by the client from the input file, patient and row
+-- position, so a retried or resumed batch re-sends ids that may already be stored:
+-- those rows are skipped with their parsed values, and the counts cover new rows
+-- only. The whole call is one transaction.
+create or replace function public.import_lab_batch(p_patient_id uuid, p_rows jsonb)
+returns jsonb
+language plpgsql
+set search_path = public
+as $$
+declare
+  biomarkers_created integer;
+  lab_results_created integer;
+  parsed_values_created integer;
+begin
+  -- Biomarkers first, in their own statement, so names created concurrently by
+  -- another import are visible to the join below
+  insert into public.biomarkers (name, display_name, category, unit, reference_min, reference_max, description)
+  select distinct on (coalesce(r.biomarker, r.test_name))
+    coalesce(r.biomarker, r.test_name), coalesce(r.biomarker, r.test_name), r.category, coalesce(r.unit, ''),
+    r.reference_min, r.reference_max, r.description
+  from rows from (
+    jsonb_to_recordset(p_rows) as (biomarker text, test_name text, category text, unit text,
+                                   reference_min numeric, reference_max numeric, description text)
+  ) with ordinality as r(biomarker, test_name, category, unit, reference_min, reference_max, description, line)
+  order by coalesce(r.biomarker, r.test_name), r.line
+  on conflict (name) do nothing;
+  get diagnostics biomarkers_created = row_count;
+
+  with input as (
+    select *
+    from jsonb_to_recordset(p_rows) as r(
+      id uuid, biomarker text, test_name text, value numeric, unit text, reference_min numeric,
+      reference_max numeric, is_critical boolean, test_date date, raw_value text
+    )
+  ),
+  results as (
+    insert into public.lab_results (id, patient_id, test_name, value, unit, reference_min, reference_max,
+                                    is_critical, test_date)
+    select id, p_patient_id, test_name, value, unit, reference_min, reference_max, coalesce(is_critical, false),
+           test_date
+    from input
+    on conflict (id) do nothing
+    returning id
+  ),
+  parsed_values as (
+    insert into public.lab_parsed_values (lab_result_id, biomarker_id, raw_name, raw_value, parsed_value, unit,
+                                          confidence_score, extraction_method)
+    select i.id, b.id, i.test_name, i.raw_value, i.value, i.unit, 1.0, 'csv_import'
+    from input i
+    join results r on r.id = i.id
+    join public.biomarkers b on b.name = coalesce(i.biomarker, i.test_name)
+    returning 1
+  )
+  select (select count(*) from results), (select count(*) from parsed_values)
+  into lab_results_created, parsed_values_created;
+
+  return jsonb_build_object(
+    'biomarkers_created', biomarkers_created,
+    'lab_results_created', lab_results_created,
+    'lab_parsed_values_created', parsed_values_created
+  );
+end;
+$$;
+
+revoke execute on function public.import_lab_batch(uuid, jsonb) from public, anon, authenticated;
+grant execute on function public.import_lab_batch(uuid, jsonb) to service_role;